@@ -1,16 +1,60 @@
 # File: app/main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 import os # Make sure os is imported if you use os.getenv for CORS origins
 
+# Before the routers are imported, so their module-load messages go through it too.
+from .services import logging_setup
+logging_setup.configure_logging()
+
 from .routes import orchestrate_v1  
 from .routes import upload_v1     
 from .routes import format_v1     
+from .routes import handwriting, image_caption, summarizer, tables, templates
+from .models.registry import model_registry, PRELOAD_MODELS, WARM_MODELS
+from .services.batching import stop_all_batchers, all_batcher_stats
+from .services.format_executor import format_executor
+from .services.http_client import start_http_client, close_http_client
+from .services.docx_templates import template_cache
+from .services.metrics import metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from .services.output_cache import output_cache
+from .services.tracing import InstrumentationMiddleware, register_api_areas
+from .services.upload_sessions import start_session_gc, stop_session_gc, upload_sessions
+
+logger = logging_setup.get_logger("main")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logging_setup.configure_logging()  # No-op unless a previous shutdown stopped it
+    register_api_areas(app, api_prefix="/api/v1")  # Label set for in-flight request counts
+    # Start the formatting process pool, the shared n8n HTTP client and the job queue
+    # workers once, before the first request, and tear them down on shutdown so nothing
+    # outlives the server. Unfinished jobs are persisted and resume on the next start.
+    format_executor.start()
+    await start_http_client()
+    await orchestrate_v1.job_queue.start()
+    start_session_gc()  # Sweeps stalled resumable upload sessions and unreferenced upload blobs
+    # Models are loaded lazily on first use. Listed ones are loaded on a background
+    # thread after startup, so the server is ready before they are.
+    model_registry.warm_in_background(WARM_MODELS)
+    logger.info("FastAPI application started. API routes under /api/v1", extra={"cors_origins": origins})
+    yield
+    await stop_session_gc()
+    await orchestrate_v1.job_queue.stop()
+    await close_http_client()
+    format_executor.shutdown()
+    stop_all_batchers()
+    logging_setup.stop_logging()  # Flush what is still queued
+
 
 app = FastAPI(
     title="DocuMorph AI API",
     description="API for document formatting, summarization, and intelligence, orchestrated via n8n.",
     version="0.2.1", # Bump version again
+    lifespan=lifespan,
 )
 
 # --- CORS Configuration ---
@@ -27,7 +71,6 @@ if VERCEL_DEPLOYMENT_URL:
     origins.append(VERCEL_DEPLOYMENT_URL)
 origins = [origin for origin in origins if origin] # Filter out None/empty
 if not origins: origins = ["*"] # Fallback
-print(f"CORS: Allowing origins: {origins}")
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,6 +79,8 @@ app.add_middleware(
     allow_methods=["*"],    
     allow_headers=["*"],    
 )
+# Added last, so it is outermost: it also times CORS handling and sees the final status.
+app.add_middleware(InstrumentationMiddleware, api_prefix="/api/v1")
 
 api_v1_router = APIRouter(prefix="/api/v1")
 
@@ -45,7 +90,6 @@ api_v1_router.include_router(
     prefix="/orchestrate",  # <<<<<<< THIS IS THE CRITICAL FIX/ADDITION
     tags=["Orchestrated Document Processing"]
 )
-print("Included orchestrate_v1 router at /api/v1/orchestrate")
 
 # Assuming upload_v1.py and format_v1.py have their router prefixes defined within those files
 # e.g., router = APIRouter(prefix="/upload") in upload_v1.py
@@ -54,26 +98,93 @@ print("Included orchestrate_v1 router at /api/v1/orchestrate")
 # Assuming upload_v1.py also defines its own prefix="/upload".
 if 'upload_v1' in globals() and hasattr(upload_v1, 'router'):
     api_v1_router.include_router(upload_v1.router, tags=["File Upload Utilities"])
-    print("Included upload_v1 router (expecting prefix within its file)")
 else:
-    print("Warning: upload_v1 router not found or not configured as expected.")
+    logger.warning("upload_v1 router not found or not configured as expected.")
 
 
 if 'format_v1' in globals() and hasattr(format_v1, 'router'):
     api_v1_router.include_router(format_v1.router, tags=["Direct Document Formatting"])
-    print("Included format_v1 router (expecting prefix within its file)")
 else:
-    print("Warning: format_v1 router not found or not configured as expected.")
+    logger.warning("format_v1 router not found or not configured as expected.")
+
+# Style templates used by format_v1 (template_name).
+api_v1_router.include_router(templates.router, tags=["Formatting Templates"])
+
+
+# In-process model endpoints. Models load on first use, on their batcher threads.
+api_v1_router.include_router(handwriting.router, tags=["Handwriting Recognition"])
+api_v1_router.include_router(image_caption.router, tags=["Image Captioning"])
+api_v1_router.include_router(summarizer.router, tags=["Summarization"])
+api_v1_router.include_router(tables.router, tags=["Table Description"])
+
+
+@api_v1_router.get("/models/stats", tags=["Models"], summary="Loaded models and batching counters")
+async def model_stats():
+    return {"registry": model_registry.stats(), "batchers": all_batcher_stats()}
 
 
 app.include_router(api_v1_router)
-print(f"Mounted api_v1_router at prefix /api/v1")
+
+
+def _service_metrics():
+    """Exposes the counters the services already keep (see their /stats endpoints) at scrape time."""
+    cache = output_cache.stats()
+    yield ("documorph_output_cache_lookups_total", "Formatted-output cache lookups.", "counter",
+           [({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"])])
+    yield ("documorph_output_cache_evictions_total", "Formatted outputs evicted from the cache.", "counter",
+           [({}, cache["evictions"])])
+    yield ("documorph_output_cache_bytes", "Bytes held by the formatted-output cache.", "gauge", [({}, cache["bytes"])])
+
+    pool = format_executor.stats()
+    yield ("documorph_format_jobs_in_flight", "Formatting jobs admitted (running or queued).", "gauge",
+           [({}, pool["in_flight"])])
+    yield ("documorph_format_jobs_capacity", "Formatting jobs admitted before new ones get 503.", "gauge",
+           [({}, pool["capacity"])])
+    yield ("documorph_format_jobs_rejected_total", "Formatting jobs rejected because the queue was full.", "counter",
+           [({}, pool["rejected"])])
+    yield ("documorph_format_jobs_timed_out_total", "Formatting jobs that exceeded the per-job timeout.", "counter",
+           [({}, pool["timed_out"])])
+
+    queue = orchestrate_v1.job_queue.stats()
+    yield ("documorph_jobs_pending", "Orchestration jobs waiting or running.", "gauge", [({}, queue["pending"])])
+
+    batchers = all_batcher_stats()
+    yield ("documorph_batcher_queued", "Model inputs waiting for a batch.", "gauge",
+           [({"batcher": b["name"]}, b["queued"]) for b in batchers])
+    yield ("documorph_batcher_items_total", "Model inputs processed.", "counter",
+           [({"batcher": b["name"]}, b["items"]) for b in batchers])
+    yield ("documorph_batcher_errors_total", "Failed model batches.", "counter",
+           [({"batcher": b["name"]}, b["errors"]) for b in batchers])
+
+    templates_cache = template_cache.stats()
+    yield ("documorph_template_cache_lookups_total", "Compiled template lookups by where they were served from.", "counter",
+           [({"source": "memory"}, templates_cache["memory_hits"]), ({"source": "disk"}, templates_cache["disk_hits"]),
+            ({"source": "compiled"}, templates_cache["compiles"])])
+
+    yield ("documorph_upload_sessions_completed_total", "Resumable uploads completed.", "counter",
+           [({}, upload_sessions.completed)])
+    yield ("documorph_log_records_dropped_total", "Log records dropped because the log queue was full.", "counter",
+           [({}, logging_setup.dropped_records)])
+
+
+metrics_registry.register_collector(_service_metrics)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint (text exposition format). Values are for this worker process."""
+    return Response(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 
 @app.get("/", tags=["Root"])
 async def read_root():
     return {"message": "Welcome to DocuMorph AI! API is live. Visit /docs for interactive API documentation."}
 
-print("FastAPI application configured and ready.")
+# With a pre-forking server (gunicorn --preload), load these in the master process so
+# forked workers share the weights copy-on-write. Off by default; plain uvicorn spawns
+# its workers and gains nothing from it.
+if PRELOAD_MODELS:
+    model_registry.preload_for_fork(PRELOAD_MODELS)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,41 @@
+# app/models/base.py
+
+import io
+import os
+from typing import List
+
+# Shared helpers for the in-process model wrappers.
+# Heavy dependencies (torch, transformers, PIL) are imported inside functions so that
+# importing a wrapper module is free; the cost is paid when a model is first loaded.
+
+TORCH_THREADS = int(os.getenv("DOCUMORPH_TORCH_THREADS", "0"))  # 0 = let torch decide
+MODEL_CACHE_DIR = os.getenv("DOCUMORPH_MODEL_CACHE_DIR")  # Defaults to the Hugging Face cache
+
+# Passed to every from_pretrained(): prefer .safetensors weights, which are memory-mapped
+# (shared page cache across processes) rather than unpickled into private memory.
+PRETRAINED_KWARGS = {"cache_dir": MODEL_CACHE_DIR, "use_safetensors": True}
+
+
+def import_torch_for_cpu():
+    """Imports torch configured for CPU-only inference and returns the module."""
+    import torch
+
+    if TORCH_THREADS > 0:
+        torch.set_num_threads(TORCH_THREADS)
+    return torch
+
+
+def decode_images(images: List[bytes]) -> list:
+    """Decodes raw image bytes to RGB PIL images (runs on the batcher thread, not the event loop)."""
+    from PIL import Image
+
+    return [Image.open(io.BytesIO(data)).convert("RGB") for data in images]
+
+
+def module_bytes(*modules) -> int:
+    """Parameter + buffer bytes of torch modules, for the registry's memory budget."""
+    total = 0
+    for module in modules:
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            total += tensor.numel() * tensor.element_size()
+    return total
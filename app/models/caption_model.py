@@ -0,0 +1,30 @@
+# app/models/caption_model.py
+
+import os
+from typing import List
+
+from app.models.base import PRETRAINED_KWARGS, module_bytes, decode_images, import_torch_for_cpu
+
+# BLIP image captioning (image -> one-sentence caption), CPU-only.
+
+CAPTION_MODEL_ID = os.getenv("CAPTION_MODEL_ID", "Salesforce/blip-image-captioning-base")
+CAPTION_MAX_NEW_TOKENS = int(os.getenv("CAPTION_MAX_NEW_TOKENS", "40"))
+
+
+class CaptionModel:
+    def __init__(self, model_id: str = CAPTION_MODEL_ID):
+        self.torch = import_torch_for_cpu()
+        from transformers import BlipForConditionalGeneration, BlipProcessor
+
+        self.model_id = model_id
+        self.processor = BlipProcessor.from_pretrained(model_id, cache_dir=PRETRAINED_KWARGS["cache_dir"])
+        self.model = BlipForConditionalGeneration.from_pretrained(model_id, **PRETRAINED_KWARGS).eval()
+
+    def memory_bytes(self) -> int:
+        return module_bytes(self.model)
+
+    def predict_batch(self, images: List[bytes]) -> List[str]:
+        inputs = self.processor(images=decode_images(images), return_tensors="pt")
+        with self.torch.inference_mode():
+            generated_ids = self.model.generate(**inputs, max_new_tokens=CAPTION_MAX_NEW_TOKENS)
+        return [caption.strip() for caption in self.processor.batch_decode(generated_ids, skip_special_tokens=True)]
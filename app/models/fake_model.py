@@ -0,0 +1,43 @@
+# app/models/fake_model.py
+
+import hashlib
+import os
+import time
+from typing import Any, List
+
+# Deterministic stand-in for the real models, for tests, benchmarks and machines without
+# torch/transformers. Enabled for every service with DOCUMORPH_FAKE_MODELS=1.
+
+USE_FAKE_MODELS = os.getenv("DOCUMORPH_FAKE_MODELS", "").lower() in ("1", "true", "yes")
+
+
+class FakeModel:
+    """
+    Returns "<name>:<first 12 hex chars of sha256(input)>" for every input.
+
+    `per_batch_ms` and `per_item_ms` simulate a forward pass with a fixed cost plus a
+    per-item cost, which is what makes batching pay off on real models.
+    """
+
+    def __init__(self, name: str, per_batch_ms: float = 0.0, per_item_ms: float = 0.0, memory_mb: int = 1):
+        self.name = name
+        self.memory_mb = memory_mb
+        self.per_batch_ms = per_batch_ms
+        self.per_item_ms = per_item_ms
+        self.calls = 0
+
+    def memory_bytes(self) -> int:
+        return self.memory_mb * 1024 * 1024
+
+    @staticmethod
+    def _as_bytes(item: Any) -> bytes:
+        if isinstance(item, bytes):
+            return item
+        return repr(item).encode("utf-8")
+
+    def predict_batch(self, inputs: List[Any]) -> List[str]:
+        self.calls += 1
+        delay_ms = self.per_batch_ms + self.per_item_ms * len(inputs)
+        if delay_ms:
+            time.sleep(delay_ms / 1000)
+        return [f"{self.name}:{hashlib.sha256(self._as_bytes(item)).hexdigest()[:12]}" for item in inputs]
@@ -0,0 +1,36 @@
+# app/models/pegasus_model.py
+
+import os
+from typing import List
+
+from app.models.base import PRETRAINED_KWARGS, module_bytes, import_torch_for_cpu
+
+# Pegasus abstractive summarization (text -> summary), CPU-only.
+
+PEGASUS_MODEL_ID = os.getenv("PEGASUS_MODEL_ID", "google/pegasus-xsum")
+PEGASUS_MAX_INPUT_TOKENS = int(os.getenv("PEGASUS_MAX_INPUT_TOKENS", "512"))
+PEGASUS_MAX_NEW_TOKENS = int(os.getenv("PEGASUS_MAX_NEW_TOKENS", "96"))
+
+
+class PegasusModel:
+    def __init__(self, model_id: str = PEGASUS_MODEL_ID):
+        self.torch = import_torch_for_cpu()
+        from transformers import PegasusForConditionalGeneration, PegasusTokenizer
+
+        self.model_id = model_id
+        self.tokenizer = PegasusTokenizer.from_pretrained(model_id, cache_dir=PRETRAINED_KWARGS["cache_dir"])
+        self.model = PegasusForConditionalGeneration.from_pretrained(model_id, **PRETRAINED_KWARGS).eval()
+
+    def memory_bytes(self) -> int:
+        return module_bytes(self.model)
+
+    def predict_batch(self, texts: List[str]) -> List[str]:
+        # Padding to the longest text in the batch (not the max length) keeps short
+        # batches cheap.
+        inputs = self.tokenizer(
+            texts, truncation=True, max_length=PEGASUS_MAX_INPUT_TOKENS,
+            padding="longest", return_tensors="pt",
+        )
+        with self.torch.inference_mode():
+            generated_ids = self.model.generate(**inputs, max_new_tokens=PEGASUS_MAX_NEW_TOKENS)
+        return self.tokenizer.batch_decode(generated_ids, skip_special_tokens=True)
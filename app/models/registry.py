@@ -0,0 +1,230 @@
+# app/models/registry.py
+
+import gc
+import itertools
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from app.services.logging_setup import get_logger
+
+# Lazy, memory-bounded model registry.
+# Models are registered by name with a loader and loaded on first use. Loaded models
+# are kept in LRU order; when loading another model would exceed the memory budget,
+# the least recently used ones are dropped first. An evicted model that a running batch
+# still holds keeps counting against the budget until its last reference is gone, and
+# is handed back (not loaded a second time) if it is asked for again meanwhile.
+#
+# Sharing weights across workers: with a pre-forking server (gunicorn --preload),
+# models listed in DOCUMORPH_PRELOAD_MODELS are loaded in the master before it forks,
+# then gc.freeze() moves them out of the collector's reach so workers share the pages
+# copy-on-write instead of each holding a private copy.
+
+MODEL_MEMORY_BUDGET_MB = int(os.getenv("DOCUMORPH_MODEL_MEMORY_BUDGET_MB", "4096"))
+WARM_MODELS = [n.strip() for n in os.getenv("DOCUMORPH_WARM_MODELS", "").split(",") if n.strip()]
+PRELOAD_MODELS = [n.strip() for n in os.getenv("DOCUMORPH_PRELOAD_MODELS", "").split(",") if n.strip()]
+
+MB = 1024 * 1024
+
+logger = get_logger("models.registry")
+
+
+@dataclass
+class ModelSpec:
+    name: str
+    loader: Callable[[], Any]
+    estimated_bytes: int  # Used to make room before loading; replaced by the measured size after
+
+
+class ModelRegistry:
+    def __init__(self, memory_budget_bytes: int):
+        self.memory_budget_bytes = memory_budget_bytes
+        self._specs: Dict[str, ModelSpec] = {}
+        self._loaded: "OrderedDict[str, Any]" = OrderedDict()  # name -> model, oldest first
+        self._sizes: Dict[str, int] = {}
+        self._reserved: Dict[str, int] = {}  # name -> estimated bytes of loads in progress
+        # Evicted models that are still referenced: token -> (name, bytes, finalizer).
+        self._retired: Dict[int, Tuple[str, int, weakref.finalize]] = {}
+        # Tokens of retired models that were freed. Appended by finalizers, which can run
+        # on any thread at any point (also while self._lock is held), so no lock there.
+        self._freed: deque = deque()
+        self._tokens = itertools.count()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds: Dict[str, float] = {}
+
+    def register(self, name: str, loader: Callable[[], Any], estimated_mb: int) -> None:
+        with self._lock:
+            self._specs[name] = ModelSpec(name, loader, estimated_mb * MB)
+            self._load_locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> Any:
+        """Returns the loaded model, loading it (and evicting others) on first use. Blocking."""
+        with self._lock:
+            model = self._loaded.get(name)
+            if model is not None:
+                self._loaded.move_to_end(name)
+                return model
+            if name not in self._specs:
+                raise KeyError(f"Unknown model '{name}'.")
+            spec = self._specs[name]
+            load_lock = self._load_locks[name]
+
+        # One loader per model at a time; other callers for the same model wait for it.
+        with load_lock:
+            with self._lock:
+                model = self._loaded.get(name)
+                if model is None:
+                    model = self._revive(name)
+                if model is not None:
+                    self._loaded.move_to_end(name)
+                    return model
+                # Reserve the estimate before loading, so concurrent loads of other models
+                # make room for this one too instead of all fitting against the same budget.
+                self._evict_for(spec.estimated_bytes)
+                self._reserved[name] = spec.estimated_bytes
+
+            try:
+                started = time.perf_counter()
+                model = spec.loader()
+                elapsed = time.perf_counter() - started
+                size = _measure_bytes(model) or spec.estimated_bytes
+            except BaseException:
+                with self._lock:
+                    self._reserved.pop(name, None)
+                raise
+
+            with self._lock:
+                self._reserved.pop(name, None)
+                self._loaded[name] = model
+                self._sizes[name] = size
+                self.loads += 1
+                self.load_seconds[name] = round(elapsed, 3)
+                self._evict_for(0, keep=name)
+            logger.info("Loaded '%s' in %.1fs (%.0f MB).", name, elapsed, size / MB)
+            return model
+
+    def _forget_freed(self) -> None:
+        # Caller must hold self._lock.
+        while self._freed:
+            self._retired.pop(self._freed.popleft(), None)
+
+    def _used_bytes(self) -> int:
+        # Caller must hold self._lock. Loads in progress count with their reservation,
+        # evicted models that are still in use with their size.
+        self._forget_freed()
+        return (sum(self._sizes.values()) + sum(self._reserved.values())
+                + sum(size for _, size, _ in self._retired.values()))
+
+    def _retire(self, name: str) -> None:
+        # Caller must hold self._lock. Drops the registry's reference to a loaded model;
+        # its size stays accounted for until the model is really freed.
+        model = self._loaded.pop(name)
+        size = self._sizes.pop(name, 0)
+        self.evictions += 1
+        token = next(self._tokens)
+        try:
+            finalizer = weakref.finalize(model, self._freed.append, token)
+        except TypeError:
+            return  # Not weak-referenceable, so there is no telling when it is freed.
+        self._retired[token] = (name, size, finalizer)
+        del model  # If nothing else holds it, the finalizer runs right here.
+
+    def _revive(self, name: str) -> Any:
+        # Caller must hold self._lock. Returns an evicted model that is still alive back
+        # to the loaded set, or None.
+        for token, (retired_name, size, finalizer) in list(self._retired.items()):
+            alive = finalizer.peek() if retired_name == name else None
+            if alive is not None:
+                finalizer.detach()
+                del self._retired[token]
+                self._loaded[name] = alive[0]
+                self._sizes[name] = size
+                logger.info("Reusing '%s', evicted but still in use.", name)
+                return alive[0]
+        return None
+
+    def _evict_for(self, incoming_bytes: int, keep: Optional[str] = None) -> None:
+        # Caller must hold self._lock.
+        evicted = False
+        while self._loaded and self._used_bytes() + incoming_bytes > self.memory_budget_bytes:
+            oldest = next(iter(self._loaded))
+            if oldest == keep:
+                break  # A single model larger than the budget still has to be usable.
+            self._retire(oldest)
+            evicted = True
+            logger.info("Evicted '%s' to stay within the memory budget.", oldest)
+        if evicted:
+            gc.collect()  # Release the evicted model's tensors before the next load allocates
+
+    def evict(self, name: str) -> bool:
+        with self._lock:
+            if name not in self._loaded:
+                return False
+            self._retire(name)
+        gc.collect()
+        return True
+
+    def is_loaded(self, name: str) -> bool:
+        with self._lock:
+            return name in self._loaded
+
+    def warm_in_background(self, names: Iterable[str]) -> Optional[threading.Thread]:
+        """Loads `names` one by one on a daemon thread, so the server answers requests meanwhile."""
+        names = [n for n in names if n in self._specs]
+        if not names:
+            return None
+
+        def _warm() -> None:
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    logger.error("Warm-up of '%s' failed: %s", name, e, exc_info=True)
+
+        thread = threading.Thread(target=_warm, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def preload_for_fork(self, names: Iterable[str]) -> None:
+        """Loads models in the parent process, then freezes them for copy-on-write sharing."""
+        for name in names:
+            self.get(name)
+        gc.collect()
+        gc.freeze()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_budget_mb": round(self.memory_budget_bytes / MB),
+                "loaded": {name: round(self._sizes[name] / MB) for name in self._loaded},
+                "loading": {name: round(size / MB) for name, size in self._reserved.items()},
+                "evicted_in_use": self._retired_mb(),
+                "registered": sorted(self._specs),
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "load_seconds": dict(self.load_seconds),
+            }
+
+    def _retired_mb(self) -> Dict[str, int]:
+        # Caller must hold self._lock.
+        self._forget_freed()
+        retired: Dict[str, int] = {}
+        for name, size, _ in self._retired.values():
+            retired[name] = retired.get(name, 0) + round(size / MB)
+        return retired
+
+
+def _measure_bytes(model: Any) -> int:
+    """Best-effort size: the wrapper's own report, else 0 (fall back to the estimate)."""
+    memory_bytes = getattr(model, "memory_bytes", None)
+    return int(memory_bytes()) if callable(memory_bytes) else 0
+
+
+model_registry = ModelRegistry(MODEL_MEMORY_BUDGET_MB * MB)
@@ -0,0 +1,52 @@
+# app/models/tapas_model.py
+
+import os
+from typing import List, Tuple
+
+from app.models.base import PRETRAINED_KWARGS, module_bytes, import_torch_for_cpu
+
+# TAPAS table question answering ((table, question) -> answer), CPU-only.
+# A table is a dict of column name -> list of cell values (all cells are stringified).
+
+TAPAS_MODEL_ID = os.getenv("TAPAS_MODEL_ID", "google/tapas-base-finetuned-wtq")
+TAPAS_AGGREGATIONS = ("NONE", "SUM", "AVERAGE", "COUNT")  # WTQ aggregation head labels
+
+
+class TapasModel:
+    def __init__(self, model_id: str = TAPAS_MODEL_ID):
+        self.torch = import_torch_for_cpu()
+        from transformers import TapasForQuestionAnswering, TapasTokenizer
+
+        self.model_id = model_id
+        self.tokenizer = TapasTokenizer.from_pretrained(model_id, cache_dir=PRETRAINED_KWARGS["cache_dir"])
+        self.model = TapasForQuestionAnswering.from_pretrained(model_id, **PRETRAINED_KWARGS).eval()
+
+    def memory_bytes(self) -> int:
+        return module_bytes(self.model)
+
+    def predict_batch(self, items: List[Tuple[dict, str]]) -> List[str]:
+        import pandas as pd
+
+        # TAPAS encodes one table with many questions per call, so questions that
+        # share a table object are answered in one forward pass.
+        answers: List[str] = [""] * len(items)
+        groups = {}
+        for index, (table, question) in enumerate(items):
+            groups.setdefault(id(table), (table, []))[1].append((index, question))
+
+        for table, questions in groups.values():
+            frame = pd.DataFrame({str(k): [str(v) for v in values] for k, values in table.items()})
+            inputs = self.tokenizer(
+                table=frame, queries=[q for _, q in questions],
+                padding="max_length", truncation=True, return_tensors="pt",
+            )
+            with self.torch.inference_mode():
+                outputs = self.model(**inputs)
+            coordinates, aggregation_ids = self.tokenizer.convert_logits_to_predictions(
+                inputs, outputs.logits.detach(), outputs.logits_aggregation.detach()
+            )
+            for (index, _), cells, aggregation_id in zip(questions, coordinates, aggregation_ids):
+                values = [frame.iat[row, column] for row, column in cells]
+                aggregation = TAPAS_AGGREGATIONS[aggregation_id] if aggregation_id < len(TAPAS_AGGREGATIONS) else "NONE"
+                answers[index] = ", ".join(values) if aggregation == "NONE" else f"{aggregation} of {', '.join(values)}"
+        return answers
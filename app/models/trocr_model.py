@@ -0,0 +1,30 @@
+# app/models/trocr_model.py
+
+import os
+from typing import List
+
+from app.models.base import PRETRAINED_KWARGS, module_bytes, decode_images, import_torch_for_cpu
+
+# TrOCR handwriting recognition (image -> text), CPU-only.
+
+TROCR_MODEL_ID = os.getenv("TROCR_MODEL_ID", "microsoft/trocr-base-handwritten")
+TROCR_MAX_NEW_TOKENS = int(os.getenv("TROCR_MAX_NEW_TOKENS", "64"))
+
+
+class TrOCRModel:
+    def __init__(self, model_id: str = TROCR_MODEL_ID):
+        self.torch = import_torch_for_cpu()
+        from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+
+        self.model_id = model_id
+        self.processor = TrOCRProcessor.from_pretrained(model_id, cache_dir=PRETRAINED_KWARGS["cache_dir"])
+        self.model = VisionEncoderDecoderModel.from_pretrained(model_id, **PRETRAINED_KWARGS).eval()
+
+    def memory_bytes(self) -> int:
+        return module_bytes(self.model)
+
+    def predict_batch(self, images: List[bytes]) -> List[str]:
+        pixel_values = self.processor(images=decode_images(images), return_tensors="pt").pixel_values
+        with self.torch.inference_mode():
+            generated_ids = self.model.generate(pixel_values, max_new_tokens=TROCR_MAX_NEW_TOKENS)
+        return self.processor.batch_decode(generated_ids, skip_special_tokens=True)
@@ -1,10 +1,25 @@
 # app/routes/format_v1.py
 
-from fastapi import APIRouter, Form, HTTPException # Depends not used here
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Form, HTTPException, Request # Depends not used here
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response
 from pathlib import Path
+from starlette.background import BackgroundTask
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import os
+import uuid
+import zipfile
 
-from app.services.doc_formatter_v1 import apply_dummy_formatting 
+from app.services.doc_formatter_v1 import (
+    apply_batch_formatting, apply_dummy_formatting, apply_full_formatting, apply_template_formatting, FORMATTER_VERSION,
+)
+from app.services.docx_templates import TEMPLATE_COMPILER_VERSION, template_files
+from app.services.format_executor import format_executor, FormatUnavailable, FormatJobTimeout
+from app.services.logging_setup import get_logger
+from app.services.output_cache import output_cache
+from app.services.tracing import stage
+from app.services.upload_store import upload_store, hash_file
 
 router = APIRouter(
     prefix="/format" # Full path will be /api/v1/format
@@ -16,18 +31,95 @@ BASE_OUTPUT_DIR = Path("data/sample_outputs")
 BASE_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 BASE_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+DOCX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+logger = get_logger("routes.format_v1")
+
+# "dummy": short preview document (old flow). "full": streams the whole text into the DOCX.
+FORMAT_MODES = ("dummy", "full")
+
+FORMAT_BATCH_MAX_FILES = int(os.getenv("DOCUMORPH_FORMAT_BATCH_MAX_FILES", "100"))
+FORMAT_BATCH_CHUNK_FILES = int(os.getenv("DOCUMORPH_FORMAT_BATCH_CHUNK_FILES", "8"))  # Documents per pool job
+ZIP_MEDIA_TYPE = "application/zip"
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """True if an If-None-Match header value matches our (strong) ETag."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+async def _template_digest(template_name: Optional[str]) -> Optional[str]:
+    """Digest of the named template (see /api/v1/templates), or None for the built-in one."""
+    if not template_name:
+        return None
+    digest = await run_in_threadpool(template_files.digest_for, Path(template_name).name)
+    if digest is None:
+        raise HTTPException(status_code=404, detail=f"Template '{template_name}' not found. Please upload it first.")
+    return digest
+
+
+def _resolve_inputs(names: List[str]) -> Dict[str, Tuple[Optional[str], Path]]:
+    """
+    Maps each name (or upload digest) to (content digest, path). Files dropped directly
+    into data/uploads/ (older flow) have no digest yet. Blocking: the store queries its
+    index under a lock, so call this once per request through run_in_threadpool.
+    """
+    resolved = {}
+    for name in names:
+        found = upload_store.lookup(name)
+        resolved[name] = found if found else (None, BASE_UPLOAD_DIR / name)
+    return resolved
+
+
+def _format_options(mode: str, safe_filename: str, template_digest: Optional[str]) -> dict:
+    # The dummy output embeds the filename, so it is part of that key.
+    options = {"mode": mode, "source_name": safe_filename} if mode == "dummy" else {"mode": mode}
+    if template_digest:
+        options.update(template=template_digest, template_compiler=TEMPLATE_COMPILER_VERSION)
+    return options
+
+
+def _download_name(safe_filename: str, mode: str) -> str:
+    stem = Path(safe_filename).stem
+    return f"{stem}_formatted_dummy.docx" if mode == "dummy" else f"{stem}_formatted.docx"
+
+
+@router.get("/cache/stats", summary="Formatted-output cache counters")
+async def format_cache_stats():
+    return output_cache.stats()
+
+
+@router.get("/pool/stats", summary="Formatting worker pool counters")
+async def format_pool_stats():
+    return format_executor.stats()
+
+
 @router.post("/document/", summary="Format an uploaded document (dummy) and provide it for download")
 async def format_and_download_document_route( # Renamed function for clarity vs service
-    filename: str = Form(..., description="The name of the previously uploaded file (e.g., 'my_document.txt'). Must exist in data/uploads/.")
-    # template_name: str = Form(None, description="Future: Name of the template to apply."),
+    request: Request,
+    filename: str = Form(..., description="The name of the previously uploaded file (e.g., 'my_document.txt'), or the digest the upload returned."),
+    mode: str = Form("dummy", description="'dummy' for a short preview document, 'full' to convert the whole text."),
+    template_name: Optional[str] = Form(None, description="Name of an uploaded style template (see /api/v1/templates)."),
 ):
     """
-    (Old Flow - Dummy Formatting)
-    Takes a `filename` (assumed to be in `data/uploads/`),
-    applies dummy formatting using `python-docx` via a service,
+    Takes a `filename` (assumed to be in `data/uploads/`), formats it via a service
     and returns the formatted .docx file for download.
+
+    - `mode=dummy` (old flow): a short preview document built with `python-docx`.
+    - `mode=full`: the entire text, streamed paragraph by paragraph into the DOCX.
+
+    Outputs are cached by (input content digest, formatter version, options), so a
+    repeated request is served from disk without rebuilding the DOCX. The response
+    carries an ETag; clients sending a matching If-None-Match get a 304.
+
+    With `template_name`, the output is built from that template's compiled form:
+    its styles, numbering, headers/footers and page setup are kept, and lines starting
+    with "#", "##", "###", "-" or "1." become headings and list items.
     """
-    print(f"ROUTE (format_v1): Received request to format filename: '{filename}'")
+    logger.debug("Format request for '%s' (mode %s)", filename, mode)
 
     # Basic input validation for filename parameter itself
     if not filename or ".." in filename or "/" in filename or "\\" in filename: # More robust sanitization
@@ -35,43 +127,226 @@ async def format_and_download_document_route( # Renamed function for clarity vs
     
     safe_filename = Path(filename).name # Ensures we only use the basename
 
-    input_file_path = BASE_UPLOAD_DIR / safe_filename
-    output_filename_stem = input_file_path.stem 
-    output_file_path = BASE_OUTPUT_DIR / f"{output_filename_stem}_formatted_dummy.docx" # Made output name more specific
+    if mode not in FORMAT_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid mode '{mode}'. Expected one of: {', '.join(FORMAT_MODES)}.")
+
+    # Uploads are stored by content digest; `filename` is an uploaded name or the digest
+    # the upload returned. It is resolved once, so a concurrent upload under the same
+    # name cannot swap the content mid-request. Files dropped directly into
+    # data/uploads/ (older flow) are still accepted.
+    stored_digest, input_file_path = (await run_in_threadpool(_resolve_inputs, [safe_filename]))[safe_filename]
+    download_name = _download_name(safe_filename, mode)
+    template_digest = await _template_digest(template_name)
 
     if not input_file_path.is_file():
-        print(f"ROUTE ERROR (format_v1): Input file '{input_file_path}' not found for formatting.")
+        logger.warning("Input file '%s' not found for formatting.", input_file_path)
         raise HTTPException(
             status_code=404, 
             detail=f"Input file '{safe_filename}' not found. Please ensure it was uploaded correctly."
         )
 
     try:
-        # Call the service
-        await apply_dummy_formatting(
-            input_file_path_str=str(input_file_path), 
-            output_file_path_str=str(output_file_path)
-        )
+        # The upload store already knows the digest; only legacy files need hashing here.
+        with stage("read"):
+            input_digest = stored_digest or await run_in_threadpool(hash_file, input_file_path)
+
+        format_options = _format_options(mode, safe_filename, template_digest)
+        cache_key = output_cache.make_key(input_digest, FORMATTER_VERSION, format_options)
+        etag = f'"{cache_key}"'
+        cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        # A matching If-None-Match only needs the entry to exist; nothing is checked out.
+        if _etag_matches(request.headers.get("if-none-match"), etag) and output_cache.contains(cache_key):
+            return Response(status_code=304, headers=cache_headers)
+
+        # Served from a checkout (a private link), so eviction cannot remove it mid-response.
+        output_file_path = output_cache.checkout(cache_key)
 
-        if not output_file_path.is_file():
-            print(f"ROUTE ERROR (format_v1): Service did not create output file at '{output_file_path}'.")
-            raise HTTPException(status_code=500, detail="Internal error: Formatted file was not generated.")
+        cache_status = "HIT"
+        if output_file_path is None:
+            # Only one request formats a given key; concurrent misses wait and reuse its output.
+            async with output_cache.lock_for(cache_key):
+                output_file_path = output_cache.checkout(cache_key, count=False)
+                if output_file_path is None:
+                    cache_status = "MISS"
+                    tmp_output_path = output_cache.tmp_path_for(cache_key)
+                    try:
+                        # Measured from here, so it includes any wait for a free pool worker.
+                        with stage("build_docx"):
+                            if template_digest:
+                                await apply_template_formatting(
+                                    input_file_path_str=str(input_file_path),
+                                    output_file_path_str=str(tmp_output_path),
+                                    template_digest=template_digest,
+                                    mode=mode,
+                                    source_name=safe_filename
+                                )
+                            elif mode == "full":
+                                await apply_full_formatting(
+                                    input_file_path_str=str(input_file_path),
+                                    output_file_path_str=str(tmp_output_path)
+                                )
+                            else:
+                                await apply_dummy_formatting(
+                                    input_file_path_str=str(input_file_path), 
+                                    output_file_path_str=str(tmp_output_path),
+                                    source_name=safe_filename
+                                )
 
-        print(f"ROUTE (format_v1): Sending formatted file '{output_file_path.name}' for download.")
+                        if not tmp_output_path.is_file():
+                            logger.error("Service did not create output file at '%s'.", tmp_output_path)
+                            raise HTTPException(status_code=500, detail="Internal error: Formatted file was not generated.")
+                        with stage("save"):
+                            output_file_path = output_cache.put(cache_key, tmp_output_path, checkout=True)
+                    finally:
+                        # Moved into the cache by put(); still here only if formatting or saving failed.
+                        tmp_output_path.unlink(missing_ok=True)
+
+        logger.debug("Sending '%s' (cache %s)", download_name, cache_status)
         return FileResponse(
             path=output_file_path, 
-            filename=output_file_path.name, 
-            media_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+            filename=download_name, 
+            media_type=DOCX_MEDIA_TYPE,
+            headers={**cache_headers, "X-Cache": cache_status},
+            background=BackgroundTask(output_file_path.unlink, missing_ok=True),  # Drop the checkout
         )
+    except HTTPException:
+        raise
+    except FormatUnavailable as e_full:
+        logger.warning("Formatting unavailable, rejecting '%s': %s", safe_filename, e_full)
+        raise HTTPException(status_code=503, detail=str(e_full), headers={"Retry-After": str(e_full.retry_after)})
+    except FormatJobTimeout as e_timeout:
+        logger.error("Formatting timed out for '%s'.", safe_filename)
+        raise HTTPException(status_code=504, detail=str(e_timeout))
     except FileNotFoundError as e_fnf: # Catching specific errors from the service
-        print(f"ROUTE ERROR (format_v1): FileNotFoundError from service: {e_fnf}")
+        logger.warning("FileNotFoundError from service: %s", e_fnf)
         raise HTTPException(status_code=404, detail=str(e_fnf)) # Make sure detail is user-friendly
     except IOError as e_io:
-        print(f"ROUTE ERROR (format_v1): IOError from service: {e_io}")
+        logger.error("IOError from service: %s", e_io, exc_info=True)
         raise HTTPException(status_code=500, detail=f"File processing error: {str(e_io)}")
     except Exception as e_service: # Catch more general exceptions from the service
         # This will catch the "Dummy formatting failed: All strings must be XML compatible..."
-        print(f"ROUTE ERROR (format_v1): Exception from formatting service: {e_service}")
+        logger.error("Exception from formatting service: %s", e_service, exc_info=True)
         # Extract the original specific error message if it's a chained exception
         original_error_msg = str(e_service.args[0]) if e_service.args else str(e_service)
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred during processing: {original_error_msg}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred during processing: {original_error_msg}")
+
+def _write_zip(zip_path: Path, members: List[tuple]) -> None:
+    # DOCX files are already deflated; storing them keeps packaging at copy speed.
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED) as archive:
+        for arcname, path in members:
+            archive.write(path, arcname)
+
+
+@router.post("/batch", summary="Format several uploaded documents with one template; returns a ZIP")
+async def format_batch_route(
+    filenames: List[str] = Form(..., description="Names (or upload digests) of previously uploaded files. Repeat the field for each document."),
+    template_name: Optional[str] = Form(None, description="Name of an uploaded style template (see /api/v1/templates)."),
+    mode: str = Form("full", description="'full' to convert the whole text, 'dummy' for short preview documents."),
+):
+    """
+    Formats many documents against one template in a single call and returns them as a
+    ZIP archive. Documents already formatted with the same template and options come
+    from the output cache; the rest are split into pool jobs of a few documents each,
+    so every worker loads the compiled template once per job, not once per document.
+    """
+    if mode not in FORMAT_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid mode '{mode}'. Expected one of: {', '.join(FORMAT_MODES)}.")
+    safe_filenames = list(dict.fromkeys(Path(name).name for name in filenames if name))  # Drop duplicates, keep order
+    if not safe_filenames or any(name in (".", "..") for name in safe_filenames):
+        raise HTTPException(status_code=400, detail="Invalid filename provided.")
+    if len(safe_filenames) > FORMAT_BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {FORMAT_BATCH_MAX_FILES} documents per batch.")
+    template_digest = await _template_digest(template_name)
+
+    resolved = await run_in_threadpool(_resolve_inputs, safe_filenames)  # One hop for the whole batch
+    input_paths = {name: path for name, (_, path) in resolved.items()}
+    missing = [name for name, path in input_paths.items() if not path.is_file()]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Input file(s) not found: {', '.join(missing)}. Please upload them first.")
+
+    outputs: Dict[str, Path] = {}  # filename -> formatted DOCX (checkout or freshly built)
+    pending = []                   # (filename, cache key, tmp output path) still to build
+    checkouts: List[Path] = []     # Private links to cache entries, removed once packaged
+    try:
+        with stage("read"):
+            for name in safe_filenames:
+                input_digest = resolved[name][0] or await run_in_threadpool(hash_file, input_paths[name])
+                cache_key = output_cache.make_key(input_digest, FORMATTER_VERSION, _format_options(mode, name, template_digest))
+                cached_path = output_cache.checkout(cache_key)
+                if cached_path is not None:
+                    checkouts.append(cached_path)
+                    outputs[name] = cached_path
+                else:
+                    pending.append((name, cache_key, output_cache.tmp_path_for(f"{cache_key}-{uuid.uuid4().hex}")))
+
+        if pending:
+            # At most one pool job per worker from this request, so a big batch leaves
+            # queue room for other users' single-document requests.
+            worker_slots = asyncio.Semaphore(max(1, format_executor.workers))
+            jobs = [(str(input_paths[name]), str(tmp_path), template_digest, mode, name) for name, _, tmp_path in pending]
+
+            async def run_chunk(chunk):
+                async with worker_slots:
+                    return await apply_batch_formatting(chunk)
+
+            with stage("build_docx"):
+                # Every chunk runs to the end even if one fails, so none is still writing
+                # its outputs when the cleanup below removes them.
+                chunk_results = await asyncio.gather(*(
+                    run_chunk(jobs[i:i + FORMAT_BATCH_CHUNK_FILES]) for i in range(0, len(jobs), FORMAT_BATCH_CHUNK_FILES)
+                ), return_exceptions=True)
+            for chunk_result in chunk_results:
+                if isinstance(chunk_result, BaseException):
+                    raise chunk_result
+            for name, _, tmp_path in pending:
+                outputs[name] = tmp_path
+
+        # One entry per document; stems that collide (a.txt, a.md) get a numeric suffix.
+        members, used_names = [], set()
+        for name in safe_filenames:
+            arcname = _download_name(name, mode)
+            counter = 2
+            while arcname in used_names:
+                arcname = f"{Path(_download_name(name, mode)).stem}_{counter}.docx"
+                counter += 1
+            used_names.add(arcname)
+            members.append((arcname, outputs[name]))
+        zip_path = output_cache.tmp_dir / f"batch-{uuid.uuid4().hex}.zip"
+        with stage("package"):
+            try:
+                await run_in_threadpool(_write_zip, zip_path, members)
+            except BaseException:
+                zip_path.unlink(missing_ok=True)
+                raise
+
+        with stage("save"):
+            for name, cache_key, tmp_path in pending:
+                output_cache.put(cache_key, tmp_path)
+    except FormatUnavailable as e_full:
+        logger.warning("Formatting unavailable, rejecting batch of %d: %s", len(safe_filenames), e_full)
+        raise HTTPException(status_code=503, detail=str(e_full), headers={"Retry-After": str(e_full.retry_after)})
+    except FormatJobTimeout as e_timeout:
+        logger.error("Batch formatting timed out.")
+        raise HTTPException(status_code=504, detail=str(e_timeout))
+    except FileNotFoundError as e_fnf:
+        logger.warning("FileNotFoundError from service: %s", e_fnf)
+        raise HTTPException(status_code=404, detail=str(e_fnf))
+    except Exception as e_service:
+        logger.error("Exception from batch formatting: %s", e_service, exc_info=True)
+        original_error_msg = str(e_service.args[0]) if e_service.args else str(e_service)
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred during processing: {original_error_msg}")
+    finally:
+        for _, _, tmp_path in pending:
+            tmp_path.unlink(missing_ok=True)  # Left over only if formatting or packaging failed
+        for served_path in checkouts:
+            served_path.unlink(missing_ok=True)
+
+    logger.debug("Sending batch of %d documents (%d from cache)", len(members), len(members) - len(pending))
+    return FileResponse(
+        path=zip_path,
+        filename=f"formatted_{len(members)}_documents.zip",
+        media_type=ZIP_MEDIA_TYPE,
+        headers={"X-Cache-Hits": str(len(members) - len(pending)), "X-Cache-Misses": str(len(pending))},
+        background=BackgroundTask(zip_path.unlink, missing_ok=True),
+    )
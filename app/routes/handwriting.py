@@ -0,0 +1,34 @@
+# app/routes/handwriting.py
+
+from fastapi import APIRouter, File, UploadFile, HTTPException
+
+from app.services.batching import BatcherOverloaded
+from app.services.logging_setup import get_logger
+from app.services.ocr_engine import recognize_handwriting
+
+router = APIRouter(
+    prefix="/handwriting" # Full path will be /api/v1/handwriting
+)
+
+logger = get_logger("routes.handwriting")
+
+
+@router.post("/recognize", summary="Recognize handwritten text in an image (TrOCR)")
+async def recognize_handwriting_route(
+    file: UploadFile = File(..., description="An image of a handwritten line or short passage.")
+):
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail=f"Invalid file type: {file.content_type}. Only image files are accepted.")
+    try:
+        image_bytes = await file.read()
+        text = await recognize_handwriting(image_bytes)
+        return {"filename": file.filename, "text": text}
+    except BatcherOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ImportError as e:
+        raise HTTPException(status_code=503, detail=f"Handwriting model is not available on this server: {e}")
+    except Exception as e:
+        logger.error("Recognition failed for '%s': %s", file.filename, e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Handwriting recognition failed: {str(e)}")
+    finally:
+        await file.close()
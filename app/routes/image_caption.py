@@ -0,0 +1,34 @@
+# app/routes/image_caption.py
+
+from fastapi import APIRouter, File, UploadFile, HTTPException
+
+from app.services.batching import BatcherOverloaded
+from app.services.logging_setup import get_logger
+from app.services.image_captioning import caption_image
+
+router = APIRouter(
+    prefix="/caption" # Full path will be /api/v1/caption
+)
+
+logger = get_logger("routes.image_caption")
+
+
+@router.post("/image", summary="Generate a caption for an image (BLIP)")
+async def caption_image_route(
+    file: UploadFile = File(..., description="The image to describe.")
+):
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail=f"Invalid file type: {file.content_type}. Only image files are accepted.")
+    try:
+        image_bytes = await file.read()
+        caption = await caption_image(image_bytes)
+        return {"filename": file.filename, "caption": caption}
+    except BatcherOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ImportError as e:
+        raise HTTPException(status_code=503, detail=f"Captioning model is not available on this server: {e}")
+    except Exception as e:
+        logger.error("Captioning failed for '%s': %s", file.filename, e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Image captioning failed: {str(e)}")
+    finally:
+        await file.close()
@@ -1,55 +1,206 @@
 # File: app/routes/orchestrate_v1.py
-from fastapi import APIRouter, File, UploadFile, HTTPException
+from fastapi import APIRouter, File, Form, Header, UploadFile, HTTPException, Request
+from fastapi.responses import StreamingResponse
+import asyncio
 import httpx
+import json
 import os
+from typing import Tuple
+
+from app.services.http_client import post_file_with_retries
+from app.services.logging_setup import get_logger
+from app.services.job_queue import (
+    JobFailed, JobQueue, JobQueueFull,
+    JOB_DATA_DIR, JOB_MAX_PENDING, JOB_PER_TENANT_LIMIT, JOB_WORKERS,
+)
+from app.services.job_store import Job, JobStore
+from app.services.tracing import stage
 
 router = APIRouter() # No prefix here, it will be handled in main.py
 
+logger = get_logger("routes.orchestrate_v1")
+
 N8N_PROCESS_DOCUMENT_WEBHOOK_URL = os.getenv("N8N_PROCESS_DOCUMENT_WEBHOOK_URL_ENV")
 
 if not N8N_PROCESS_DOCUMENT_WEBHOOK_URL:
-    print("ORCHESTRATE_V1 (Module Load): CRITICAL ERROR - N8N_PROCESS_DOCUMENT_WEBHOOK_URL_ENV is NOT SET.")
+    logger.critical("N8N_PROCESS_DOCUMENT_WEBHOOK_URL_ENV is NOT SET; orchestration endpoints will answer 503.")
 else:
-    print(f"ORCHESTRATE_V1 (Module Load): n8n Webhook URL configured as: {N8N_PROCESS_DOCUMENT_WEBHOOK_URL}")
+    logger.info("n8n webhook URL configured", extra={"url": N8N_PROCESS_DOCUMENT_WEBHOOK_URL})
+
+SSE_KEEPALIVE_SECONDS = 15.0
+MAX_TENANT_ID_LENGTH = 64
 
 @router.post("/process-document", summary="Process document via n8n orchestration")
 async def process_document_via_orchestrator(
     file: UploadFile = File(..., description="The document file to process (e.g., an image for OCR).")
 ):
-    print(f"ORCHESTRATE_V1: Endpoint /process-document CALLED. Filename: {file.filename}")
+    logger.debug("/process-document called for '%s'", file.filename)
     if not N8N_PROCESS_DOCUMENT_WEBHOOK_URL:
-        print("ORCHESTRATE_V1: CRITICAL - N8N_PROCESS_DOCUMENT_WEBHOOK_URL is effectively None or empty.")
+        logger.error("N8N_PROCESS_DOCUMENT_WEBHOOK_URL is not configured; rejecting request.")
         raise HTTPException(
             status_code=503, 
             detail="Orchestration service is currently unavailable or not configured."
         )
     if not file.content_type or not file.content_type.startswith("image/"):
-        print(f"ORCHESTRATE_V1: Invalid file type received: {file.content_type}")
+        logger.debug("Invalid file type received: %s", file.content_type)
         raise HTTPException(
             status_code=400, 
             detail=f"Invalid file type: {file.content_type}. Only image files are currently accepted."
         )
     try:
-        file_content = await file.read()
-        files_to_send_to_n8n = {'document_file': (file.filename, file_content, file.content_type)}
-        print(f"ORCHESTRATE_V1: Forwarding '{file.filename}' to n8n at: {N8N_PROCESS_DOCUMENT_WEBHOOK_URL}")
-        async with httpx.AsyncClient(timeout=90.0) as client:
-            response_from_n8n = await client.post(N8N_PROCESS_DOCUMENT_WEBHOOK_URL, files=files_to_send_to_n8n)
+        # Stream straight from the upload's spool file through the shared, pooled client;
+        # no in-memory copy of the image and no per-request client/TLS setup.
+        with stage("forward"):
+            response_from_n8n = await post_file_with_retries(
+                N8N_PROCESS_DOCUMENT_WEBHOOK_URL,
+                field_name='document_file',
+                filename=file.filename,
+                fileobj=file.file,
+                content_type=file.content_type,
+            )
         response_from_n8n.raise_for_status() 
         processed_result = response_from_n8n.json()
-        print(f"ORCHESTRATE_V1: Success response from n8n: {processed_result}")
+        # Only the size; results can be large and contain document content.
+        logger.debug("n8n processed '%s' (%d response bytes)", file.filename, len(response_from_n8n.content))
         return processed_result
     except httpx.TimeoutException:
-        print(f"ORCHESTRATE_V1: Timeout calling n8n: {N8N_PROCESS_DOCUMENT_WEBHOOK_URL}")
+        logger.error("Timeout calling n8n at %s", N8N_PROCESS_DOCUMENT_WEBHOOK_URL)
         raise HTTPException(status_code=504, detail="Request to orchestration service timed out.")
     except httpx.RequestError as exc:
-        print(f"ORCHESTRATE_V1: HTTP request error calling n8n: {exc}")
+        logger.error("HTTP request error calling n8n: %s", exc)
         raise HTTPException(status_code=503, detail=f"Error communicating with orchestration service: {str(exc)}")
     except httpx.HTTPStatusError as exc:
-        print(f"ORCHESTRATE_V1: n8n returned error {exc.response.status_code}: {exc.response.text}")
+        logger.error("n8n returned error %d", exc.response.status_code, extra={"body": exc.response.text[:500]})
         raise HTTPException(status_code=exc.response.status_code, detail=f"Orchestration service error: {exc.response.text}")
     except Exception as e:
-        print(f"ORCHESTRATE_V1: Unexpected error in /process-document: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"An unexpected server error occurred: {str(e)}")
\ No newline at end of file
+        logger.error("Unexpected error in /process-document: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An unexpected server error occurred: {str(e)}")
+
+
+# --- Asynchronous jobs: submit / poll / stream ---
+# Instead of holding the connection open while n8n works, clients submit a job, get
+# its id back at once, then poll GET /jobs/{id} or subscribe to GET /jobs/{id}/events (SSE).
+
+async def _forward_job_to_n8n(job: Job) -> Tuple[int, dict]:
+    """Job handler: sends the spooled input to n8n and returns its JSON result."""
+    if not N8N_PROCESS_DOCUMENT_WEBHOOK_URL:
+        raise JobFailed("Orchestration service is currently unavailable or not configured.", 503)
+    try:
+        with open(job.input_path, "rb") as input_file, stage("forward"):
+            response_from_n8n = await post_file_with_retries(
+                N8N_PROCESS_DOCUMENT_WEBHOOK_URL,
+                field_name='document_file',
+                filename=job.filename,
+                fileobj=input_file,
+                content_type=job.content_type,
+            )
+        response_from_n8n.raise_for_status()
+        return response_from_n8n.status_code, response_from_n8n.json()
+    except FileNotFoundError:
+        raise JobFailed("The uploaded input for this job is no longer available.", 410)
+    except httpx.TimeoutException:
+        raise JobFailed("Request to orchestration service timed out.", 504)
+    except httpx.HTTPStatusError as exc:
+        raise JobFailed(f"Orchestration service error: {exc.response.text}", exc.response.status_code)
+    except httpx.RequestError as exc:
+        raise JobFailed(f"Error communicating with orchestration service: {str(exc)}", 503)
+    except ValueError:
+        raise JobFailed("Orchestration service returned a non-JSON response.", 502)
+
+
+job_queue = JobQueue(
+    store=JobStore(JOB_DATA_DIR / "jobs.sqlite3"),
+    handler=_forward_job_to_n8n,
+    spool_dir=JOB_DATA_DIR / "inputs",
+    workers=JOB_WORKERS,
+    per_tenant_limit=JOB_PER_TENANT_LIMIT,
+    max_pending=JOB_MAX_PENDING,
+)
+
+
+def _validate_tenant(tenant_id: str) -> str:
+    tenant_id = tenant_id.strip()
+    if not tenant_id or len(tenant_id) > MAX_TENANT_ID_LENGTH:
+        raise HTTPException(status_code=400, detail="Invalid X-Tenant-ID header.")
+    return tenant_id
+
+
+async def _get_job_for_tenant(job_id: str, tenant_id: str) -> Job:
+    job = await job_queue.get(job_id)
+    if job is None or job.tenant != tenant_id: # Don't reveal other tenants' jobs
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return job
+
+
+@router.post("/jobs", status_code=202, summary="Submit a document for asynchronous n8n processing")
+async def submit_orchestration_job(
+    request: Request,
+    file: UploadFile = File(..., description="The document file to process (e.g., an image for OCR)."),
+    priority: int = Form(0, ge=-10, le=10, description="Higher runs sooner within the queue."),
+    x_tenant_id: str = Header("default", alias="X-Tenant-ID"),
+):
+    tenant_id = _validate_tenant(x_tenant_id)
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Invalid file type: {file.content_type}. Only image files are currently accepted."
+        )
+    try:
+        job = await job_queue.submit(tenant_id, priority, file.filename or "upload", file.content_type, file.file)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=f"Too many pending jobs: {e}",
+                            headers={"Retry-After": str(e.retry_after)})
+    finally:
+        await file.close()
+
+    status_url = request.url_for("get_orchestration_job", job_id=job.id)
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": str(status_url),
+        "events_url": str(request.url_for("stream_orchestration_job_events", job_id=job.id)),
+    }
+
+
+@router.get("/jobs/{job_id}", summary="Get the status (and result, once finished) of a job")
+async def get_orchestration_job(job_id: str, x_tenant_id: str = Header("default", alias="X-Tenant-ID")):
+    job = await _get_job_for_tenant(job_id, _validate_tenant(x_tenant_id))
+    return job.to_public_dict()
+
+
+@router.get("/jobs/{job_id}/events", summary="Stream job status changes as Server-Sent Events")
+async def stream_orchestration_job_events(
+    job_id: str,
+    request: Request,
+    x_tenant_id: str = Header("default", alias="X-Tenant-ID"),
+):
+    await _get_job_for_tenant(job_id, _validate_tenant(x_tenant_id))
+
+    async def event_stream():
+        last_status = None
+        while True:
+            update = job_queue.subscribe(job_id)
+            try:
+                job = await job_queue.get(job_id)
+                if job.status != last_status:
+                    last_status = job.status
+                    yield f"event: status\ndata: {json.dumps(job.to_public_dict())}\n\n"
+                if job.is_finished or await request.is_disconnected():
+                    return
+                try:
+                    await asyncio.wait_for(update.wait(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n" # Comment line; keeps proxies from closing the stream
+            finally:
+                job_queue.unsubscribe(job_id, update)  # No-op once the event fired
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/queue/stats", summary="Job queue counters")
+async def orchestration_job_stats():
+    return {**job_queue.stats(), "by_status": await asyncio.to_thread(job_queue.store.count_by_status)}
@@ -0,0 +1,111 @@
+# app/routes/summarizer.py
+
+from fastapi import APIRouter, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pathlib import Path
+import json
+
+from app.services.batching import BatcherOverloaded
+from app.services.logging_setup import get_logger
+from app.services.summarization import summarize_document, summarize_text, summary_cache
+from app.services.upload_store import upload_store
+
+router = APIRouter(
+    prefix="/summarize" # Full path will be /api/v1/summarize
+)
+
+logger = get_logger("routes.summarizer")
+
+MAX_TEXT_CHARS = 20000 # Longer input is truncated by the model's context window anyway
+MAX_DOCUMENT_CHARS = 20_000_000 # Several thousand pages; /document splits it into chunks
+BASE_UPLOAD_DIR = Path("data/uploads") # Files dropped here directly (older flow), as in format_v1
+
+
+@router.post("/text", summary="Summarize a piece of text (Pegasus)")
+async def summarize_text_route(
+    text: str = Form(..., description="The text to summarize.")
+):
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="No text provided.")
+    if len(text) > MAX_TEXT_CHARS:
+        raise HTTPException(status_code=413, detail=f"Text is longer than {MAX_TEXT_CHARS} characters.")
+    try:
+        summary = await summarize_text(text)
+        return {"summary": summary, "input_chars": len(text)}
+    except BatcherOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ImportError as e:
+        raise HTTPException(status_code=503, detail=f"Summarization model is not available on this server: {e}")
+    except Exception as e:
+        logger.error("Summarization failed: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Summarization failed: {str(e)}")
+
+
+def _read_uploaded_text(filename: str) -> str:
+    """Uploaded files (by name or upload digest) first, then files dropped into data/uploads/."""
+    safe_filename = Path(filename).name
+    path = upload_store.resolve(safe_filename)
+    if path is None:
+        candidate = BASE_UPLOAD_DIR / safe_filename
+        path = candidate if candidate.is_file() else None
+    if path is None:
+        raise FileNotFoundError(f"Input file '{safe_filename}' not found. Please upload it first.")
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read(MAX_DOCUMENT_CHARS + 1)
+
+
+@router.post("/document", summary="Summarize a long document (map-reduce over cached chunks)")
+async def summarize_document_route(
+    text: str = Form(None, description="The document text. Either this or `filename` is required."),
+    filename: str = Form(None, description="Name of a previously uploaded text file."),
+    stream: bool = Form(False, description="Stream progress and partial summaries as Server-Sent Events."),
+):
+    """
+    Splits the document into overlapping chunks, summarizes them in parallel, then
+    reduces the chunk summaries level by level into one summary. Chunk summaries are
+    cached by content, so summarizing an edited document only redoes changed chunks.
+    """
+    if filename:
+        try:
+            text = await run_in_threadpool(_read_uploaded_text, filename)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+    if not text or not text.strip():
+        raise HTTPException(status_code=400, detail="Provide either `text` or the `filename` of an uploaded document.")
+    if len(text) > MAX_DOCUMENT_CHARS:
+        raise HTTPException(status_code=413, detail=f"Document is longer than {MAX_DOCUMENT_CHARS} characters.")
+
+    if stream:
+        async def event_stream():
+            try:
+                async for event in summarize_document(text):
+                    yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+            except Exception as e: # Headers are already sent; report the failure in-band
+                logger.error("Streaming summarization failed: %s", e, exc_info=True)
+                yield f"event: error\ndata: {json.dumps({'event': 'error', 'detail': str(e)})}\n\n"
+
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    try:
+        final_event = None
+        async for event in summarize_document(text):
+            final_event = event
+        final_event.pop("event")
+        return {**final_event, "input_chars": len(text)}
+    except BatcherOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ImportError as e:
+        raise HTTPException(status_code=503, detail=f"Summarization model is not available on this server: {e}")
+    except Exception as e:
+        logger.error("Document summarization failed: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Summarization failed: {str(e)}")
+
+
+@router.get("/cache/stats", summary="Chunk summary cache statistics")
+async def summary_cache_stats():
+    return summary_cache.stats()
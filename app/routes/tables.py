@@ -0,0 +1,65 @@
+# app/routes/tables.py
+
+from typing import List, Optional
+
+from fastapi import APIRouter, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pathlib import Path
+
+from app.services.batching import BatcherOverloaded
+from app.services.format_executor import FormatUnavailable, FormatJobTimeout
+from app.services.logging_setup import get_logger
+from app.services.table_description import describe_table, TABLE_VIEWS
+from app.services.table_ingest import UnsupportedTableFormat
+from app.services.upload_store import upload_store
+
+router = APIRouter(
+    prefix="/tables" # Full path will be /api/v1/tables
+)
+
+logger = get_logger("routes.tables")
+
+BASE_TABLES_DIR = Path("data/sample_tables")
+
+
+def _resolve_table(filename: str) -> Path:
+    """Uploaded files (by name or upload digest) first, then tables dropped into data/sample_tables."""
+    safe_filename = Path(filename).name
+    path = upload_store.resolve(safe_filename)
+    if path is None:
+        candidate = BASE_TABLES_DIR / safe_filename
+        path = candidate if candidate.is_file() else None
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Table '{safe_filename}' not found. Please upload it first.")
+    return Path(path)
+
+
+@router.post("/describe", summary="Profile a CSV/XLSX table and describe it (TAPAS for questions)")
+async def describe_table_route(
+    filename: str = Form(..., description="Name (or upload digest) of an uploaded table (.csv, .tsv, .xlsx)."),
+    questions: Optional[List[str]] = Form(None, description="Questions to answer about the table. Repeat the field for several."),
+    view: str = Form("auto", description="Table shown to the model: 'auto', 'sample' (rows) or 'aggregate' (per-column stats)."),
+    sheet: Optional[str] = Form(None, description="Worksheet name for XLSX files (default: the active sheet)."),
+):
+    if view not in TABLE_VIEWS:
+        raise HTTPException(status_code=400, detail=f"Invalid view '{view}'. Expected one of: {', '.join(TABLE_VIEWS)}.")
+    path = await run_in_threadpool(_resolve_table, filename)  # The store's index lookup blocks
+    try:
+        # Uploads are stored under their content digest, without an extension, so the
+        # table type comes from the name the client used.
+        result = await describe_table(path, questions=questions, view=view, sheet=sheet,
+                                      suffix=Path(filename).suffix or None)
+        return {"filename": Path(filename).name, **result}
+    except UnsupportedTableFormat as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FormatUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except FormatJobTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except BatcherOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ImportError as e:
+        raise HTTPException(status_code=503, detail=f"Table support is not available on this server: {e}")
+    except Exception as e:
+        logger.error("Describing '%s' failed: %s", filename, e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Table description failed: {str(e)}")
@@ -0,0 +1,81 @@
+# app/routes/templates.py
+
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from pathlib import Path
+from typing import Optional
+
+from app.services.docx_templates import (
+    InvalidTemplate, TEMPLATE_EXTENSIONS, add_template, remove_template, template_cache, template_files,
+)
+from app.services.logging_setup import get_logger
+
+router = APIRouter(
+    prefix="/templates" # Full path will be /api/v1/templates
+)
+
+logger = get_logger("routes.templates")
+
+MAX_TEMPLATE_NAME_LENGTH = 128
+
+
+def _validate_template_name(name: str) -> str:
+    safe_name = Path(name.strip()).name
+    if not safe_name or safe_name in (".", "..") or len(safe_name) > MAX_TEMPLATE_NAME_LENGTH:
+        raise HTTPException(status_code=400, detail="Invalid template name.")
+    return safe_name
+
+
+@router.get("/cache/stats", summary="Compiled template cache counters")
+async def template_cache_stats():
+    """Counters of the API process; each formatting worker process keeps its own cache."""
+    return {**template_cache.stats(), **await run_in_threadpool(template_files.stats)}
+
+
+@router.post("/", summary="Upload a DOCX/DOTX style template")
+async def upload_template(
+    file: UploadFile = File(..., description="A Word document or template (.docx, .dotx) whose styles, numbering and page setup should be used."),
+    name: Optional[str] = Form(None, description="Name to format with later (template_name). Defaults to the file name without extension."),
+):
+    """
+    Stores the template and compiles it once (styles, list numbering, page setup), so
+    format requests that name it reuse the compiled form instead of parsing the DOCX.
+    Uploading again under the same name replaces the template.
+    """
+    if not file.filename or Path(file.filename).suffix.lower() not in TEMPLATE_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"Templates must be {' or '.join(TEMPLATE_EXTENSIONS)} files.")
+    template_name = _validate_template_name(name or Path(file.filename).stem)
+    try:
+        stored, compiled = await run_in_threadpool(add_template, template_name, file.file)
+    except InvalidTemplate as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Storing template '%s' failed: %s", template_name, e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Could not store template: {str(e)}")
+    finally:
+        await file.close()
+    return {"name": template_name, "size_bytes": stored.size_bytes, **compiled.info()}
+
+
+@router.get("/", summary="List uploaded templates")
+async def list_templates():
+    names = await run_in_threadpool(template_files.names)
+    return [{"name": name, "digest": digest} for name, digest in sorted(names.items())]
+
+
+@router.get("/{template_name}", summary="Show a template's compiled style and section model")
+async def get_template(template_name: str):
+    digest = await run_in_threadpool(template_files.digest_for, _validate_template_name(template_name))
+    if digest is None:
+        raise HTTPException(status_code=404, detail=f"Template '{template_name}' not found.")
+    try:
+        compiled = await run_in_threadpool(template_cache.get, digest)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Template '{template_name}' not found.")
+    return {"name": template_name, **compiled.info()}
+
+
+@router.delete("/{template_name}", status_code=204, summary="Delete a template")
+async def delete_template(template_name: str):
+    if not await run_in_threadpool(remove_template, _validate_template_name(template_name)):
+        raise HTTPException(status_code=404, detail=f"Template '{template_name}' not found.")
@@ -1,8 +1,21 @@
 # app/routes/upload_v1.py
 
-from fastapi import APIRouter, File, UploadFile, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, File, Form, Header, UploadFile, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pathlib import Path # For object-oriented path manipulation
-import shutil # For file operations like copy
+
+from app.services.logging_setup import get_logger
+from app.services.tracing import stage
+from app.services.upload_sessions import (
+    UploadSessionError,
+    parse_checksum_header,
+    upload_sessions,
+    UPLOAD_CHUNK_BYTES,
+    UPLOAD_MAX_CHUNK_BYTES,
+)
+from app.services.upload_store import upload_store, COPY_CHUNK_SIZE
 
 # Create an APIRouter instance. All routes defined in this file
 # will be included in the main app with the prefix defined in main.py (e.g., /api/v1/upload)
@@ -11,21 +24,21 @@ router = APIRouter(
                      # So, /document/ becomes /api/v1/upload/document/
 )
 
-# Define the base directory for uploads.
-# This path is relative to the root of your project (where you run uvicorn).
-# Make sure the 'data' directory exists in your project root.
-UPLOAD_DIR = Path("data/uploads") 
+logger = get_logger("routes.upload_v1")
 
-# Ensure the UPLOAD_DIR exists when the application starts.
-# parents=True: creates parent directories if they don't exist.
-# exist_ok=True: doesn't raise an error if the directory already exists.
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True) 
+# Uploads live in the content-addressed store (see app/services/upload_store.py).
+# UPLOAD_DIR (default "data/uploads", relative to where you run uvicorn) is its root;
+# the store creates the directory and its blobs/ and tmp/ subfolders on import.
 
 @router.post("/document/", summary="Upload a document for processing")
 async def upload_document_for_processing(file: UploadFile = File(...)):
     """
     Endpoint to upload a single document file.
-    The file will be saved to the server in the `data/uploads/` directory.
+    The file is hashed while it is streamed to the content-addressed store under
+    `data/uploads/`. Identical content is stored only once; the returned `digest`
+    identifies the bytes and can be used by later steps to skip repeated work.
+    Filenames are shared, so a later upload under the same name replaces what the
+    name points to; pass the `digest` instead of the filename to pin this content.
 
     - **file**: The document file to upload (multipart/form-data).
     """
@@ -40,27 +53,168 @@ async def upload_document_for_processing(file: UploadFile = File(...)):
     if not safe_filename: # Handle edge cases like filename being just ".."
         raise HTTPException(status_code=400, detail="Invalid filename provided.")
 
-    # Construct the full path where the file will be saved.
-    file_path = UPLOAD_DIR / safe_filename
-
     try:
-        # Open the destination file in write-binary ("wb") mode.
-        # shutil.copyfileobj copies the contents from the uploaded file stream
-        # to the destination file stream efficiently.
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
+        # Hashing + writing is blocking disk I/O, so it runs in a worker thread
+        # instead of on the event loop. The store streams in fixed-size chunks.
+        with stage("save"):
+            stored = await run_in_threadpool(upload_store.put_stream, safe_filename, file.file)
+
         # If successful, return a confirmation message.
         return {
             "message": "File uploaded successfully and saved.",
             "filename": safe_filename,
-            "saved_path_on_server": str(file_path) # For debugging, you might remove this in production
+            "digest": stored.digest,
+            "size_bytes": stored.size_bytes,
+            "deduplicated": stored.deduplicated,
+            "saved_path_on_server": str(stored.path) # For debugging, you might remove this in production
         }
     except Exception as e:
         # If any error occurs during file saving, raise an HTTP 500 error.
-        # It's good practice to log the actual error `e` on the server for debugging.
-        # print(f"Error saving file: {e}") # Example logging
+        logger.error("Saving upload '%s' failed: %s", safe_filename, e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Could not save uploaded file: {str(e)}")
     finally:
         # Crucial: Always close the uploaded file stream to free up resources.
-        await file.close()
\ No newline at end of file
+        await file.close()
+
+
+# --- Resumable uploads ---
+# For large files (scans) over unreliable links. Protocol:
+#   1. POST   /upload/sessions                  filename + size -> upload_id. 429 when too many
+#                                               uploads are open (overall or for this client),
+#                                               507 when their preallocated space is used up.
+#   2. PUT    /upload/sessions/{id}/chunks      raw bytes, `Upload-Offset` header, optional
+#                                               `Upload-Checksum: sha256 <base64>`. Chunks may be
+#                                               sent in parallel and in any order; bytes already
+#                                               received are never overwritten (409).
+#   3. GET    /upload/sessions/{id}             received and missing byte ranges (to resume)
+#   4. POST   /upload/sessions/{id}/complete    verifies and stores the file; same answer as /document/.
+#                                               On a whole-file sha256 mismatch (460) the received
+#                                               ranges are reset and the file has to be sent again.
+#   DELETE /upload/sessions/{id} aborts. Sessions idle for longer than the TTL are removed.
+
+def _session_error(e: UploadSessionError) -> HTTPException:
+    # 460 is tus' "Checksum Mismatch"; tus clients retry the chunk on it.
+    return HTTPException(status_code=e.status_code, detail=str(e))
+
+
+def _safe_name(filename: str) -> str:
+    safe_filename = Path(filename).name
+    if not safe_filename:
+        raise HTTPException(status_code=400, detail="Invalid filename provided.")
+    return safe_filename
+
+
+@router.get("/sessions/stats", summary="Resumable upload session counters")
+async def upload_session_stats():
+    return await run_in_threadpool(upload_sessions.stats)
+
+
+@router.post("/sessions", status_code=201, summary="Start a resumable, chunked upload")
+async def create_upload_session(
+    request: Request,
+    response: Response,
+    filename: str = Form(..., description="Name the file is stored under once complete."),
+    size: int = Form(..., description="Total size of the file in bytes."),
+    sha256: Optional[str] = Form(None, description="Optional hex sha256 of the whole file, checked on completion."),
+):
+    safe_filename = _safe_name(filename)
+    try:
+        client = request.client.host if request.client else None
+        session = await run_in_threadpool(upload_sessions.create, safe_filename, size, sha256, client)
+    except UploadSessionError as e:
+        raise _session_error(e)
+    session_url = str(request.url_for("get_upload_session", upload_id=session.id))
+    response.headers["Location"] = session_url
+    return {
+        **session.to_public_dict(),
+        "session_url": session_url,
+        "chunk_size": UPLOAD_CHUNK_BYTES,
+        "max_chunk_size": UPLOAD_MAX_CHUNK_BYTES,
+    }
+
+
+@router.get("/sessions/{upload_id}", summary="Status of a resumable upload (received and missing ranges)")
+async def get_upload_session(upload_id: str):
+    try:
+        session = await run_in_threadpool(upload_sessions.get, upload_id)
+    except UploadSessionError as e:
+        raise _session_error(e)
+    return session.to_public_dict()
+
+
+@router.put("/sessions/{upload_id}/chunks", summary="Upload one chunk at a byte offset")
+async def put_upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset", description="Byte offset of this chunk in the file."),
+    upload_checksum: Optional[str] = Header(None, alias="Upload-Checksum", description="'<algorithm> <base64 digest>' of this chunk."),
+):
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        if not content_length.strip().isdigit():
+            raise HTTPException(status_code=400, detail="Malformed Content-Length header.")
+        if int(content_length) > UPLOAD_MAX_CHUNK_BYTES:
+            raise HTTPException(status_code=413, detail=f"Chunks may be at most {UPLOAD_MAX_CHUNK_BYTES} bytes.")
+    try:
+        checksum = parse_checksum_header(upload_checksum)
+        writer = await run_in_threadpool(upload_sessions.open_chunk, upload_id, upload_offset, checksum)
+    except UploadSessionError as e:
+        raise _session_error(e)
+
+    try:
+        # The body is spooled as it arrives (in memory for small chunks, on disk otherwise)
+        # and only copied into the upload once its checksum verifies; never held whole.
+        buffer = bytearray()
+        length = 0
+        async for piece in request.stream():
+            length += len(piece)
+            if length > UPLOAD_MAX_CHUNK_BYTES:
+                raise UploadSessionError(f"Chunks may be at most {UPLOAD_MAX_CHUNK_BYTES} bytes.", 413)
+            buffer += piece
+            if len(buffer) >= COPY_CHUNK_SIZE:
+                await run_in_threadpool(writer.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await run_in_threadpool(writer.write, bytes(buffer))
+        session = await run_in_threadpool(writer.commit)
+    except UploadSessionError as e:
+        raise _session_error(e)
+    finally:
+        writer.abort()
+
+    return {
+        "upload_id": upload_id,
+        "offset": upload_offset,
+        "length": length,
+        "checksum": writer.checksum_header,
+        "received_bytes": session.received_bytes,
+        "missing_ranges": session.missing_ranges(),
+    }
+
+
+@router.post("/sessions/{upload_id}/complete", summary="Finish a resumable upload and store the file")
+async def complete_upload_session(upload_id: str):
+    try:
+        session, stored = await run_in_threadpool(upload_sessions.complete, upload_id)
+    except UploadSessionError as e:
+        raise _session_error(e)
+    except Exception as e:
+        logger.error("Completing upload session %s failed: %s", upload_id, e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Could not save uploaded file: {str(e)}")
+    return {
+        "message": "File uploaded successfully and saved.",
+        "filename": session.filename,
+        "digest": stored.digest,
+        "size_bytes": stored.size_bytes,
+        "deduplicated": stored.deduplicated,
+        "saved_path_on_server": str(stored.path),
+    }
+
+
+@router.delete("/sessions/{upload_id}", status_code=204, summary="Abort a resumable upload")
+async def abort_upload_session(upload_id: str):
+    try:
+        await run_in_threadpool(upload_sessions.abort, upload_id)
+    except UploadSessionError as e:
+        raise _session_error(e)
+    return Response(status_code=204)
@@ -0,0 +1,174 @@
+# app/services/batching.py
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, List, Optional, Tuple
+
+# Dynamic micro-batching for in-process model inference.
+# Async routes submit single items; a dedicated worker thread per model collects them
+# into batches (up to `max_batch_size`, waiting at most `max_wait_ms` after the first
+# item) and runs one forward pass per batch. On CPU this amortizes the per-call
+# overhead of generate() across many requests instead of paying it per image.
+
+DEFAULT_MAX_BATCH_SIZE = int(os.getenv("DOCUMORPH_BATCH_MAX_SIZE", "8"))
+DEFAULT_MAX_WAIT_MS = float(os.getenv("DOCUMORPH_BATCH_MAX_WAIT_MS", "10"))
+DEFAULT_MAX_QUEUE_SIZE = int(os.getenv("DOCUMORPH_BATCH_MAX_QUEUE_SIZE", "256"))
+
+_STOP = object()
+_batchers: List["MicroBatcher"] = []
+
+
+class BatcherOverloaded(Exception):
+    """Raised when a model's request queue is full; the caller should retry later."""
+
+
+class MicroBatcher:
+    """
+    Queues single inference requests and runs them in batches on a worker thread.
+
+    `get_model` is called on the worker thread before every batch and should be cheap
+    after the first call (e.g. `model_registry.get`), so the registry can evict and
+    reload models between batches. The object it returns must have
+    `predict_batch(inputs: list) -> list` returning one output per input, in order.
+    """
+
+    def __init__(self, name: str, get_model: Callable[[], Any],
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE):
+        self.name = name
+        self.get_model = get_model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_seconds = max(0.0, max_wait_ms) / 1000
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batch_sizes: Counter = Counter()
+        self.items_processed = 0
+        self.errors = 0
+        _batchers.append(self)
+
+    # --- Lifecycle ---
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"batcher-{self.name}", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        self._thread = None
+
+    # --- Submission ---
+
+    async def submit(self, item: Any) -> Any:
+        """Queues one input and waits for its output. Raises BatcherOverloaded if the queue is full."""
+        self.start()  # Lazily, so an unused model never costs a thread
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        try:
+            self._queue.put_nowait((item, future, loop))
+        except queue.Full:
+            raise BatcherOverloaded(f"Inference queue for '{self.name}' is full.")
+        return await future
+
+    # --- Worker thread ---
+
+    def _collect_batch(self, first) -> Tuple[list, bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch, stopping = self._collect_batch(first)
+            # Requests whose client went away are skipped, not computed.
+            batch = [entry for entry in batch if not entry[1].cancelled()]
+            if batch:
+                self._run_batch(batch)
+
+    def _run_batch(self, batch: list) -> None:
+        # Loaded once per batch: if loading fails, every request in it gets that error.
+        try:
+            model = self.get_model()
+        except Exception as e:
+            self.errors += 1
+            self._fail(batch, e)
+            return
+        self._predict(model, batch)
+
+    def _predict(self, model: Any, batch: list) -> None:
+        try:
+            outputs = model.predict_batch([item for item, _, _ in batch])
+            if len(outputs) != len(batch):
+                raise RuntimeError(f"Model '{self.name}' returned {len(outputs)} outputs for {len(batch)} inputs.")
+        except Exception as e:
+            self.errors += 1
+            if len(batch) > 1:
+                # One bad input must not fail the requests batched with it: rerun them one
+                # at a time, so the error only reaches the request that caused it.
+                for entry in batch:
+                    self._predict(model, [entry])
+                return
+            self._fail(batch, e)
+            return
+        self.batch_sizes[len(batch)] += 1
+        self.items_processed += len(batch)
+        for (_, future, loop), output in zip(batch, outputs):
+            loop.call_soon_threadsafe(_resolve, future, output, None)
+
+    @staticmethod
+    def _fail(batch: list, error: BaseException) -> None:
+        for _, future, loop in batch:
+            loop.call_soon_threadsafe(_resolve, future, None, error)
+
+    def stats(self) -> dict:
+        batches = sum(self.batch_sizes.values())
+        return {
+            "name": self.name,
+            "queued": self._queue.qsize(),
+            "batches": batches,
+            "items": self.items_processed,
+            "mean_batch_size": round(self.items_processed / batches, 2) if batches else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+            "errors": self.errors,
+        }
+
+
+def _resolve(future: asyncio.Future, result: Any, error: Optional[BaseException]) -> None:
+    # Runs on the event loop thread.
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def stop_all_batchers() -> None:
+    for batcher in _batchers:
+        batcher.stop()
+
+
+def all_batcher_stats() -> List[dict]:
+    return [batcher.stats() for batcher in _batchers]
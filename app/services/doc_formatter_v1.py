@@ -1,22 +1,79 @@
 # app/services/doc_formatter_v1.py
 
 from pathlib import Path
-from docx import Document 
+from typing import List, Optional, Tuple
+
+from app.services.docx_stream_writer import DocxStreamWriter, sanitize_xml_text, text_file_to_docx
+from app.services.docx_templates import template_cache
+from app.services.format_executor import format_executor
+from app.services.logging_setup import get_logger
 # Removed HTTPException as services shouldn't typically raise HTTP specific exceptions directly
 # They should raise custom exceptions or standard Python exceptions that routes can handle.
 
+# Bump whenever the generated output changes, so cached outputs built by an older
+# formatter are not served (see app/services/output_cache.py).
+FORMATTER_VERSION = "2"
+
+SNIPPET_CHARS = 500 # Characters of the original shown by the dummy formatter
+
+logger = get_logger("services.doc_formatter_v1")
+
 async def apply_dummy_formatting(
     input_file_path_str: str, 
-    output_file_path_str: str
-    # template_path_str: str, # We'll add this back when we use real templates
+    output_file_path_str: str,
+    source_name: str = None, # Original upload name; blobs in the upload store are named by digest
+) -> str:
+    """
+    Runs `build_dummy_document` in the formatting process pool so the event loop is
+    never blocked by python-docx. Same arguments, return value and errors, plus:
+
+    Raises:
+        FormatUnavailable: If the pool's admission queue is full, or the job was lost when
+            its worker was restarted (route should answer 503 with Retry-After).
+        FormatJobTimeout: If the job exceeds the configured per-job timeout.
+    """
+    return await format_executor.run(
+        build_dummy_document, input_file_path_str, output_file_path_str, source_name
+    )
+
+
+def _read_snippet(input_path: Path) -> str:
+    """First SNIPPET_CHARS of the input as text, or placeholder content if it cannot be read."""
+    file_content = "Default placeholder content if input file cannot be read properly."
+    if not input_path.is_file():
+        logger.warning("Input file '%s' not found. Using placeholder content.", input_path)
+        # For a real service, you'd likely raise FileNotFoundError here:
+        # raise FileNotFoundError(f"Input file not found at path: {input_path}")
+    else:
+        try:
+            # Using 'rb' to read as bytes first, then decoding, can be more robust
+            # for potentially mixed or unknown encodings if you don't expect pure text.
+            # However, since python-docx needs strings, we must decode.
+            # errors='replace' or 'backslashreplace' might be safer than 'ignore'
+            # if you want to see problematic characters rather than silently dropping them.
+            with open(input_path, "r", encoding="utf-8", errors="replace") as f:
+                file_content = f.read(SNIPPET_CHARS) # Only the snippet is used; don't load the whole file
+        except Exception as e_read:
+            logger.error("Could not read input file '%s': %s. Using placeholder content.", input_path, e_read)
+            # For a real service, raise IOError:
+            # raise IOError(f"Could not read input file '{input_path}': {e_read}") from e_read
+    return file_content
+
+
+def build_dummy_document(
+    input_file_path_str: str, 
+    output_file_path_str: str,
+    source_name: str = None,
 ) -> str:
     """
     Simulates formatting a document (reads from input, writes a dummy DOCX to output).
     For this dummy version, it assumes the input is a text file.
+    Blocking; runs inside a formatting worker process.
 
     Args:
         input_file_path_str (str): The absolute or relative path to the input file.
         output_file_path_str (str): The absolute or relative path where the output .docx should be saved.
+        source_name (str, optional): Name to show as the original file. Defaults to the input file's name.
 
     Returns:
         str: The path to the created output .docx file.
@@ -26,34 +83,17 @@ async def apply_dummy_formatting(
         IOError: If there's an issue reading the input or writing the output file.
         Exception: For other general errors during DOCX creation.
     """
+    from docx import Document # Imported here (in the worker) to keep API startup fast
+
     input_path = Path(input_file_path_str)
     output_path = Path(output_file_path_str)
 
-    print(f"SERVICE (doc_formatter_v1): Attempting dummy formatting for input: '{input_path}'")
-    print(f"SERVICE (doc_formatter_v1): Output will be saved to: '{output_path}'")
+    logger.debug("Dummy formatting '%s' -> '%s'", input_path, output_path)
 
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    file_content = "Default placeholder content if input file cannot be read properly."
-    if not input_path.is_file():
-        print(f"SERVICE WARNING (doc_formatter_v1): Input file '{input_path}' not found. Using placeholder content.")
-        # For a real service, you'd likely raise FileNotFoundError here:
-        # raise FileNotFoundError(f"Input file not found at path: {input_path}")
-    else:
-        try:
-            # Using 'rb' to read as bytes first, then decoding, can be more robust
-            # for potentially mixed or unknown encodings if you don't expect pure text.
-            # However, since python-docx needs strings, we must decode.
-            # errors='replace' or 'backslashreplace' might be safer than 'ignore'
-            # if you want to see problematic characters rather than silently dropping them.
-            with open(input_path, "r", encoding="utf-8", errors="replace") as f:
-                file_content = f.read()
-            print(f"SERVICE (doc_formatter_v1): Successfully read content from '{input_path}'.")
-        except Exception as e_read:
-            print(f"SERVICE ERROR (doc_formatter_v1): Could not read input file '{input_path}': {e_read}. Using placeholder content.")
-            # For a real service, raise IOError:
-            # raise IOError(f"Could not read input file '{input_path}': {e_read}") from e_read
-    
+    file_content = _read_snippet(input_path)
+
     try:
         doc = Document() 
         doc.add_heading('Dummy Formatted Document', level=1)
@@ -64,36 +104,178 @@ async def apply_dummy_formatting(
         # It's safer to add text to a run, then style the run,
         # Than to chain .add_run(...).bold = True, though it often works.
 
-        doc.add_paragraph(f'Original file processed: {input_path.name}') # Filename should be safe enough
+        doc.add_paragraph(f'Original file processed: {source_name or input_path.name}') # Filename should be safe enough
         
         doc.add_heading('Original Content Snippet:', level=2)
         
-        # Sanitize file_content for python-docx to prevent the XML error
-        # This is a basic approach. A more robust one might involve a whitelist of allowed characters
-        # or more aggressive cleaning depending on expected input.
-        sanitized_snippet_list = []
-        for char in file_content[:500]: # Process only a snippet
-            # Allow ASCII printables, tabs, newlines, carriage returns.
-            # ord(char) < 32 checks for most control characters.
-            # 127 is DEL. Some characters above 127 might also be problematic depending on font/encoding in DOCX.
-            # This is a very basic sanitizer.
-            if 32 <= ord(char) <= 126 or char in ('\t', '\n', '\r'):
-                sanitized_snippet_list.append(char)
-            else:
-                sanitized_snippet_list.append('?') # Replace problematic char with a placeholder
-
-        sanitized_snippet = "".join(sanitized_snippet_list)
+        # Strip only characters XML cannot represent (python-docx rejects them);
+        # all other Unicode, including non-English text, is kept as-is.
+        sanitized_snippet = sanitize_xml_text(file_content[:SNIPPET_CHARS])
         
         doc.add_paragraph(sanitized_snippet if sanitized_snippet else "No displayable content from original file.")
         
         doc.save(output_path)
         
-        print(f"SERVICE (doc_formatter_v1): Dummy DOCX '{output_path.name}' created successfully at '{output_path}'.")
+        logger.debug("Dummy DOCX created at '%s'", output_path)
         return str(output_path)
 
     except Exception as e_docx: # Catch errors specifically from python-docx or file saving
         error_message = f"Error creating DOCX for '{input_path.name}': {str(e_docx)}"
-        print(f"SERVICE ERROR (doc_formatter_v1): {error_message}")
+        logger.error(error_message, exc_info=True)
         # This is where the original "All strings must be XML compatible" would be caught
         # Re-raise a more generic exception or a custom one for the route to handle
-        raise Exception(error_message) from e_docx
\ No newline at end of file
+        raise Exception(error_message) from e_docx
+
+
+async def apply_full_formatting(
+    input_file_path_str: str,
+    output_file_path_str: str,
+) -> str:
+    """
+    Runs `build_full_document` in the formatting process pool.
+    Raises the same errors as `apply_dummy_formatting`.
+    """
+    return await format_executor.run(build_full_document, input_file_path_str, output_file_path_str)
+
+
+def build_full_document(
+    input_file_path_str: str,
+    output_file_path_str: str,
+) -> str:
+    """
+    Converts a whole text document to DOCX, streaming it paragraph by paragraph.
+    Memory use is bounded by the read block size, not by the input size.
+    Blocking; runs inside a formatting worker process.
+
+    Args:
+        input_file_path_str (str): Path to the input text file (UTF-8; invalid bytes become U+FFFD).
+        output_file_path_str (str): Path where the output .docx should be saved.
+
+    Returns:
+        str: The path to the created output .docx file.
+
+    Raises:
+        FileNotFoundError: If the input file does not exist.
+        Exception: For errors while writing the DOCX.
+    """
+    input_path = Path(input_file_path_str)
+    output_path = Path(output_file_path_str)
+
+    if not input_path.is_file():
+        raise FileNotFoundError(f"Input file not found at path: {input_path}")
+
+    logger.debug("Streaming full conversion of '%s'", input_path)
+    try:
+        writer = text_file_to_docx(input_path, output_path)
+    except Exception as e_docx:
+        error_message = f"Error creating DOCX for '{input_path.name}': {str(e_docx)}"
+        logger.error(error_message, exc_info=True)
+        raise Exception(error_message) from e_docx
+
+    logger.debug("Full DOCX created at '%s' (%d paragraphs)", output_path, writer.paragraphs_written)
+    return str(output_path)
+
+
+# --- Template-driven formatting ---
+# The worker gets only the template digest; template_cache hands it the compiled form
+# from its own memory or from disk, so the template is not re-parsed per document.
+
+# (input path, output path, template digest or None, mode, source name)
+FormatJob = Tuple[str, str, Optional[str], str, Optional[str]]
+
+
+async def apply_template_formatting(
+    input_file_path_str: str,
+    output_file_path_str: str,
+    template_digest: str,
+    mode: str = "full",
+    source_name: str = None,
+) -> str:
+    """
+    Runs `build_templated_document` in the formatting process pool.
+    Raises the same errors as `apply_dummy_formatting`.
+    """
+    return await format_executor.run(
+        build_templated_document, input_file_path_str, output_file_path_str, template_digest, mode, source_name
+    )
+
+
+def build_templated_document(
+    input_file_path_str: str,
+    output_file_path_str: str,
+    template_digest: str,
+    mode: str = "full",
+    source_name: str = None,
+) -> str:
+    """
+    Formats a text document into a copy of a compiled template: the template's styles,
+    numbering, headers/footers and page setup are kept, and the text is streamed in with
+    "#" headings and "-" / "1." list items mapped to the template's styles.
+    Blocking; runs inside a formatting worker process.
+
+    Args:
+        input_file_path_str (str): Path to the input text file.
+        output_file_path_str (str): Path where the output .docx should be saved.
+        template_digest (str): Digest of a stored template (see app/services/docx_templates.py).
+        mode (str): "full" for the whole text, "dummy" for the short preview document.
+        source_name (str, optional): Name to show as the original file in "dummy" mode.
+
+    Returns:
+        str: The path to the created output .docx file.
+
+    Raises:
+        FileNotFoundError: If the input file (in "full" mode) or the template does not exist.
+        Exception: For errors while writing the DOCX.
+    """
+    input_path = Path(input_file_path_str)
+    output_path = Path(output_file_path_str)
+    template = template_cache.get(template_digest)
+
+    if mode == "full" and not input_path.is_file():
+        raise FileNotFoundError(f"Input file not found at path: {input_path}")
+
+    logger.debug("Templated (%s) formatting of '%s' with template %s", mode, input_path, template_digest)
+    try:
+        if mode == "full":
+            writer = text_file_to_docx(input_path, output_path, skeleton=template.skeleton,
+                                       paragraph_xml=template.paragraph_xml)
+        else:
+            snippet = _read_snippet(input_path)
+            with DocxStreamWriter(output_path, skeleton=template.skeleton,
+                                  paragraph_xml=template.paragraph_xml) as writer:
+                writer.write_paragraph("Dummy Formatted Document", role="heading1")
+                writer.write_paragraph('This document was "formatted" by DocuMorph AI\'s dummy formatter.')
+                writer.write_paragraph(f"Original file processed: {source_name or input_path.name}")
+                writer.write_paragraph("Original Content Snippet:", role="heading2")
+                writer.write_paragraph(snippet[:SNIPPET_CHARS] or "No displayable content from original file.")
+    except Exception as e_docx:
+        error_message = f"Error creating DOCX for '{input_path.name}': {str(e_docx)}"
+        logger.error(error_message, exc_info=True)
+        raise Exception(error_message) from e_docx
+
+    logger.debug("Templated DOCX created at '%s' (%d paragraphs)", output_path, writer.paragraphs_written)
+    return str(output_path)
+
+
+async def apply_batch_formatting(jobs: List[FormatJob]) -> List[str]:
+    """
+    Runs `build_document_batch` in the formatting process pool: one pool job for many
+    documents, so the worker fetches the template once and per-job overhead is paid once.
+    The per-job timeout is per document, so it is scaled to the batch size.
+    Raises the same errors as `apply_dummy_formatting`.
+    """
+    timeout = format_executor.job_timeout * max(len(jobs), 1)
+    return await format_executor.run(build_document_batch, jobs, timeout=timeout)
+
+
+def build_document_batch(jobs: List[FormatJob]) -> List[str]:
+    """Formats each job in turn; returns the output paths in order. Blocking; runs in a worker."""
+    outputs = []
+    for input_path_str, output_path_str, template_digest, mode, source_name in jobs:
+        if template_digest:
+            outputs.append(build_templated_document(input_path_str, output_path_str, template_digest, mode, source_name))
+        elif mode == "full":
+            outputs.append(build_full_document(input_path_str, output_path_str))
+        else:
+            outputs.append(build_dummy_document(input_path_str, output_path_str, source_name))
+    return outputs
@@ -0,0 +1,249 @@
+# app/services/docx_stream_writer.py
+
+import importlib.util
+import re
+import zipfile
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, TextIO, Tuple
+from xml.sax.saxutils import escape
+
+# Streaming text -> DOCX writer.
+# python-docx keeps the whole document tree in memory, which is fine for a page but not
+# for a 200 MB manuscript. This writer copies every package part from a skeleton DOCX
+# as-is and streams word/document.xml straight into the zip, block by block, so memory
+# stays bounded by the block size no matter how large the input is.
+
+DOCUMENT_PART = "word/document.xml"
+# Located without importing python-docx (and lxml), which would slow down API startup.
+DEFAULT_TEMPLATE_PATH = Path(importlib.util.find_spec("docx").origin).parent / "templates" / "default.docx"
+TEXT_BLOCK_CHARS = 1024 * 1024  # Characters read, sanitized and escaped per step
+MAX_PENDING_SPACE_CHARS = 4096  # Leading whitespace kept for a line longer than a block
+
+# Characters that are not allowed anywhere in XML 1.0 (C0 controls except tab/LF/CR,
+# lone surrogates, U+FFFE/U+FFFF). Everything else, including all non-English text, is kept.
+_XML_ILLEGAL_CHARS_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+_BODY_OPEN_RE = re.compile(rb"<w:body(?:\s[^>]*)?>")
+
+# Light markup recognised at the start of a line when paragraph roles are given (templates):
+# "# " / "## " / "### " headings, "- " / "* " / "• " bullets and "1. " / "1) " numbered items.
+# A marker line always starts a new paragraph; a heading also ends at its line end.
+_MARKUP_RE = re.compile(r"(#{1,3}) |([-*\u2022]) |(\d{1,3})[.)] ")
+
+_TAB_XML = '</w:t></w:r><w:r><w:tab/></w:r><w:r><w:t xml:space="preserve">'
+_LINE_BREAK_XML = "<w:r><w:br/></w:r>"
+_BREAK_IN_RUN_XML = '</w:t></w:r>' + _LINE_BREAK_XML + '<w:r><w:t xml:space="preserve">'
+
+
+def sanitize_xml_text(text: str) -> str:
+    """Removes characters that cannot appear in XML (python-docx would reject them)."""
+    return _XML_ILLEGAL_CHARS_RE.sub("", text)
+
+
+@dataclass(frozen=True)
+class PackageSkeleton:
+    """A DOCX package split around its body, ready to be re-emitted without parsing."""
+    parts: Tuple[Tuple[str, bytes], ...]  # Every zip entry except word/document.xml
+    body_prefix: bytes                    # document.xml up to and including <w:body>
+    body_suffix: bytes                    # Final section properties + </w:body></w:document>
+
+
+def skeleton_from_docx(path: Path) -> PackageSkeleton:
+    """Reads a DOCX and splits it into a reusable skeleton. Existing body content is dropped."""
+    parts = []
+    document_xml: Optional[bytes] = None
+    with zipfile.ZipFile(path) as zin:
+        for info in zin.infolist():
+            data = zin.read(info.filename)
+            if info.filename == DOCUMENT_PART:
+                document_xml = data
+            else:
+                parts.append((info.filename, data))
+    if document_xml is None:
+        raise ValueError(f"'{path}' is not a Word document (missing {DOCUMENT_PART}).")
+
+    body_open = _BODY_OPEN_RE.search(document_xml)
+    body_close = document_xml.rfind(b"</w:body>")
+    if body_open is None or body_close == -1:
+        raise ValueError(f"'{path}' has no document body.")
+    # The body-level sectPr is always the last child of <w:body>; keep it so page size,
+    # margins and headers/footers survive.
+    sect_start = document_xml.rfind(b"<w:sectPr", body_open.end(), body_close)
+    suffix_start = sect_start if sect_start != -1 else body_close
+    return PackageSkeleton(
+        parts=tuple(parts),
+        body_prefix=document_xml[:body_open.end()],
+        body_suffix=document_xml[suffix_start:],
+    )
+
+
+@lru_cache(maxsize=1)
+def default_skeleton() -> PackageSkeleton:
+    return skeleton_from_docx(DEFAULT_TEMPLATE_PATH)
+
+
+def _paragraph_open(style_id: Optional[str]) -> str:
+    if style_id:
+        return f'<w:p><w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>'
+    return "<w:p>"
+
+
+def _run(escaped_text: str) -> str:
+    return f'<w:r><w:t xml:space="preserve">{escaped_text}</w:t></w:r>'
+
+
+class DocxStreamWriter:
+    """
+    Writes a DOCX by streaming paragraphs into word/document.xml.
+
+    Usage:
+        with DocxStreamWriter(output_path) as writer:
+            writer.write_paragraph("Title", style_id="Heading1")
+            writer.write_text_stream(text_file)
+    """
+
+    def __init__(self, output_path: Path, skeleton: Optional[PackageSkeleton] = None,
+                 body_style_id: Optional[str] = None, paragraph_xml: Optional[Dict[str, str]] = None):
+        self.output_path = Path(output_path)
+        self.skeleton = skeleton or default_skeleton()
+        self.body_style_id = body_style_id
+        # Role ("body", "heading1", "list_bullet", ...) -> <w:p> opening tag, from a
+        # compiled template. When set, text streams also get markup detection.
+        self.paragraph_xml = paragraph_xml
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._body = None
+        self.paragraphs_written = 0
+        self.chars_written = 0
+
+    def __enter__(self) -> "DocxStreamWriter":
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self._zip = zipfile.ZipFile(self.output_path, "w", compression=zipfile.ZIP_DEFLATED)
+        try:
+            for name, data in self.skeleton.parts:
+                self._zip.writestr(name, data)
+            self._body = self._zip.open(DOCUMENT_PART, "w", force_zip64=True)
+            self._body.write(self.skeleton.body_prefix)
+        except BaseException:
+            self._zip.close()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if self._body is not None:
+                if exc_type is None:
+                    self._body.write(self.skeleton.body_suffix)
+                self._body.close()
+        finally:
+            self._zip.close()
+            if exc_type is not None:
+                # Never leave a half-written, unopenable .docx behind.
+                self.output_path.unlink(missing_ok=True)
+
+    def _write(self, xml: str) -> None:
+        self._body.write(xml.encode("utf-8"))
+
+    def _role_open(self, role: str) -> str:
+        return self.paragraph_xml.get(role) or self.paragraph_xml["body"]
+
+    def write_paragraph(self, text: str, style_id: Optional[str] = None, role: Optional[str] = None) -> None:
+        # Newlines become line breaks, as in python-docx.
+        escaped = escape(sanitize_xml_text(text)).replace("\t", _TAB_XML).replace("\n", _BREAK_IN_RUN_XML)
+        if role and self.paragraph_xml is not None and not style_id:
+            paragraph_open = self._role_open(role)
+        else:
+            paragraph_open = _paragraph_open(style_id or self.body_style_id)
+        self._write(paragraph_open + _run(escaped) + "</w:p>")
+        self.paragraphs_written += 1
+        self.chars_written += len(text)
+
+    def write_text_stream(self, stream: TextIO, block_chars: int = TEXT_BLOCK_CHARS) -> None:
+        """
+        Converts plain text to paragraphs: blank lines separate paragraphs, single
+        newlines become line breaks inside a paragraph. Reads `block_chars` at a time;
+        sanitizing and escaping run once per block (C-level), not per character.
+        With `paragraph_xml` set, marker lines (see _MARKUP_RE) become headings and list items.
+        """
+        roles = self.paragraph_xml
+        paragraph_open = self._role_open("body") if roles is not None else _paragraph_open(self.body_style_id)
+        in_paragraph = False
+        heading_open = False  # The open paragraph is a heading; the next line starts a new one
+        mid_line = False  # Text of the current line was already emitted (very long lines)
+        pending_space = ""  # Leading whitespace of a long line, held until we know it isn't blank
+        carry = ""
+
+        while True:
+            block = stream.read(block_chars)
+            at_eof = not block
+            text = carry + block
+            if at_eof:
+                cut = len(text)  # Whatever is left is the final line
+            else:
+                cut = text.rfind("\n")
+                if cut == -1:
+                    if len(text) < block_chars:
+                        carry = text
+                        continue
+                    cut = len(text)  # One huge line: emit what we have and keep going
+            complete_lines = at_eof or cut < len(text)
+            carry = text[cut + 1:] if cut < len(text) else ""
+            chunk = escape(sanitize_xml_text(text[:cut]))
+            self.chars_written += cut
+
+            out = []
+            lines = chunk.split("\n")
+            for i, line in enumerate(lines):
+                is_partial = (i == len(lines) - 1) and not complete_lines
+                if not line.strip() and not mid_line:
+                    if is_partial:
+                        pending_space = (pending_space + line)[-MAX_PENDING_SPACE_CHARS:]
+                        continue
+                    pending_space = ""
+                    if in_paragraph:
+                        out.append("</w:p>")
+                        in_paragraph = False
+                    continue
+                opener = paragraph_open
+                if roles is not None and not mid_line:
+                    marker = None if pending_space else _MARKUP_RE.match(line)
+                    if in_paragraph and (heading_open or marker):
+                        out.append("</w:p>")
+                        in_paragraph = False
+                    heading_open = False
+                    if marker:
+                        if marker.group(1):
+                            role = f"heading{len(marker.group(1))}"
+                        else:
+                            role = "list_bullet" if marker.group(2) else "list_number"
+                        if role in roles:
+                            opener = roles[role]
+                            line = line[marker.end():]
+                            heading_open = marker.group(1) is not None
+                if not in_paragraph:
+                    out.append(opener)
+                    in_paragraph = True
+                    self.paragraphs_written += 1
+                elif not mid_line:
+                    out.append(_LINE_BREAK_XML)
+                out.append(_run((pending_space + line).replace("\t", _TAB_XML)))
+                pending_space = ""
+                mid_line = is_partial
+            if out:
+                self._write("".join(out))
+            if at_eof:
+                break
+
+        if in_paragraph:
+            self._write("</w:p>")
+
+
+def text_file_to_docx(input_path: Path, output_path: Path, skeleton: Optional[PackageSkeleton] = None,
+                      body_style_id: Optional[str] = None,
+                      paragraph_xml: Optional[Dict[str, str]] = None) -> DocxStreamWriter:
+    """Streams a UTF-8 text file (undecodable bytes become U+FFFD) into a DOCX."""
+    with open(input_path, "r", encoding="utf-8", errors="replace", newline=None) as f:
+        with DocxStreamWriter(output_path, skeleton=skeleton, body_style_id=body_style_id,
+                              paragraph_xml=paragraph_xml) as writer:
+            writer.write_text_stream(f)
+    return writer
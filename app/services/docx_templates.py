@@ -0,0 +1,357 @@
+# app/services/docx_templates.py
+
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Tuple
+from xml.sax.saxutils import quoteattr
+
+from app.services.docx_stream_writer import PackageSkeleton, skeleton_from_docx
+from app.services.logging_setup import get_logger
+from app.services.upload_store import COPY_CHUNK_SIZE, HASH_ALGORITHM, ContentAddressedStore, StoredUpload
+
+# DOCX style templates, compiled once and reused by every format request.
+# An uploaded template is stored content-addressed (like document uploads) and compiled:
+# the package is split into a PackageSkeleton, and styles.xml, numbering.xml and the
+# final section properties are parsed into a small model that maps paragraph roles
+# (body, headings, bulleted and numbered list items) to ready-made <w:p> opening tags.
+# Formatting then copies the skeleton's bytes and streams the body; the template's XML
+# is never parsed per request.
+#
+# Compiled templates live in an in-process LRU in front of one pickle per template
+# digest on disk. Formatting workers are separate processes: they receive only the
+# digest and fill their own LRU from the on-disk form (or compile the blob themselves).
+
+TEMPLATE_DIR = Path(os.getenv("DOCUMORPH_TEMPLATE_DIR", "data/templates"))
+TEMPLATE_CACHE_ENTRIES = int(os.getenv("DOCUMORPH_TEMPLATE_CACHE_ENTRIES", "32"))
+TEMPLATE_MAX_BYTES = int(os.getenv("DOCUMORPH_TEMPLATE_MAX_BYTES", str(20 * 1024 * 1024)))
+TEMPLATE_MAX_UNCOMPRESSED_BYTES = 10 * TEMPLATE_MAX_BYTES  # Guards against zip bombs
+
+# Bump whenever CompiledTemplate or the compiler's output changes; compiled files from
+# an older version are rebuilt from the stored template on first use.
+TEMPLATE_COMPILER_VERSION = "1"
+
+TEMPLATE_EXTENSIONS = (".docx", ".dotx")
+STYLES_PART = "word/styles.xml"
+NUMBERING_PART = "word/numbering.xml"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+_DOTX_MAIN_CONTENT_TYPE = b"application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml"
+_DOCX_MAIN_CONTENT_TYPE = b"application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# Paragraph roles and the built-in style names that provide them. Built-in names are
+# stored in English in styles.xml whatever the UI language, while style ids are
+# localized ("Heading1" vs "Überschrift1"), so roles are resolved by name.
+ROLE_STYLE_NAMES = {
+    "heading1": ("heading 1",),
+    "heading2": ("heading 2",),
+    "heading3": ("heading 3",),
+    "list_bullet": ("list bullet",),
+    "list_number": ("list number",),
+}
+LIST_ROLE_NUMBER_FORMATS = {"list_bullet": "bullet", "list_number": "decimal"}
+
+_SECTION_ELEMENT_RE = re.compile(rb"<w:(pgSz|pgMar)\b([^>]*)/?>")
+_ATTRIBUTE_RE = re.compile(rb'w:(\w+)="([^"]*)"')
+
+logger = get_logger("services.docx_templates")
+
+
+class InvalidTemplate(ValueError):
+    """Raised for uploads that are not usable Word templates."""
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    digest: str
+    skeleton: PackageSkeleton
+    # Role -> <w:p> opening tag (style and list numbering applied). "body" is always
+    # present; a list role is missing when the template has neither a style nor a
+    # numbering definition for it, and such lines are written as body text.
+    paragraph_xml: Dict[str, str]
+    role_styles: Dict[str, Optional[str]]  # Role -> style id (None: the default paragraph style)
+    styles: Dict[str, dict]                 # Style id -> {"name", "type", "based_on"}
+    numbering: Dict[str, str]               # Number format ("bullet", "decimal") -> w:numId
+    section: Dict[str, Dict[str, str]]      # Final section: {"page_size": {...}, "page_margins": {...}}
+    compiler_version: str = TEMPLATE_COMPILER_VERSION
+    compile_seconds: float = field(default=0.0, compare=False)
+
+    def info(self) -> dict:
+        return {
+            "digest": self.digest,
+            "roles": {role: {"style_id": self.role_styles.get(role), "supported": role in self.paragraph_xml}
+                      for role in ("body", *ROLE_STYLE_NAMES)},
+            "paragraph_styles": sorted(s["name"] for s in self.styles.values() if s["type"] == "paragraph"),
+            "style_count": len(self.styles),
+            "numbering": dict(self.numbering),
+            "section": self.section,
+            "parts": len(self.skeleton.parts) + 1,
+            "compile_seconds": self.compile_seconds,
+        }
+
+
+def _part(skeleton: PackageSkeleton, name: str) -> Optional[bytes]:
+    for part_name, data in skeleton.parts:
+        if part_name == name:
+            return data
+    return None
+
+
+def _parse_styles(styles_xml: Optional[bytes]) -> Tuple[Dict[str, dict], Dict[str, bool]]:
+    """Returns (styles by id, style id -> has its own list numbering)."""
+    styles, numbered = {}, {}
+    if not styles_xml:
+        return styles, numbered
+    for style in ET.fromstring(styles_xml).iter(f"{_W}style"):
+        style_id = style.get(f"{_W}styleId")
+        if not style_id:
+            continue
+        style_type = style.get(f"{_W}type", "paragraph")
+        name = style.find(f"{_W}name")
+        based_on = style.find(f"{_W}basedOn")
+        styles[style_id] = {
+            "name": name.get(f"{_W}val") if name is not None else style_id,
+            "type": style_type,
+            "based_on": based_on.get(f"{_W}val") if based_on is not None else None,
+        }
+        numbered[style_id] = style.find(f"{_W}pPr/{_W}numPr/{_W}numId") is not None
+    return styles, numbered
+
+
+def _parse_numbering(numbering_xml: Optional[bytes]) -> Dict[str, str]:
+    """First w:numId whose top list level uses each number format."""
+    if not numbering_xml:
+        return {}
+    root = ET.fromstring(numbering_xml)
+    level_formats = {}
+    for abstract in root.iter(f"{_W}abstractNum"):
+        for level in abstract.iter(f"{_W}lvl"):
+            if level.get(f"{_W}ilvl") == "0":
+                number_format = level.find(f"{_W}numFmt")
+                if number_format is not None:
+                    level_formats[abstract.get(f"{_W}abstractNumId")] = number_format.get(f"{_W}val")
+                break
+    numbering = {}
+    for num in root.iter(f"{_W}num"):
+        abstract_id = num.find(f"{_W}abstractNumId")
+        number_format = level_formats.get(abstract_id.get(f"{_W}val") if abstract_id is not None else None)
+        if number_format and number_format not in numbering:
+            numbering[number_format] = num.get(f"{_W}numId")
+    return numbering
+
+
+def _parse_section(body_suffix: bytes) -> Dict[str, Dict[str, str]]:
+    # The suffix starts with the body-level <w:sectPr>; two attribute-only elements
+    # are all we report, so a regex avoids parsing a fragment that is not well-formed.
+    section = {}
+    sect_end = body_suffix.find(b"</w:sectPr>")
+    for element, attributes in _SECTION_ELEMENT_RE.findall(body_suffix[:sect_end if sect_end != -1 else None]):
+        key = "page_size" if element == b"pgSz" else "page_margins"
+        section[key] = {k.decode(): v.decode() for k, v in _ATTRIBUTE_RE.findall(attributes)}
+    return section
+
+
+def _paragraph_open(style_id: Optional[str], num_id: Optional[str]) -> str:
+    properties = ""
+    if style_id:
+        properties += f'<w:pStyle w:val={quoteattr(style_id)}/>'
+    if num_id:
+        properties += f'<w:numPr><w:ilvl w:val="0"/><w:numId w:val={quoteattr(num_id)}/></w:numPr>'
+    return f"<w:p><w:pPr>{properties}</w:pPr>" if properties else "<w:p>"
+
+
+def compile_template(path: Path, digest: str) -> CompiledTemplate:
+    """Parses a .docx/.dotx into a CompiledTemplate. Blocking. Raises InvalidTemplate."""
+    started = time.perf_counter()
+    try:
+        with zipfile.ZipFile(path) as zin:
+            if sum(info.file_size for info in zin.infolist()) > TEMPLATE_MAX_UNCOMPRESSED_BYTES:
+                raise InvalidTemplate("Template is too large once decompressed.")
+        skeleton = skeleton_from_docx(path)
+        styles, numbered_styles = _parse_styles(_part(skeleton, STYLES_PART))
+        numbering = _parse_numbering(_part(skeleton, NUMBERING_PART))
+    except zipfile.BadZipFile:
+        raise InvalidTemplate("Template is not a valid .docx/.dotx file (not a zip archive).")
+    except (ValueError, ET.ParseError) as e:
+        raise InvalidTemplate(f"Template could not be read: {e}")
+
+    # A .dotx differs from a .docx only in its main part's content type; documents
+    # produced from it must carry the document type or Word refuses to open them.
+    content_types = _part(skeleton, CONTENT_TYPES_PART)
+    if content_types and _DOTX_MAIN_CONTENT_TYPE in content_types:
+        patched = content_types.replace(_DOTX_MAIN_CONTENT_TYPE, _DOCX_MAIN_CONTENT_TYPE)
+        skeleton = replace(skeleton, parts=tuple(
+            (name, patched if name == CONTENT_TYPES_PART else data) for name, data in skeleton.parts
+        ))
+
+    style_ids_by_name = {}
+    for style_id, style in styles.items():
+        if style["type"] == "paragraph":
+            style_ids_by_name.setdefault(style["name"].lower(), style_id)
+
+    # Body text uses the template's default paragraph style ("Normal"), which needs no pStyle.
+    role_styles: Dict[str, Optional[str]] = {"body": None}
+    paragraph_xml = {"body": "<w:p>"}
+    for role, names in ROLE_STYLE_NAMES.items():
+        style_id = next((style_ids_by_name[n] for n in names if n in style_ids_by_name), None)
+        num_id = None
+        if role in LIST_ROLE_NUMBER_FORMATS and not (style_id and numbered_styles.get(style_id)):
+            num_id = numbering.get(LIST_ROLE_NUMBER_FORMATS[role])
+            if style_id is None and num_id is None:
+                continue  # Nothing in the template makes this a list; written as body text
+        role_styles[role] = style_id
+        paragraph_xml[role] = _paragraph_open(style_id, num_id) if (style_id or num_id) else "<w:p>"
+
+    return CompiledTemplate(
+        digest=digest,
+        skeleton=skeleton,
+        paragraph_xml=paragraph_xml,
+        role_styles=role_styles,
+        styles=styles,
+        numbering=numbering,
+        section=_parse_section(skeleton.body_suffix),
+        compile_seconds=round(time.perf_counter() - started, 4),
+    )
+
+
+class TemplateCache:
+    """Compiled templates by digest: an in-memory LRU in front of one pickle per template on disk."""
+
+    def __init__(self, store: ContentAddressedStore, memory_entries: int):
+        self.store = store
+        self.root = store.root / "compiled"
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, CompiledTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.compiles = 0
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.v{TEMPLATE_COMPILER_VERSION}.pickle"
+
+    def _remember(self, compiled: CompiledTemplate) -> None:
+        with self._lock:
+            self._memory[compiled.digest] = compiled
+            self._memory.move_to_end(compiled.digest)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _load(self, digest: str) -> Optional[CompiledTemplate]:
+        # Only this service writes these files (never user uploads), so unpickling is safe.
+        try:
+            with open(self._path(digest), "rb") as f:
+                compiled = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, TypeError):
+            return None
+        if not isinstance(compiled, CompiledTemplate) or compiled.compiler_version != TEMPLATE_COMPILER_VERSION:
+            return None
+        return compiled
+
+    def _save(self, compiled: CompiledTemplate) -> None:
+        path = self._path(compiled.digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def put(self, compiled: CompiledTemplate) -> None:
+        self._save(compiled)
+        self._remember(compiled)
+
+    def get(self, digest: str) -> CompiledTemplate:
+        """
+        Returns the compiled template for a stored template digest. Blocking on a memory miss.
+
+        Raises:
+            FileNotFoundError: If no template with this digest is stored.
+        """
+        with self._lock:
+            compiled = self._memory.get(digest)
+            if compiled is not None:
+                self._memory.move_to_end(digest)
+                self.memory_hits += 1
+                return compiled
+        compiled = self._load(digest)
+        if compiled is not None:
+            self.disk_hits += 1
+        else:
+            blob_path = self.store.blob_path(digest)
+            if not blob_path.is_file():
+                raise FileNotFoundError(f"Template {digest} is not stored.")
+            compiled = compile_template(blob_path, digest)
+            self.compiles += 1
+            self._save(compiled)
+        self._remember(compiled)
+        return compiled
+
+    def discard(self, digest: str) -> None:
+        with self._lock:
+            self._memory.pop(digest, None)
+        self._path(digest).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "compiles": self.compiles,
+        }
+
+
+template_files = ContentAddressedStore(TEMPLATE_DIR)
+template_cache = TemplateCache(template_files, TEMPLATE_CACHE_ENTRIES)
+
+
+def add_template(name: str, stream: BinaryIO) -> Tuple[StoredUpload, CompiledTemplate]:
+    """
+    Streams an uploaded template to disk, compiles it and stores it under `name`
+    (replacing any previous template of that name). Invalid uploads are not kept.
+    Blocking; run it in a worker thread from async code.
+
+    Raises:
+        InvalidTemplate: If the upload is too large or not a usable Word document.
+    """
+    hasher = hashlib.new(HASH_ALGORITHM)
+    size = 0
+    fd, tmp_name = tempfile.mkstemp(dir=template_files.tmp_dir, prefix="template-")
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: stream.read(COPY_CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > TEMPLATE_MAX_BYTES:
+                    raise InvalidTemplate(f"Template exceeds {TEMPLATE_MAX_BYTES} bytes.")
+                hasher.update(chunk)
+                out.write(chunk)
+        digest = hasher.hexdigest()
+        compiled = compile_template(tmp_path, digest)
+        template_cache.put(compiled)
+        stored = template_files.put_file(name, tmp_path, digest)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    logger.info("Compiled template '%s'", name, extra={"digest": digest, "seconds": compiled.compile_seconds})
+    return stored, compiled
+
+
+def remove_template(name: str) -> bool:
+    """Removes `name`; the compiled form is dropped once no name references its digest. Blocking."""
+    digest = template_files.digest_for(name)
+    if digest is None or not template_files.release(name):
+        return False
+    if not template_files.is_referenced(digest):
+        template_cache.discard(digest)
+    template_files.collect_garbage()  # Blobs released more than the grace period ago
+    return True
@@ -0,0 +1,228 @@
+# app/services/format_executor.py
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from app.services.logging_setup import configure_logging
+
+# Runs blocking python-docx work off the event loop in a bounded process pool.
+# Admission is capped at (workers + queue size) jobs; anything beyond that is
+# rejected immediately with FormatQueueFull so the route can answer 503 + Retry-After
+# instead of letting requests pile up behind a few large documents.
+
+FORMAT_WORKERS = int(os.getenv("DOCUMORPH_FORMAT_WORKERS", "2"))  # 0 = run in threads (dev/tests)
+FORMAT_QUEUE_SIZE = int(os.getenv("DOCUMORPH_FORMAT_QUEUE_SIZE", "16"))
+FORMAT_JOB_TIMEOUT_SECONDS = float(os.getenv("DOCUMORPH_FORMAT_JOB_TIMEOUT_SECONDS", "60"))
+FORMAT_WORKER_MAX_JOBS = int(os.getenv("DOCUMORPH_FORMAT_WORKER_MAX_JOBS", "50"))  # recycle to cap lxml growth
+FORMAT_RETRY_AFTER_SECONDS = int(os.getenv("DOCUMORPH_FORMAT_RETRY_AFTER_SECONDS", "2"))
+
+
+class FormatUnavailable(Exception):
+    """Base for errors where the job did not run to completion and the caller should retry later."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class FormatQueueFull(FormatUnavailable):
+    """Raised when the admission queue is full; the caller should retry later."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Formatting queue is full. Retry after {retry_after} seconds.", retry_after)
+
+
+class FormatWorkerRestarted(FormatUnavailable):
+    """
+    Raised for a job that shared the pool with a job that timed out: the pool's workers
+    were killed to stop that one, and this job was lost with them. It is not rerun here,
+    since it would get a fresh timeout while still holding its admission slot.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__("The formatting worker was restarted while this job was running. "
+                         f"Retry after {retry_after} seconds.", retry_after)
+
+
+class FormatJobTimeout(Exception):
+    """Raised when a formatting job does not finish within the per-job timeout."""
+
+
+def _consume_result(future: "asyncio.Future") -> None:
+    # Nobody awaits an abandoned job's result; retrieve it so asyncio does not log it.
+    if not future.cancelled():
+        future.exception()
+
+
+class FormatExecutor:
+    """
+    Bounded, recycling executor for formatting jobs.
+
+    `run()` must be awaited from the event loop thread; the admission counter relies
+    on that (no lock needed). A job that times out gets its worker killed (process
+    mode) and keeps its admission slot until the worker is really gone, so a stuck
+    document never holds capacity or a process for longer than the timeout. In thread
+    mode the thread cannot be stopped, and the slot is held until it finishes.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        queue_size: int,
+        job_timeout: float,
+        max_jobs_per_worker: int,
+        retry_after: int,
+    ):
+        self.workers = workers
+        self.capacity = max(workers, 1) + max(queue_size, 0)
+        self.job_timeout = job_timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.retry_after = retry_after
+        self._pool: Optional[Executor] = None
+        self._admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.workers_killed = 0
+        self.retried = 0
+        self.aborted = 0
+        # Pools killed by _kill_pool; their BrokenProcessPool errors are not worker crashes.
+        self._killed_pools: "weakref.WeakSet[Executor]" = weakref.WeakSet()
+
+    def _create_pool(self) -> Executor:
+        if self.workers <= 0:
+            return ThreadPoolExecutor(max_workers=1, thread_name_prefix="docx-format")
+        # Spawned workers start a fresh interpreter; give them the app's log setup too.
+        kwargs = {"max_workers": self.workers, "mp_context": multiprocessing.get_context("spawn"),
+                  "initializer": configure_logging}
+        if sys.version_info >= (3, 11) and self.max_jobs_per_worker > 0:
+            kwargs["max_tasks_per_child"] = self.max_jobs_per_worker
+        return ProcessPoolExecutor(**kwargs)
+
+    def start(self) -> None:
+        if self._pool is None:
+            self._pool = self._create_pool()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _release(self) -> None:
+        self._admitted -= 1
+
+    def _replace_pool(self, pool: Executor) -> None:
+        # Another run() may already have replaced it.
+        if self._pool is pool:
+            self.shutdown()
+            self.start()
+
+    def _kill_pool(self, pool: Executor) -> None:
+        """
+        Kills every worker of `pool`, the only way to stop a running process-pool task.
+        A dead worker breaks the whole pool, so it is replaced; jobs that were running or
+        queued next to the stuck one fail with BrokenProcessPool, which run() turns into
+        FormatWorkerRestarted for their callers.
+        """
+        self._killed_pools.add(pool)
+        if self._pool is pool:
+            self._pool = None  # The next run() starts a fresh pool
+        # ProcessPoolExecutor has no public handle on its workers.
+        processes = list((getattr(pool, "_processes", None) or {}).values())
+        for process in processes:
+            process.kill()
+        # Not cancel_futures: queued jobs should fail with BrokenProcessPool, not hang cancelled.
+        pool.shutdown(wait=False)
+        self.workers_killed += len(processes)
+
+    def _hold_slot_until_done(self, concurrent_future, loop: asyncio.AbstractEventLoop) -> None:
+        concurrent_future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None):
+        """
+        Runs `fn(*args)` in the pool. `fn` and its arguments must be picklable.
+        `timeout` overrides the per-job timeout, e.g. for a job that formats several documents.
+        """
+        timeout = self.job_timeout if timeout is None else timeout
+        if self._admitted >= self.capacity:
+            self.rejected += 1
+            raise FormatQueueFull(self.retry_after)
+        loop = asyncio.get_running_loop()
+
+        self._admitted += 1
+        release_now = True
+        try:
+            for attempt in (1, 2):
+                self.start()
+                pool = self._pool
+                try:
+                    concurrent_future = pool.submit(fn, *args)
+                except BrokenProcessPool:
+                    # A worker died (e.g. OOM-killed); replace the pool and try once more.
+                    if attempt == 2:
+                        raise
+                    self._replace_pool(pool)
+                    continue
+
+                result = asyncio.wrap_future(concurrent_future)
+                try:
+                    return await asyncio.wait_for(asyncio.shield(result), timeout)
+                except BrokenProcessPool:
+                    if pool in self._killed_pools:
+                        # Killed because another job on the same pool got stuck (see _kill_pool).
+                        # Let the caller retry instead of silently rerunning it here.
+                        self.aborted += 1
+                        raise FormatWorkerRestarted(self.retry_after)
+                    # The worker died mid-job (e.g. OOM-killed). Run it once more on a fresh pool.
+                    if attempt == 2:
+                        raise
+                    self.retried += 1
+                    self._replace_pool(pool)
+                except asyncio.TimeoutError:
+                    self.timed_out += 1
+                    result.add_done_callback(_consume_result)
+                    if not concurrent_future.cancel():
+                        # Already running. The slot is held until the task really ends; in
+                        # process mode that is right away, since the worker is killed.
+                        release_now = False
+                        self._hold_slot_until_done(concurrent_future, loop)
+                        if self.workers > 0:
+                            self._kill_pool(pool)
+                    raise FormatJobTimeout(f"Formatting did not finish within {timeout:g} seconds.")
+                except asyncio.CancelledError:
+                    # The client went away. A job that already started keeps its worker busy
+                    # until it finishes, so it keeps its admission slot until then too.
+                    result.add_done_callback(_consume_result)
+                    if not concurrent_future.cancel():
+                        release_now = False
+                        self._hold_slot_until_done(concurrent_future, loop)
+                    raise
+        finally:
+            if release_now:
+                self._release()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "in_flight": self._admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "workers_killed": self.workers_killed,
+            "retried": self.retried,
+            "aborted": self.aborted,
+        }
+
+
+format_executor = FormatExecutor(
+    workers=FORMAT_WORKERS,
+    queue_size=FORMAT_QUEUE_SIZE,
+    job_timeout=FORMAT_JOB_TIMEOUT_SECONDS,
+    max_jobs_per_worker=FORMAT_WORKER_MAX_JOBS,
+    retry_after=FORMAT_RETRY_AFTER_SECONDS,
+)
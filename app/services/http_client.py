@@ -0,0 +1,154 @@
+# app/services/http_client.py
+
+import asyncio
+import os
+import random
+import time
+from typing import BinaryIO, Optional
+
+import httpx
+
+from app.services.logging_setup import get_logger
+from app.services.metrics import n8n_request_duration_seconds, n8n_requests_total, n8n_retries_total
+
+# One pooled httpx.AsyncClient for the whole app (created in the app lifespan).
+# Reusing it keeps TCP/TLS connections to n8n alive between requests instead of
+# paying a fresh handshake per call.
+
+N8N_CONNECT_TIMEOUT_SECONDS = float(os.getenv("N8N_CONNECT_TIMEOUT_SECONDS", "5"))
+N8N_READ_TIMEOUT_SECONDS = float(os.getenv("N8N_READ_TIMEOUT_SECONDS", "90"))
+N8N_TOTAL_TIMEOUT_SECONDS = float(os.getenv("N8N_TOTAL_TIMEOUT_SECONDS", "120"))
+N8N_MAX_RETRIES = int(os.getenv("N8N_MAX_RETRIES", "2"))
+N8N_RETRY_BACKOFF_SECONDS = float(os.getenv("N8N_RETRY_BACKOFF_SECONDS", "0.5"))
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("DOCUMORPH_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("DOCUMORPH_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("DOCUMORPH_HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+HTTP2_REQUESTED = os.getenv("DOCUMORPH_HTTP2", "").lower() in ("1", "true", "yes")
+
+# The webhook POST starts a workflow run and is not idempotent, so it is only retried
+# when the request never left this process: the connection could not be established or
+# no pooled connection became free. Once the body was sent, any answer (also 502/503 from
+# a gateway, which may have forwarded it) or error is final; n8n may already be working.
+RETRYABLE_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+_client: Optional[httpx.AsyncClient] = None
+
+logger = get_logger("services.http_client")
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (optional dependency: pip install "httpx[http2]")
+    except ImportError:
+        return False
+    return True
+
+
+def _build_client() -> httpx.AsyncClient:
+    http2 = HTTP2_REQUESTED and _http2_available()
+    if HTTP2_REQUESTED and not http2:
+        logger.warning("DOCUMORPH_HTTP2 is set but the 'h2' package is not installed; using HTTP/1.1.")
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            connect=N8N_CONNECT_TIMEOUT_SECONDS,
+            read=N8N_READ_TIMEOUT_SECONDS,
+            write=N8N_READ_TIMEOUT_SECONDS,
+            pool=N8N_CONNECT_TIMEOUT_SECONDS,
+        ),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        http2=http2,
+    )
+
+
+async def start_http_client() -> None:
+    global _client
+    if _client is None:
+        _client = _build_client()
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the shared client, creating it on first use outside the app lifespan (scripts)."""
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+def _backoff_delay(attempt: int) -> float:
+    # Exponential backoff with full jitter, so retries from many requests don't align.
+    return random.uniform(0, N8N_RETRY_BACKOFF_SECONDS * (2 ** attempt))
+
+
+async def _post_file(url: str, field_name: str, filename: str, fileobj: BinaryIO,
+                     content_type: str, max_retries: int) -> httpx.Response:
+    client = get_http_client()
+    for attempt in range(max_retries + 1):
+        is_last_attempt = attempt == max_retries
+        # httpx reads the file object in chunks while sending, so the upload is streamed
+        # from its spool file rather than copied into memory. Rewind it for each attempt.
+        fileobj.seek(0)
+        try:
+            response = await client.post(url, files={field_name: (filename, fileobj, content_type)})
+        except httpx.HTTPError as exc:
+            n8n_requests_total.labels(type(exc).__name__).inc()
+            if is_last_attempt or not isinstance(exc, RETRYABLE_EXCEPTIONS):
+                raise
+            logger.warning("n8n attempt failed; retrying",
+                           extra={"url": url, "attempt": attempt + 1, "error": type(exc).__name__})
+        else:
+            n8n_requests_total.labels(response.status_code).inc()
+            return response
+        n8n_retries_total.inc()
+        await asyncio.sleep(_backoff_delay(attempt))
+    raise AssertionError("unreachable")
+
+
+async def post_file_with_retries(
+    url: str,
+    field_name: str,
+    filename: str,
+    fileobj: BinaryIO,
+    content_type: str,
+    max_retries: int = N8N_MAX_RETRIES,
+    total_timeout: float = N8N_TOTAL_TIMEOUT_SECONDS,
+) -> httpx.Response:
+    """
+    POSTs `fileobj` as multipart form data using the shared client.
+
+    Retries with jittered backoff only if the request could not be sent (connection
+    failures), never after n8n or a gateway received it, and bounds the whole exchange
+    (all attempts) by `total_timeout`.
+
+    Raises:
+        httpx.TimeoutException: If a phase timeout or the total timeout is exceeded.
+        httpx.RequestError: For other transport errors after the last attempt.
+    """
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        response = await asyncio.wait_for(
+            _post_file(url, field_name, filename, fileobj, content_type, max_retries),
+            timeout=total_timeout,
+        )
+        outcome = "success" if response.is_success else "http_error"
+        return response
+    except (asyncio.TimeoutError, httpx.TimeoutException) as exc:
+        outcome = "timeout"
+        if isinstance(exc, httpx.TimeoutException):
+            raise
+        n8n_requests_total.labels("TotalTimeout").inc()
+        raise httpx.TimeoutException(f"No complete response from {url} within {total_timeout:g} seconds.")
+    finally:
+        n8n_request_duration_seconds.labels(outcome).observe(time.perf_counter() - started)
@@ -0,0 +1,30 @@
+# app/services/image_captioning.py
+
+import os
+
+from app.models.fake_model import FakeModel, USE_FAKE_MODELS
+from app.models.registry import model_registry
+from app.services.batching import MicroBatcher, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS
+
+# Image captioning with BLIP, batched across concurrent requests.
+
+CAPTION_MAX_BATCH_SIZE = int(os.getenv("DOCUMORPH_CAPTION_MAX_BATCH_SIZE", str(DEFAULT_MAX_BATCH_SIZE)))
+CAPTION_MAX_WAIT_MS = float(os.getenv("DOCUMORPH_CAPTION_MAX_WAIT_MS", str(DEFAULT_MAX_WAIT_MS)))
+
+
+def _load_caption_model():
+    if USE_FAKE_MODELS:
+        return FakeModel("caption")
+    from app.models.caption_model import CaptionModel
+    return CaptionModel()
+
+
+model_registry.register("caption", _load_caption_model, estimated_mb=1000)
+caption_batcher = MicroBatcher(
+    "caption", lambda: model_registry.get("caption"), max_batch_size=CAPTION_MAX_BATCH_SIZE, max_wait_ms=CAPTION_MAX_WAIT_MS
+)
+
+
+async def caption_image(image_bytes: bytes) -> str:
+    """Returns a one-sentence caption for one image."""
+    return await caption_batcher.submit(image_bytes)
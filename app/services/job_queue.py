@@ -0,0 +1,261 @@
+# app/services/job_queue.py
+
+import asyncio
+import heapq
+import itertools
+import os
+import shutil
+import socket
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Awaitable, BinaryIO, Callable, Dict, List, Optional, Set, Tuple
+
+from app.services.job_store import (
+    Job,
+    JobStore,
+    JOB_STATUS_FAILED,
+    JOB_STATUS_QUEUED,
+    JOB_STATUS_SUCCEEDED,
+)
+from app.services.logging_setup import get_logger
+
+# Asynchronous job queue for long-running orchestration work.
+# Submitting returns a job id immediately; a fixed pool of asyncio worker tasks runs
+# jobs in priority order, with at most `per_tenant_limit` jobs per tenant in flight so
+# one busy tenant cannot occupy every worker. State lives in a JobStore (SQLite).
+# Running jobs are held under a lease (see job_store.py) that a heartbeat task renews
+# every lease_seconds / 3; the same task re-queues jobs whose lease expired, so jobs
+# of a crashed process are picked up by the survivors. A job is started at most
+# `max_attempts` times; when it is interrupted after its last attempt it fails instead.
+
+JOB_WORKERS = int(os.getenv("DOCUMORPH_JOB_WORKERS", "8"))
+JOB_PER_TENANT_LIMIT = int(os.getenv("DOCUMORPH_JOB_PER_TENANT_LIMIT", "2"))
+JOB_MAX_PENDING = int(os.getenv("DOCUMORPH_JOB_MAX_PENDING", "10000"))
+JOB_DATA_DIR = Path(os.getenv("DOCUMORPH_JOB_DATA_DIR", "data/jobs"))
+JOB_LEASE_SECONDS = float(os.getenv("DOCUMORPH_JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("DOCUMORPH_JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_AFTER_SECONDS = int(os.getenv("DOCUMORPH_JOB_RETRY_AFTER_SECONDS", "5"))
+
+# A handler takes the job and returns (http status code, result dict) or raises JobFailed.
+JobHandler = Callable[[Job], Awaitable[Tuple[int, dict]]]
+_QueueItem = Tuple[int, int, str, str]  # (-priority, sequence, job_id, tenant)
+
+logger = get_logger("services.job_queue")
+
+
+class JobFailed(Exception):
+    """Raised by a handler to fail a job with a message and an HTTP-style status code."""
+
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are pending; the caller should retry later."""
+
+    def __init__(self, pending: int, retry_after: int):
+        super().__init__(f"{pending} jobs are already pending. Retry after {retry_after} seconds.")
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    def __init__(self, store: JobStore, handler: JobHandler, spool_dir: Path,
+                 workers: int, per_tenant_limit: int, max_pending: int,
+                 lease_seconds: float = JOB_LEASE_SECONDS, max_attempts: int = JOB_MAX_ATTEMPTS,
+                 retry_after: int = JOB_RETRY_AFTER_SECONDS):
+        self.store = store
+        self.handler = handler
+        self.spool_dir = Path(spool_dir)
+        self.workers = max(workers, 1)
+        self.per_tenant_limit = max(per_tenant_limit, 1)
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(max_attempts, 1)
+        self.retry_after = retry_after
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._running_per_tenant: Dict[str, int] = defaultdict(int)
+        self._deferred: Dict[str, List[_QueueItem]] = defaultdict(list)  # per-tenant heaps
+        self._pending = 0
+        self._update_events: Dict[str, Set[asyncio.Event]] = {}  # job id -> one event per subscriber
+        self._leases: Dict[str, str] = {}  # job id -> owner token, for jobs running here
+        self._worker_tasks: List[asyncio.Task] = []
+        self._lease_task: Optional[asyncio.Task] = None
+
+    # --- Lifecycle ---
+
+    async def start(self) -> None:
+        if self._worker_tasks:
+            return
+        # In-memory scheduling state is rebuilt from the store on every start.
+        self._queue = asyncio.PriorityQueue()
+        self._pending = 0
+        self._running_per_tenant.clear()
+        self._deferred.clear()
+        # Jobs of a process that died are re-queued once their lease expires; running
+        # jobs of live processes are left alone. Queued jobs may also sit in another
+        # process's queue; claim() makes sure only one of them runs each job.
+        expired, failed = await asyncio.to_thread(self.store.requeue_expired, self.max_attempts)
+        self._gave_up(failed)
+        recovered = await asyncio.to_thread(self.store.queued)
+        for job in recovered:
+            self._enqueue(job.id, job.tenant, job.priority)
+        if recovered:
+            logger.info("Queued %d unfinished job(s) from the job store (%d with an expired lease).",
+                        len(recovered), len(expired))
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._lease_task = asyncio.create_task(self._lease_loop())
+
+    async def stop(self) -> None:
+        # Jobs running here are handed back to the queue, for this process's next start()
+        # or for another process, instead of waiting for their leases to expire.
+        leases = dict(self._leases)
+        for task in self._worker_tasks + ([self._lease_task] if self._lease_task else []):
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, *([self._lease_task] if self._lease_task else []),
+                             return_exceptions=True)
+        self._worker_tasks = []
+        self._lease_task = None
+        self._leases.clear()
+        _, failed = await asyncio.to_thread(self.store.release_leases, leases, self.max_attempts)
+        self._gave_up(failed)
+
+    # --- Submission and status ---
+
+    async def submit(self, tenant: str, priority: int, filename: str, content_type: str,
+                     fileobj: BinaryIO) -> Job:
+        if self._pending >= self.max_pending:
+            raise JobQueueFull(self._pending, self.retry_after)
+        job_id = uuid.uuid4().hex
+        input_path = self.spool_dir / f"{job_id}.bin"
+        await asyncio.to_thread(_copy_to_path, fileobj, input_path)
+
+        job = Job(
+            id=job_id, tenant=tenant, priority=priority, status=JOB_STATUS_QUEUED,
+            filename=filename, content_type=content_type, input_path=str(input_path),
+            created_at=time.time(),
+        )
+        await asyncio.to_thread(self.store.insert, job)
+        self._enqueue(job_id, tenant, priority)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    def subscribe(self, job_id: str) -> asyncio.Event:
+        """
+        Returns an event that is set on the job's next state change. Subscribe before
+        reading the job's status so a change in between is not missed, and call
+        unsubscribe() if you stop waiting before it is set (e.g. the job is finished).
+        """
+        event = asyncio.Event()
+        self._update_events.setdefault(job_id, set()).add(event)
+        return event
+
+    def unsubscribe(self, job_id: str, event: asyncio.Event) -> None:
+        events = self._update_events.get(job_id)
+        if events is not None:
+            events.discard(event)
+            if not events:
+                del self._update_events[job_id]
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "per_tenant_limit": self.per_tenant_limit,
+            "pending": self._pending,
+            "running_here": len(self._leases),
+            "subscribed_jobs": len(self._update_events),
+            "running_per_tenant": {t: n for t, n in self._running_per_tenant.items() if n},
+            "deferred_per_tenant": {t: len(h) for t, h in self._deferred.items() if h},
+        }
+
+    # --- Scheduling ---
+
+    def _enqueue(self, job_id: str, tenant: str, priority: int) -> None:
+        self._pending += 1
+        self._queue.put_nowait((-priority, next(self._sequence), job_id, tenant))
+
+    def _notify(self, job_id: str) -> None:
+        for event in self._update_events.pop(job_id, ()):
+            event.set()
+
+    def _gave_up(self, jobs: List[Job]) -> None:
+        # Jobs the store failed because they were interrupted on their last attempt.
+        for job in jobs:
+            logger.error("Job %s was interrupted on attempt %d of %d; marked it failed.",
+                         job.id, job.attempts, self.max_attempts)
+            Path(job.input_path).unlink(missing_ok=True)
+            self._notify(job.id)
+
+    async def _lease_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self.store.renew_leases, dict(self._leases), self.lease_seconds)
+                requeued, failed = await asyncio.to_thread(self.store.requeue_expired, self.max_attempts)
+                for job in requeued:
+                    logger.warning("Lease on job %s expired; re-queued it.", job.id)
+                    self._enqueue(job.id, job.tenant, job.priority)
+                self._gave_up(failed)
+            except Exception as e:
+                logger.error("Job lease heartbeat failed: %s", e, exc_info=True)
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self._queue.get()
+            tenant = item[3]
+            if self._running_per_tenant[tenant] >= self.per_tenant_limit:
+                # Tenant is at its limit: park the job until one of its jobs finishes.
+                heapq.heappush(self._deferred[tenant], item)
+                continue
+            self._running_per_tenant[tenant] += 1
+            self._pending -= 1
+            try:
+                await self._run(item[2])
+            finally:
+                self._running_per_tenant[tenant] -= 1
+                if self._deferred[tenant]:
+                    self._queue.put_nowait(heapq.heappop(self._deferred[tenant]))
+
+    async def _run(self, job_id: str) -> None:
+        owner = f"{self.instance_id}:{uuid.uuid4().hex[:8]}"  # One token per claim
+        job = await asyncio.to_thread(self.store.claim, job_id, owner, self.lease_seconds)
+        if job is None:
+            return  # Finished, or claimed by another worker or process
+        self._leases[job_id] = owner
+        self._notify(job_id)
+        try:
+            try:
+                status_code, result = await self.handler(job)
+            except asyncio.CancelledError:
+                raise  # Shutdown; stop() hands the job back to the queue.
+            except JobFailed as e:
+                outcome = dict(status=JOB_STATUS_FAILED, error=str(e), status_code=e.status_code)
+            except Exception as e:
+                logger.error("Unexpected error in job %s: %s", job_id, e, exc_info=True)
+                outcome = dict(status=JOB_STATUS_FAILED, error=f"Unexpected error: {e}", status_code=500)
+            else:
+                outcome = dict(status=JOB_STATUS_SUCCEEDED, result=result, status_code=status_code)
+            recorded = await asyncio.to_thread(self.store.mark_finished, job_id, owner, **outcome)
+        finally:
+            self._leases.pop(job_id, None)
+        if not recorded:
+            # The lease expired while the handler ran and the job was handed to another
+            # worker, which now owns the outcome (and the input file).
+            logger.warning("Lease on job %s was lost while it ran; its outcome was discarded.", job_id)
+            return
+        Path(job.input_path).unlink(missing_ok=True)
+        self._notify(job_id)
+
+
+def _copy_to_path(fileobj: BinaryIO, path: Path) -> None:
+    fileobj.seek(0)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(fileobj, out, 1024 * 1024)
@@ -0,0 +1,213 @@
+# app/services/job_store.py
+
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# SQLite-backed persistence for orchestration jobs.
+# Every state change is written through, so queued and in-flight jobs are picked up
+# again after a restart (see JobQueue.start()). Methods are blocking but short; the
+# queue calls them through asyncio.to_thread.
+#
+# Several server processes may share one database. A worker claims a job atomically
+# (queued -> running) under a lease: a unique owner token plus an expiry that the
+# worker's process keeps extending while it runs. Only jobs whose lease ran out (their
+# process died or hung) are put back in the queue, and a result is only recorded by
+# the current lease holder.
+#
+# Every claim counts as an attempt. An interrupted job is only put back while it has
+# attempts left; after that it fails, so a job that crashes its worker every time (and
+# POSTs to n8n every time) does not run forever.
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_SUCCEEDED = "succeeded"
+JOB_STATUS_FAILED = "failed"
+TERMINAL_STATUSES = (JOB_STATUS_SUCCEEDED, JOB_STATUS_FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           TEXT PRIMARY KEY,
+    tenant       TEXT NOT NULL,
+    priority     INTEGER NOT NULL DEFAULT 0,
+    status       TEXT NOT NULL,
+    filename     TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    input_path   TEXT NOT NULL,
+    result       TEXT,
+    error        TEXT,
+    status_code  INTEGER,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    created_at   REAL NOT NULL,
+    started_at   REAL,
+    finished_at  REAL,
+    owner            TEXT,  -- Lease token of the worker running the job
+    lease_expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status);
+"""
+
+
+@dataclass
+class Job:
+    id: str
+    tenant: str
+    priority: int
+    status: str
+    filename: str
+    content_type: str
+    input_path: str
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    status_code: Optional[int] = None
+    attempts: int = 0
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    owner: Optional[str] = None
+    lease_expires_at: Optional[float] = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def to_public_dict(self) -> dict:
+        """What clients see; the server-side input path and lease stay private."""
+        data = asdict(self)
+        for private in ("input_path", "owner", "lease_expires_at"):
+            data.pop(private)
+        return data
+
+
+class JobStore:
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            # WAL keeps readers (status polls) from blocking the writer.
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Job:
+        data = dict(row)
+        data["result"] = json.loads(data["result"]) if data["result"] else None
+        return Job(**data)
+
+    def insert(self, job: Job) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, tenant, priority, status, filename, content_type, input_path, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.tenant, job.priority, job.status, job.filename, job.content_type,
+                 job.input_path, job.created_at),
+            )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def claim(self, job_id: str, owner: str, lease_seconds: float) -> Optional[Job]:
+        """
+        Atomically moves a queued job to running under `owner`'s lease. Returns None if
+        the job is not queued (finished, or already claimed by another worker or process).
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, lease_expires_at = ?, started_at = ?,"
+                " attempts = attempts + 1 WHERE id = ? AND status = ? RETURNING *",
+                (JOB_STATUS_RUNNING, owner, now + lease_seconds, now, job_id, JOB_STATUS_QUEUED),
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def renew_leases(self, leases: Dict[str, str], lease_seconds: float) -> None:
+        """Heartbeat: extends the leases in `leases` (job id -> owner) that are still held."""
+        if not leases:
+            return
+        expires_at = time.time() + lease_seconds
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND owner = ? AND status = ?",
+                [(expires_at, job_id, owner, JOB_STATUS_RUNNING) for job_id, owner in leases.items()],
+            )
+
+    def mark_finished(self, job_id: str, owner: str, status: str, result: Optional[dict] = None,
+                      error: Optional[str] = None, status_code: Optional[int] = None) -> bool:
+        """Records the outcome if `owner` still holds the job's lease; returns False otherwise."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, status_code = ?, finished_at = ?,"
+                " owner = NULL, lease_expires_at = NULL WHERE id = ? AND owner = ? AND status = ?",
+                (status, json.dumps(result) if result is not None else None, error, status_code,
+                 time.time(), job_id, owner, JOB_STATUS_RUNNING),
+            )
+        return cursor.rowcount == 1
+
+    def release_leases(self, leases: Dict[str, str], max_attempts: int) -> Tuple[List[Job], List[Job]]:
+        """
+        Puts jobs back in the queue right away (graceful shutdown) instead of waiting for
+        their leases to expire. Returns (requeued, failed), see requeue_expired().
+        """
+        requeued, failed = [], []
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            for job_id, owner in leases.items():
+                back, gone = self._interrupt_locked(
+                    "id = ? AND owner = ? AND status = ?", (job_id, owner, JOB_STATUS_RUNNING), max_attempts)
+                requeued += back
+                failed += gone
+        return requeued, failed
+
+    def requeue_expired(self, max_attempts: int) -> Tuple[List[Job], List[Job]]:
+        """
+        Handles running jobs whose lease expired (their worker is gone): jobs with attempts
+        left go back to queued, the others fail. Returns (requeued, failed).
+        """
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            return self._interrupt_locked(
+                "status = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+                (JOB_STATUS_RUNNING, time.time()), max_attempts)
+
+    def _interrupt_locked(self, condition: str, params: tuple, max_attempts: int) -> Tuple[List[Job], List[Job]]:
+        # Caller must hold self._lock and have a transaction open.
+        failed = self._conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, status_code = ?, finished_at = ?, owner = NULL,"
+            f" lease_expires_at = NULL WHERE {condition} AND attempts >= ? RETURNING *",
+            (JOB_STATUS_FAILED, f"Job was interrupted {max_attempts} time(s); giving up.", 500, time.time(),
+             *params, max_attempts),
+        ).fetchall()
+        requeued = self._conn.execute(
+            "UPDATE jobs SET status = ?, owner = NULL, lease_expires_at = NULL, started_at = NULL"
+            f" WHERE {condition} RETURNING *",
+            (JOB_STATUS_QUEUED, *params),
+        ).fetchall()
+        return [self._row_to_job(row) for row in requeued], [self._row_to_job(row) for row in failed]
+
+    def queued(self) -> List[Job]:
+        """Every queued job, in the order they should run."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY priority DESC, created_at",
+                (JOB_STATUS_QUEUED,),
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def count_by_status(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,116 @@
+# app/services/logging_setup.py
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+# Structured, leveled, non-blocking logging for the whole app.
+# Loggers only put records on an in-memory queue; a single background thread formats
+# them and writes to stdout. A slow terminal or log shipper therefore never stalls a
+# request, and when the queue is full records are dropped (and counted) rather than
+# blocking. Levels below DOCUMORPH_LOG_LEVEL cost one integer comparison.
+#
+#   DOCUMORPH_LOG_LEVEL   DEBUG | INFO (default) | WARNING | ERROR
+#   DOCUMORPH_LOG_FORMAT  json (default; one object per line) | text
+#
+# Structured fields are passed as `extra`: logger.info("Job finished", extra={"job_id": ..., "status": ...}).
+
+LOG_LEVEL = os.getenv("DOCUMORPH_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("DOCUMORPH_LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("DOCUMORPH_LOG_QUEUE_SIZE", "10000"))
+
+ROOT_LOGGER_NAME = "documorph"
+
+# Attributes every LogRecord has; anything else on a record came from `extra`.
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_TRACEBACK_FORMATTER = logging.Formatter()
+_listener = None
+dropped_records = 0
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = " ".join(f"{k}={v}" for k, v in record.__dict__.items()
+                          if k not in _STANDARD_ATTRS and not k.startswith("_"))
+        return f"{line} {fields}" if fields else line
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: a full queue drops the record instead."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Like QueueHandler.prepare, but keeps the traceback as its own field instead
+        # of folding it into the message, and leaves the rest of formatting to the writer.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _TRACEBACK_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        global dropped_records
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records += 1
+
+
+def configure_logging() -> None:
+    """Installs the queue handler on the "documorph" logger and starts the writer thread. Idempotent."""
+    global _listener
+    if _listener is not None:
+        return
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+
+    log_queue: "queue.Queue" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    root.handlers[:] = [_DroppingQueueHandler(log_queue)]
+    root.propagate = False  # uvicorn's own handlers stay as they are
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=False)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flushes queued records and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the "documorph" hierarchy, e.g. get_logger("routes.format_v1")."""
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
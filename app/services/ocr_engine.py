@@ -0,0 +1,31 @@
+# app/services/ocr_engine.py
+
+import os
+
+from app.models.fake_model import FakeModel, USE_FAKE_MODELS
+from app.models.registry import model_registry
+from app.services.batching import MicroBatcher, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS
+
+# Handwriting OCR with TrOCR. Requests from all routes share one micro-batcher, so
+# concurrent uploads are recognized in a single forward pass.
+
+OCR_MAX_BATCH_SIZE = int(os.getenv("DOCUMORPH_OCR_MAX_BATCH_SIZE", str(DEFAULT_MAX_BATCH_SIZE)))
+OCR_MAX_WAIT_MS = float(os.getenv("DOCUMORPH_OCR_MAX_WAIT_MS", str(DEFAULT_MAX_WAIT_MS)))
+
+
+def _load_trocr():
+    if USE_FAKE_MODELS:
+        return FakeModel("trocr")
+    from app.models.trocr_model import TrOCRModel
+    return TrOCRModel()
+
+
+model_registry.register("trocr", _load_trocr, estimated_mb=1400)
+ocr_batcher = MicroBatcher(
+    "trocr", lambda: model_registry.get("trocr"), max_batch_size=OCR_MAX_BATCH_SIZE, max_wait_ms=OCR_MAX_WAIT_MS
+)
+
+
+async def recognize_handwriting(image_bytes: bytes) -> str:
+    """Returns the text recognized in one handwriting image."""
+    return await ocr_batcher.submit(image_bytes)
@@ -0,0 +1,199 @@
+# app/services/output_cache.py
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+# Persistent cache of formatted DOCX outputs.
+# A cache key is derived from (input content digest, formatter version, options), so a
+# cached file is only reused when neither the input bytes nor the formatter changed.
+# Entries are plain files in OUTPUT_CACHE_DIR; recency is tracked in memory and mirrored
+# to the files' mtimes so the LRU order survives a restart without a separate index.
+#
+# Eviction may delete an entry at any time, also while another request is sending it.
+# Responses are therefore served from a checkout: a hard link to the entry in tmp/,
+# made under the cache lock and removed once the response is sent. A link keeps the
+# bytes alive whatever happens to the entry, also across server processes.
+
+OUTPUT_CACHE_DIR = Path(os.getenv("DOCUMORPH_OUTPUT_CACHE_DIR", "data/sample_outputs/cache"))
+OUTPUT_CACHE_MAX_BYTES = int(os.getenv("DOCUMORPH_OUTPUT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+OUTPUT_CACHE_MAX_ENTRIES = int(os.getenv("DOCUMORPH_OUTPUT_CACHE_MAX_ENTRIES", "1000"))
+
+CACHE_FILE_SUFFIX = ".docx"
+STALE_TMP_SECONDS = 3600  # Checkouts and partial outputs left behind by a crash
+
+
+class FormattedOutputCache:
+    """
+    Size- and entry-bounded LRU cache of formatted documents stored on disk.
+
+    Checkouts and inserts only touch file metadata, so they are cheap enough to call
+    from async routes directly. The expensive part (producing the DOCX) happens
+    outside the cache, guarded by `lock_for(key)` so concurrent misses for the same
+    key format the document only once. Serve entries via `checkout()`, never via
+    their cache path, which eviction can remove mid-response.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, max_entries: int):
+        self.root = Path(root)
+        self.tmp_dir = self.root / "tmp"
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size in bytes, oldest first
+        self._total_bytes = 0
+        self._key_locks: Dict[str, List] = {}  # key -> [lock, number of holders and waiters]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_existing()
+
+    def _load_existing(self) -> None:
+        cutoff = time.time() - STALE_TMP_SECONDS
+        for path in self.tmp_dir.iterdir():
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
+        found = []
+        for path in self.root.glob(f"*{CACHE_FILE_SUFFIX}"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            found.append((st.st_mtime, path.stem, st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict_locked(keep_key=None)
+
+    @staticmethod
+    def make_key(input_digest: str, formatter_version: str, options: Optional[dict] = None) -> str:
+        payload = json.dumps(
+            {"input": input_digest, "formatter": formatter_version, "options": options or {}},
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        return self.root / f"{key}{CACHE_FILE_SUFFIX}"
+
+    def tmp_path_for(self, key: str) -> Path:
+        return self.tmp_dir / f"{key}.{os.getpid()}.{threading.get_ident()}{CACHE_FILE_SUFFIX}"
+
+    @asynccontextmanager
+    async def lock_for(self, key: str) -> AsyncIterator[None]:
+        """Per-key lock, held while a miss is formatted. Event loop only; dropped after its last user."""
+        entry = self._key_locks.get(key)
+        if entry is None:
+            entry = self._key_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._key_locks[key]
+
+    def _link_for_serving(self, path: Path) -> Path:
+        served_path = self.tmp_dir / f"serve-{uuid.uuid4().hex}{CACHE_FILE_SUFFIX}"
+        os.link(path, served_path)
+        return served_path
+
+    def contains(self, key: str) -> bool:
+        """
+        Whether the entry is cached, without checking it out; for conditional requests
+        answered without a body. A present entry counts as a hit; absence is not counted,
+        since the caller goes on to checkout().
+        """
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True
+
+    def checkout(self, key: str, count: bool = True) -> Optional[Path]:
+        """
+        Returns a private hard link to the entry (marking it most recently used and
+        recording a hit or miss), or None. Eviction cannot remove the link. The caller must unlink it once done (e.g. in a BackgroundTask after the
+        response is sent). `count=False` skips the hit/miss counters (re-checks under lock_for).
+        """
+        path = self.path_for(key)
+        with self._lock:
+            served_path = None
+            if key in self._entries:
+                try:
+                    served_path = self._link_for_serving(path)
+                except FileNotFoundError:  # Removed underneath us (e.g. by another process); forget it.
+                    self._total_bytes -= self._entries.pop(key)
+            if served_path is None:
+                self.misses += count
+                return None
+            self._entries.move_to_end(key)
+            self.hits += count
+        try:
+            os.utime(path)  # Persist recency for the next process start.
+        except OSError:
+            pass
+        return served_path
+
+    def put(self, key: str, produced_path: Path, checkout: bool = False) -> Path:
+        """
+        Moves a freshly produced file into the cache and evicts LRU entries over the limits.
+        Returns the entry's path, or with `checkout=True` a checkout of it (see checkout()).
+        """
+        path = self.path_for(key)
+        size = Path(produced_path).stat().st_size
+        served_path = self._link_for_serving(produced_path) if checkout else None
+        os.replace(produced_path, path)
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict_locked(keep_key=key)
+        return served_path or path
+
+    def _evict_locked(self, keep_key: Optional[str]) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes
+        ):
+            oldest_key = next(iter(self._entries))
+            if oldest_key == keep_key:
+                break  # Never evict the entry we are about to serve.
+            self._total_bytes -= self._entries.pop(oldest_key)
+            self.path_for(oldest_key).unlink(missing_ok=True)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+
+output_cache = FormattedOutputCache(OUTPUT_CACHE_DIR, OUTPUT_CACHE_MAX_BYTES, OUTPUT_CACHE_MAX_ENTRIES)
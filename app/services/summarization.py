@@ -0,0 +1,309 @@
+# app/services/summarization.py
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple
+
+from app.models.fake_model import FakeModel, USE_FAKE_MODELS
+from app.models.pegasus_model import PEGASUS_MAX_INPUT_TOKENS, PEGASUS_MAX_NEW_TOKENS, PEGASUS_MODEL_ID
+from app.models.registry import model_registry
+from app.services.batching import MicroBatcher, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS
+
+# Abstractive summarization with Pegasus, batched across concurrent requests.
+
+SUMMARY_MAX_BATCH_SIZE = int(os.getenv("DOCUMORPH_SUMMARY_MAX_BATCH_SIZE", str(DEFAULT_MAX_BATCH_SIZE)))
+SUMMARY_MAX_WAIT_MS = float(os.getenv("DOCUMORPH_SUMMARY_MAX_WAIT_MS", str(DEFAULT_MAX_WAIT_MS)))
+
+
+def _load_pegasus():
+    if USE_FAKE_MODELS:
+        return FakeModel("pegasus")
+    from app.models.pegasus_model import PegasusModel
+    return PegasusModel()
+
+
+model_registry.register("pegasus", _load_pegasus, estimated_mb=2300)
+summary_batcher = MicroBatcher(
+    "pegasus", lambda: model_registry.get("pegasus"), max_batch_size=SUMMARY_MAX_BATCH_SIZE, max_wait_ms=SUMMARY_MAX_WAIT_MS
+)
+
+
+async def summarize_text(text: str) -> str:
+    """Summarizes one piece of text (truncated to the model's input window)."""
+    return await summary_batcher.submit(text)
+
+
+# --- Long documents: map-reduce summarization ---
+# A long document is split into overlapping chunks that each fit the model's input
+# window. Chunks are summarized in parallel (the batcher groups them into forward
+# passes), then the chunk summaries are grouped and summarized again, level by level,
+# until a single summary remains. Every (model, text) summary is cached by content
+# hash, so re-summarizing an edited document only recomputes the chunks that changed.
+
+SUMMARY_CHUNK_TOKENS = int(os.getenv("DOCUMORPH_SUMMARY_CHUNK_TOKENS", str(PEGASUS_MAX_INPUT_TOKENS)))
+SUMMARY_CHUNK_OVERLAP_TOKENS = int(os.getenv("DOCUMORPH_SUMMARY_CHUNK_OVERLAP_TOKENS", "64"))
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("DOCUMORPH_SUMMARY_MAP_CONCURRENCY", "32"))
+SUMMARY_MAX_REDUCE_LEVELS = 6
+SUMMARY_CACHE_DIR = Path(os.getenv("DOCUMORPH_SUMMARY_CACHE_DIR", "data/cache/summaries"))
+SUMMARY_CACHE_MEMORY_ENTRIES = int(os.getenv("DOCUMORPH_SUMMARY_CACHE_MEMORY_ENTRIES", "10000"))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("DOCUMORPH_SUMMARY_CACHE_MAX_ENTRIES", "200000"))  # On disk
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv("DOCUMORPH_SUMMARY_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# SentencePiece averages a little over one token per English word; counting words and
+# scaling avoids loading the tokenizer just to split text.
+TOKENS_PER_WORD = 1.35
+
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text.split()) * TOKENS_PER_WORD)
+
+
+def _split_units(text: str, max_words: int) -> List[str]:
+    """Sentences (and paragraph breaks) as units; over-long sentences are cut by words."""
+    units = []
+    for sentence in _SENTENCE_SPLIT_RE.split(text):
+        words = sentence.split()
+        for start in range(0, len(words), max_words):
+            units.append(" ".join(words[start:start + max_words]))
+    return [unit for unit in units if unit]
+
+
+def chunk_text(text: str, chunk_tokens: int = SUMMARY_CHUNK_TOKENS,
+               overlap_tokens: int = SUMMARY_CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """
+    Splits text into chunks of at most `chunk_tokens` (estimated), cut on sentence
+    boundaries. Each chunk repeats up to `overlap_tokens` of the previous chunk's
+    trailing sentences so context isn't lost at the seams.
+    """
+    max_words = max(1, int(chunk_tokens / TOKENS_PER_WORD))
+    overlap_words = max(0, int(overlap_tokens / TOKENS_PER_WORD))
+    chunks: List[str] = []
+    current: List[str] = []
+    current_words = 0
+    for unit in _split_units(text, max_words):
+        unit_words = len(unit.split())
+        if current and current_words + unit_words > max_words:
+            chunks.append(" ".join(current))
+            # Carry trailing sentences forward as overlap.
+            carried: List[str] = []
+            carried_words = 0
+            for previous in reversed(current):
+                previous_words = len(previous.split())
+                if carried_words + previous_words > overlap_words or carried_words + previous_words + unit_words > max_words:
+                    break
+                carried.insert(0, previous)
+                carried_words += previous_words
+            current, current_words = carried, carried_words
+        current.append(unit)
+        current_words += unit_words
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class SummaryCache:
+    """
+    Content-addressed cache of summaries: small in-memory LRU in front of one JSON file
+    per entry. The files are bounded like the output cache: an LRU over entry count
+    and bytes, with recency mirrored to mtimes so the order survives a restart.
+    Thread-safe; get() and put() are blocking (disk I/O).
+    """
+
+    def __init__(self, root: Path, memory_entries: int, max_entries: int, max_bytes: int):
+        self.root = Path(root)
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._disk: "OrderedDict[str, int]" = OrderedDict()  # key -> file size, oldest first
+        self._disk_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_existing()
+
+    def _load_existing(self) -> None:
+        found = []
+        for path in self.root.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            found.append((st.st_mtime, path.stem, st.st_size))
+        with self._lock:
+            for _, key, size in sorted(found):
+                self._disk[key] = size
+                self._disk_bytes += size
+            self._evict_locked()
+
+    @staticmethod
+    def key(model_id: str, text: str) -> str:
+        return hashlib.sha256(f"{model_id}\0{PEGASUS_MAX_NEW_TOKENS}\0{text}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _remember_locked(self, key: str, summary: str) -> None:
+        self._memory[key] = summary
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _track_locked(self, key: str, size: int) -> None:
+        self._disk_bytes -= self._disk.pop(key, 0)
+        self._disk[key] = size
+        self._disk_bytes += size
+        self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        while self._disk and (len(self._disk) > self.max_entries or self._disk_bytes > self.max_bytes):
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self._memory.pop(key, None)
+            self._path(key).unlink(missing_ok=True)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            summary = self._memory.get(key)
+            if summary is not None:
+                self._memory.move_to_end(key)
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                self.hits += 1
+                return summary
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                summary = json.load(f)["summary"]
+            os.utime(path)  # Persist recency for the next process start.
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            try:
+                # Under the lock: the entry may have been evicted since it was read, and
+                # must not be tracked again once its file is gone.
+                size = path.stat().st_size
+            except OSError:
+                return summary
+            self._remember_locked(key, summary)
+            self._track_locked(key, size)  # Also counts files written by another process
+        return summary
+
+    def put(self, key: str, summary: str) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary}, f)
+        size = tmp_path.stat().st_size
+        with self._lock:
+            os.replace(tmp_path, path)  # Under the lock, so eviction never races the rename
+            self._remember_locked(key, summary)
+            self._track_locked(key, size)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+summary_cache = SummaryCache(SUMMARY_CACHE_DIR, SUMMARY_CACHE_MEMORY_ENTRIES, SUMMARY_CACHE_MAX_ENTRIES,
+                             SUMMARY_CACHE_MAX_BYTES)
+
+
+def _summary_model_id() -> str:
+    return "fake" if USE_FAKE_MODELS else PEGASUS_MODEL_ID
+
+
+async def _summarize_cached(text: str, semaphore: asyncio.Semaphore) -> Tuple[str, bool]:
+    """Returns (summary, served_from_cache)."""
+    key = summary_cache.key(_summary_model_id(), text)
+    cached = await asyncio.to_thread(summary_cache.get, key)
+    if cached is not None:
+        return cached, True
+    async with semaphore:  # Keeps a huge document from flooding the batcher queue
+        summary = await summary_batcher.submit(text)
+    await asyncio.to_thread(summary_cache.put, key, summary)
+    return summary, False
+
+
+def _group_for_reduce(summaries: List[str], chunk_tokens: int) -> List[str]:
+    groups: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for summary in summaries:
+        tokens = estimate_tokens(summary)
+        if current and current_tokens + tokens > chunk_tokens:
+            groups.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(summary)
+        current_tokens += tokens
+    if current:
+        groups.append("\n".join(current))
+    return groups
+
+
+async def summarize_document(text: str, chunk_tokens: int = SUMMARY_CHUNK_TOKENS,
+                             overlap_tokens: int = SUMMARY_CHUNK_OVERLAP_TOKENS) -> AsyncIterator[dict]:
+    """
+    Map-reduce summarization of an arbitrarily long text, yielding progress events:
+
+        {"event": "chunked", "chunks": n, "estimated_tokens": t}
+        {"event": "chunk", "level": 0, "index": i, "cached": bool, "summary": "..."}   (per chunk, as finished)
+        {"event": "level", "level": k, "inputs": n}                                     (per reduce level)
+        {"event": "done", "summary": "...", "chunks": n, "levels": k, "cached_chunks": c}
+    """
+    chunks = chunk_text(text, chunk_tokens, overlap_tokens)
+    yield {"event": "chunked", "chunks": len(chunks), "estimated_tokens": estimate_tokens(text)}
+    if not chunks:
+        yield {"event": "done", "summary": "", "chunks": 0, "levels": 0, "cached_chunks": 0}
+        return
+
+    semaphore = asyncio.Semaphore(SUMMARY_MAP_CONCURRENCY)
+    summaries: List[Optional[str]] = [None] * len(chunks)
+    cached_chunks = 0
+
+    async def _map_one(index: int, chunk: str) -> Tuple[int, str, bool]:
+        summary, cached = await _summarize_cached(chunk, semaphore)
+        return index, summary, cached
+
+    for finished in asyncio.as_completed([_map_one(i, c) for i, c in enumerate(chunks)]):
+        index, summary, cached = await finished
+        summaries[index] = summary
+        cached_chunks += cached
+        yield {"event": "chunk", "level": 0, "index": index, "cached": cached, "summary": summary}
+
+    level = 0
+    current: List[str] = summaries  # type: ignore[assignment]
+    while len(current) > 1 and level < SUMMARY_MAX_REDUCE_LEVELS:
+        level += 1
+        groups = _group_for_reduce(current, chunk_tokens)
+        yield {"event": "level", "level": level, "inputs": len(groups)}
+        results = await asyncio.gather(*[_summarize_cached(group, semaphore) for group in groups])
+        current = [summary for summary, _ in results]
+    final_summary = "\n".join(current)
+
+    yield {"event": "done", "summary": final_summary, "chunks": len(chunks), "levels": level,
+           "cached_chunks": cached_chunks}
@@ -0,0 +1,111 @@
+# app/services/table_description.py
+
+import asyncio
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.models.fake_model import FakeModel, USE_FAKE_MODELS
+from app.models.registry import model_registry
+from app.services.batching import MicroBatcher, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS
+from app.services.format_executor import format_executor
+from app.services.table_ingest import profile_table
+
+# Table description: a streamed statistical profile of the whole table (see
+# table_ingest) plus TAPAS answers to questions about it. TAPAS only ever sees a small
+# table: the full table when it fits, otherwise a random row sample or a one-row-per-
+# column aggregate of the profile. Its input window is 512 tokens, so anything larger
+# would be truncated anyway.
+
+TABLE_MAX_BATCH_SIZE = int(os.getenv("DOCUMORPH_TABLE_MAX_BATCH_SIZE", str(DEFAULT_MAX_BATCH_SIZE)))
+TABLE_MAX_WAIT_MS = float(os.getenv("DOCUMORPH_TABLE_MAX_WAIT_MS", str(DEFAULT_MAX_WAIT_MS)))
+TABLE_MODEL_MAX_COLUMNS = int(os.getenv("DOCUMORPH_TABLE_MODEL_MAX_COLUMNS", "32"))
+TABLE_MODEL_MAX_CELL_CHARS = 64
+TABLE_VIEWS = ("auto", "sample", "aggregate")
+TABLE_DESCRIBE_MAX_COLUMNS = 20  # Columns mentioned in the generated description
+
+
+def _load_tapas():
+    if USE_FAKE_MODELS:
+        return FakeModel("tapas")
+    from app.models.tapas_model import TapasModel
+    return TapasModel()
+
+
+model_registry.register("tapas", _load_tapas, estimated_mb=450)
+table_batcher = MicroBatcher(
+    "tapas", lambda: model_registry.get("tapas"), max_batch_size=TABLE_MAX_BATCH_SIZE, max_wait_ms=TABLE_MAX_WAIT_MS
+)
+
+
+def _cell(value) -> str:
+    text = "" if value is None else str(value)
+    return text[:TABLE_MODEL_MAX_CELL_CHARS]
+
+
+def model_view(profile: dict, view: str = "auto") -> Tuple[dict, str]:
+    """
+    Returns (table, view name) to hand to TAPAS. The table is a dict of column name ->
+    list of cells. "auto" uses the rows themselves when the whole table was kept and the
+    per-column aggregate when only a sample was.
+    """
+    if view == "auto":
+        view = "aggregate" if profile["sampled"] else "sample"
+    if view == "aggregate":
+        table = {name: [] for name in ("column", "type", "non_null", "null_rate", "min", "max", "mean", "most_common")}
+        for column in profile["columns"]:
+            numeric = column.get("numeric", {})
+            top = column["top_values"]
+            for key, value in (
+                ("column", column["name"]), ("type", column["type"]), ("non_null", column["non_null"]),
+                ("null_rate", column["null_rate"]), ("min", numeric.get("min")), ("max", numeric.get("max")),
+                ("mean", numeric.get("mean")), ("most_common", top[0]["value"] if top else None),
+            ):
+                table[key].append(_cell(value))
+        return table, view
+
+    names = profile["sample"]["columns"][:TABLE_MODEL_MAX_COLUMNS]
+    rows = profile["sample"]["rows"]
+    return {name: [_cell(row[j]) for row in rows] for j, name in enumerate(names)}, "sample"
+
+
+def describe_profile(profile: dict) -> str:
+    """Plain-English description of the table, built from the profile (no model needed)."""
+    sentences = [f"The table has {profile['rows']:,} rows and {profile['column_count']} columns."]
+    for column in profile["columns"][:TABLE_DESCRIBE_MAX_COLUMNS]:
+        name, kind = column["name"], column["type"]
+        missing = f", {column['null_rate']:.1%} missing" if column["null_rate"] else ""
+        if kind == "empty":
+            sentences.append(f"Column '{name}' is empty.")
+        elif "numeric" in column and kind != "mixed":
+            numeric = column["numeric"]
+            sentences.append(
+                f"Column '{name}' is {kind}, from {numeric['min']} to {numeric['max']} "
+                f"(mean {numeric['mean']:.4g}{missing})."
+            )
+        else:
+            top = ", ".join(f"{v['value']} ({v['count']:,})" for v in column["top_values"][:3])
+            distinct = f"{column['distinct']:,} distinct values" if column["distinct"] is not None else "many distinct values"
+            sentences.append(f"Column '{name}' is {kind} with {distinct}{missing}; most common: {top}.")
+    hidden = profile["column_count"] - TABLE_DESCRIBE_MAX_COLUMNS
+    if hidden > 0:
+        sentences.append(f"{hidden} more columns are not described.")
+    return " ".join(sentences)
+
+
+async def describe_table(path: Path, questions: Optional[List[str]] = None, view: str = "auto",
+                         sheet: Optional[str] = None, suffix: Optional[str] = None) -> dict:
+    """
+    Profiles the table in the worker pool, describes it, and answers `questions` with TAPAS.
+    `suffix` is the original filename's extension when `path` is a stored upload blob.
+    """
+    profile = await format_executor.run(profile_table, str(path), sheet, suffix)
+    result = {"description": describe_profile(profile), "profile": profile}
+    questions = [q.strip() for q in (questions or []) if q and q.strip()]
+    if questions:
+        table, used_view = model_view(profile, view)
+        # Same table object for every question, so TAPAS encodes it once per batch.
+        answers = await asyncio.gather(*(table_batcher.submit((table, q)) for q in questions))
+        result["answers"] = [{"question": q, "answer": a} for q, a in zip(questions, answers)]
+        result["model_view"] = used_view
+    return result
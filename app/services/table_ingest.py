@@ -0,0 +1,463 @@
+# app/services/table_ingest.py
+
+import csv
+import itertools
+import os
+import time
+import zipfile
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Streaming, columnar table ingestion.
+# CSV/TSV/XLSX tables are read in blocks of rows and every block is turned into one
+# NumPy array per column, so per-column statistics (types, null rates, min/max, top
+# values, histograms) are computed with vectorized operations in a single pass. Only
+# fixed-size state is kept between blocks: running moments, a histogram, a bounded set
+# of heavy hitters and a random row sample. Memory therefore stays flat no matter how
+# many rows the table has.
+#
+# CSV parsing uses pyarrow when it is installed (multi-threaded, C++) and the stdlib
+# csv module otherwise. XLSX needs openpyxl (read-only, streaming mode).
+
+TABLE_BLOCK_ROWS = int(os.getenv("DOCUMORPH_TABLE_BLOCK_ROWS", "65536"))
+TABLE_ARROW_BLOCK_BYTES = int(os.getenv("DOCUMORPH_TABLE_ARROW_BLOCK_BYTES", str(4 * 1024 * 1024)))
+TABLE_SAMPLE_ROWS = int(os.getenv("DOCUMORPH_TABLE_SAMPLE_ROWS", "64"))  # Rows kept for the model view
+TABLE_TOP_K = 10
+TABLE_HEAVY_HITTERS = 1000  # Distinct values tracked per column for top-k; beyond this counts are approximate
+TABLE_HISTOGRAM_BINS = 32  # Must be even (bins are merged pairwise when the range grows)
+
+TABLE_EXTENSIONS = (".csv", ".tsv", ".txt", ".xlsx", ".xlsm")
+NULL_TOKENS = ("", "na", "n/a", "nan", "null", "none", "-", "#n/a")
+
+_STRING_DTYPE = np.dtypes.StringDType()
+_NULL_TOKENS_ARRAY = np.array(NULL_TOKENS, dtype=_STRING_DTYPE)
+_NULL_TOKEN_MAX_CHARS = max(len(token) for token in NULL_TOKENS)
+_EMPTY_NUMBERS = np.empty(0, dtype=np.float64)
+_EMPTY_TEXT = np.empty(0, dtype=_STRING_DTYPE)
+_ZIP_MAGIC = b"PK\x03\x04"
+
+
+class UnsupportedTableFormat(ValueError):
+    """Raised for files that are not a CSV/TSV or XLSX table."""
+
+
+# A block is (number of rows, one array per column). Every column array is either
+# float64 (numbers, NaN for missing cells) or StringDType (raw cell text).
+_Block = Tuple[int, List[np.ndarray]]
+
+
+# --- Readers ---
+
+def _unique_column_names(header: List[str]) -> List[str]:
+    names, seen = [], set()
+    for index, raw in enumerate(header):
+        name = (str(raw).strip() if raw is not None else "") or f"column_{index + 1}"
+        candidate, suffix = name, 2
+        while candidate in seen:
+            candidate, suffix = f"{name}_{suffix}", suffix + 1
+        seen.add(candidate)
+        names.append(candidate)
+    return names
+
+
+def _read_csv_header(path: Path, delimiter: str) -> List[str]:
+    with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+        return next(csv.reader(f, delimiter=delimiter), [])
+
+
+def _iter_csv_blocks_arrow(path: Path, names: List[str], delimiter: str) -> Iterator[_Block]:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+
+    # Every column is read as text and typed per block here: Arrow fixes a column's
+    # type from the first block and fails on a later block that disagrees with it.
+    null_values = sorted({v for token in NULL_TOKENS for v in (token, token.upper(), token.title())})
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(column_names=names, skip_rows=1, block_size=TABLE_ARROW_BLOCK_BYTES),
+        parse_options=pacsv.ParseOptions(delimiter=delimiter, invalid_row_handler=lambda row: "skip"),
+        convert_options=pacsv.ConvertOptions(
+            column_types={name: pa.string() for name in names},
+            null_values=null_values, strings_can_be_null=True,
+        ),
+    )
+    text_columns = set()  # Columns that failed to cast once are not tried again
+    for batch in reader:
+        columns = []
+        for index, column in enumerate(batch.columns):
+            if index not in text_columns:
+                try:
+                    columns.append(pc.cast(column, pa.float64()).to_numpy(zero_copy_only=False))
+                    continue
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                    text_columns.add(index)
+            text = pc.fill_null(column, "").to_numpy(zero_copy_only=False)
+            columns.append(text.astype(_STRING_DTYPE))
+        yield batch.num_rows, columns
+
+
+def _iter_csv_blocks_stdlib(path: Path, names: List[str], delimiter: str, block_rows: int) -> Iterator[_Block]:
+    width = len(names)
+    with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+        rows = csv.reader(f, delimiter=delimiter)
+        next(rows, None)  # Header
+        while True:
+            block = list(itertools.islice(rows, block_rows))
+            if not block:
+                return
+            # Ragged rows are padded or cut to the header's width.
+            block = [row[:width] if len(row) >= width else row + [""] * (width - len(row)) for row in block]
+            matrix = np.array(block, dtype=_STRING_DTYPE).reshape(len(block), width)
+            yield len(block), [matrix[:, j] for j in range(width)]
+
+
+def _iter_xlsx_blocks(path: Path, sheet: Optional[str], block_rows: int) -> Tuple[List[str], Iterator[_Block]]:
+    from openpyxl import load_workbook
+
+    # Opened from a file object: openpyxl refuses paths without an .xlsx-like extension,
+    # and stored uploads have none.
+    handle = open(path, "rb")
+    try:
+        workbook = load_workbook(handle, read_only=True, data_only=True)
+    except zipfile.BadZipFile:
+        handle.close()
+        raise UnsupportedTableFormat("The file is not a valid XLSX workbook.")
+    except BaseException:
+        handle.close()
+        raise
+    if sheet and sheet not in workbook.sheetnames:
+        workbook.close()
+        handle.close()
+        raise UnsupportedTableFormat(f"Worksheet '{sheet}' not found. Available: {', '.join(workbook.sheetnames)}.")
+    worksheet = workbook[sheet] if sheet else workbook.active
+    rows = worksheet.iter_rows(values_only=True)
+    names = _unique_column_names(list(next(rows, ())))
+    width = len(names)
+
+    def blocks() -> Iterator[_Block]:
+        try:
+            while True:
+                block = list(itertools.islice(rows, block_rows))
+                if not block:
+                    return
+                columns = []
+                for j in range(width):
+                    values = [row[j] if j < len(row) else None for row in block]
+                    try:  # Numeric cells (and empty ones, as NaN) convert in one step
+                        columns.append(np.array(values, dtype=object).astype(np.float64))
+                    except (TypeError, ValueError):
+                        columns.append(np.array(["" if v is None else str(v) for v in values], dtype=_STRING_DTYPE))
+                yield len(block), columns
+        finally:
+            workbook.close()  # Read-only workbooks keep the file open until closed
+            handle.close()
+
+    return names, blocks()
+
+
+def _sniff_suffix(path: Path) -> str:
+    """Guesses the table type of a file without a usable extension (e.g. an upload blob)."""
+    with open(path, "rb") as f:
+        head = f.read(64 * 1024)
+    if head.startswith(_ZIP_MAGIC):
+        return ".xlsx"  # XLSX/XLSM are zip packages; openpyxl rejects anything else
+    first_line = head.split(b"\n", 1)[0]
+    return ".tsv" if first_line.count(b"\t") > first_line.count(b",") else ".csv"
+
+
+def open_table(path: Path, sheet: Optional[str] = None, block_rows: int = TABLE_BLOCK_ROWS,
+               suffix: Optional[str] = None) -> Tuple[List[str], Iterator[_Block], str]:
+    """
+    Returns (column names, block iterator, reader name) for a CSV/TSV or XLSX file.
+
+    The type comes from `suffix` (the original filename's extension, for stored uploads
+    whose blob path has none), then from the path, then from the file's first bytes.
+    """
+    path = Path(path)
+    suffix = (suffix or path.suffix).lower()
+    if not suffix:
+        suffix = _sniff_suffix(path)
+    if suffix not in TABLE_EXTENSIONS:
+        raise UnsupportedTableFormat(f"Unsupported table type '{suffix}'. Expected one of: {', '.join(TABLE_EXTENSIONS)}.")
+    if suffix in (".xlsx", ".xlsm"):
+        names, blocks = _iter_xlsx_blocks(path, sheet, block_rows)
+        return names, blocks, "openpyxl"
+
+    delimiter = "\t" if suffix == ".tsv" else ","
+    names = _unique_column_names(_read_csv_header(path, delimiter))
+    try:
+        import pyarrow.csv  # noqa: F401
+    except ImportError:
+        return names, _iter_csv_blocks_stdlib(path, names, delimiter, block_rows), "csv"
+    return names, _iter_csv_blocks_arrow(path, names, delimiter), "pyarrow"
+
+
+# --- Per-column accumulators ---
+
+def _split_column(raw: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Splits one block of one column into (finite numbers, non-null text, null count)."""
+    if raw.dtype.kind == "f":
+        finite = np.isfinite(raw)
+        return raw[finite], _EMPTY_TEXT, int(len(raw) - finite.sum())
+    stripped = np.strings.strip(raw)
+    # Null tokens are at most four characters, so only short cells need the case-folded lookup.
+    null = np.strings.str_len(stripped) <= _NULL_TOKEN_MAX_CHARS
+    null[null] = np.isin(np.strings.lower(stripped[null]), _NULL_TOKENS_ARRAY)
+    present = stripped[~null]
+    nulls = int(null.sum())
+    try:  # A text block whose cells all parse as numbers is numeric after all (stdlib reader)
+        numbers = present.astype(np.float64)
+    except ValueError:
+        # Mixed block: split off plain decimals ("-12", "3.5") without a per-cell loop.
+        # Anything fancier ("1e5", "1,000") is counted as text.
+        digits = np.strings.replace(np.strings.lstrip(present, "+-"), ".", "", 1)
+        numeric = np.strings.isdecimal(digits) & (np.strings.str_len(digits) > 0)
+        try:
+            numbers = present[numeric].astype(np.float64)
+        except ValueError:
+            return _EMPTY_NUMBERS, present, nulls
+        return numbers, present[~numeric], nulls
+    finite = np.isfinite(numbers)
+    return numbers[finite], _EMPTY_TEXT, nulls + int(len(numbers) - finite.sum())
+
+
+class _NumericStats:
+    """Count, min/max, mean/std (merged per block) and a histogram whose range grows as needed."""
+
+    def __init__(self, bins: int):
+        self.bins = bins
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.all_integers = True
+        self.hist_low: Optional[float] = None
+        self.hist_width = 0.0
+        self.hist_counts = np.zeros(bins, dtype=np.int64)
+
+    def update(self, values: np.ndarray) -> None:
+        n = len(values)
+        if n == 0:
+            return
+        block_mean = float(values.mean())
+        block_m2 = float(((values - block_mean) ** 2).sum())
+        delta = block_mean - self.mean
+        total = self.count + n
+        # Chan et al. parallel merge of two (count, mean, M2) summaries.
+        self.m2 += block_m2 + delta * delta * self.count * n / total
+        self.mean += delta * n / total
+        self.count = total
+        low, high = float(values.min()), float(values.max())
+        self.min, self.max = min(self.min, low), max(self.max, high)
+        if self.all_integers:
+            self.all_integers = bool(np.all(values == np.floor(values)))
+        self._histogram_add(values, low, high)
+
+    def _histogram_add(self, values: np.ndarray, low: float, high: float) -> None:
+        if self.hist_low is None:
+            span = high - low
+            self.hist_low = low
+            self.hist_width = span / self.bins if span > 0 else max(abs(low), 1.0) / self.bins
+        # Double the bin width (merging neighbouring bins) until the block fits.
+        while low < self.hist_low or high > self.hist_low + self.hist_width * self.bins:
+            merged = self.hist_counts.reshape(-1, 2).sum(axis=1)
+            padding = np.zeros(self.bins // 2, dtype=np.int64)
+            if low < self.hist_low:  # Grow downwards: the old range becomes the upper half
+                self.hist_counts = np.concatenate([padding, merged])
+                self.hist_low -= self.hist_width * self.bins
+            else:
+                self.hist_counts = np.concatenate([merged, padding])
+            self.hist_width *= 2
+        index = ((values - self.hist_low) / self.hist_width).astype(np.int64)
+        np.clip(index, 0, self.bins - 1, out=index)
+        self.hist_counts += np.bincount(index, minlength=self.bins)
+
+    def histogram(self) -> dict:
+        # Report only the occupied range; the grown range can be mostly empty.
+        occupied = np.nonzero(self.hist_counts)[0]
+        first, last = int(occupied[0]), int(occupied[-1]) + 1
+        edges = self.hist_low + self.hist_width * np.arange(first, last + 1)
+        return {"edges": [round(float(e), 6) for e in edges], "counts": self.hist_counts[first:last].tolist()}
+
+
+class _HeavyHitters:
+    """Counts of the most frequent values, merged block by block with vectorized unique/bincount."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.keys: Optional[np.ndarray] = None
+        self.counts: Optional[np.ndarray] = None
+        self.exact = True  # False once rare values had to be dropped
+
+    def update(self, values: np.ndarray) -> None:
+        if len(values) == 0:
+            return
+        keys, counts = np.unique(values, return_counts=True)
+        if self.keys is not None:
+            keys, inverse = np.unique(np.concatenate([self.keys, keys]), return_inverse=True)
+            counts = np.bincount(inverse, weights=np.concatenate([self.counts, counts])).astype(np.int64)
+        if len(keys) > self.capacity:
+            keep = np.argpartition(counts, -self.capacity)[-self.capacity:]
+            keys, counts = keys[keep], counts[keep]
+            self.exact = False
+        self.keys, self.counts = keys, counts
+
+    def top(self, k: int) -> List[Tuple[object, int]]:
+        if self.keys is None:
+            return []
+        order = np.argsort(-self.counts, kind="stable")[:k]
+        return list(zip(self.keys[order].tolist(), self.counts[order].tolist()))
+
+    def distinct(self) -> int:
+        return 0 if self.keys is None else len(self.keys)
+
+
+class ColumnProfile:
+    def __init__(self, name: str):
+        self.name = name
+        self.nulls = 0
+        self.numbers = _NumericStats(TABLE_HISTOGRAM_BINS)
+        self.numeric_values = _HeavyHitters(TABLE_HEAVY_HITTERS)
+        self.text_values = _HeavyHitters(TABLE_HEAVY_HITTERS)
+        self.text_count = 0
+        self.text_min_length: Optional[int] = None
+        self.text_max_length = 0
+
+    def update(self, raw: np.ndarray) -> None:
+        numbers, text, nulls = _split_column(raw)
+        self.nulls += nulls
+        if len(numbers):
+            self.numbers.update(numbers)
+            self.numeric_values.update(numbers)
+        if len(text):
+            self.text_count += len(text)
+            lengths = np.strings.str_len(text)
+            low = int(lengths.min())
+            self.text_min_length = low if self.text_min_length is None else min(self.text_min_length, low)
+            self.text_max_length = max(self.text_max_length, int(lengths.max()))
+            self.text_values.update(text)
+
+    def inferred_type(self) -> str:
+        if self.numbers.count and self.text_count:
+            return "mixed"
+        if self.numbers.count:
+            return "integer" if self.numbers.all_integers else "float"
+        return "text" if self.text_count else "empty"
+
+    def to_dict(self, rows: int) -> dict:
+        top = [(_format_number(v), c) for v, c in self.numeric_values.top(TABLE_TOP_K)]
+        top += [(v, c) for v, c in self.text_values.top(TABLE_TOP_K)]
+        top.sort(key=lambda pair: -pair[1])
+        exact = self.numeric_values.exact and self.text_values.exact
+        result = {
+            "name": self.name,
+            "type": self.inferred_type(),
+            "non_null": rows - self.nulls,
+            "null_rate": round(self.nulls / rows, 4) if rows else 0.0,
+            "distinct": self.numeric_values.distinct() + self.text_values.distinct() if exact else None,
+            "top_values": [{"value": v, "count": c} for v, c in top[:TABLE_TOP_K]],
+            "top_values_exact": exact,
+        }
+        if self.numbers.count:
+            result["numeric"] = {
+                "count": self.numbers.count,
+                "min": _format_number(self.numbers.min),
+                "max": _format_number(self.numbers.max),
+                "mean": round(self.numbers.mean, 6),
+                "std": round(float(np.sqrt(self.numbers.m2 / self.numbers.count)), 6),
+                "histogram": self.numbers.histogram(),
+            }
+        if self.text_count:
+            result["text"] = {
+                "count": self.text_count,
+                "min_length": self.text_min_length,
+                "max_length": self.text_max_length,
+            }
+        return result
+
+
+def _format_number(value: float):
+    return int(value) if float(value).is_integer() and abs(value) < 2 ** 53 else float(value)
+
+
+# --- Row sample for the model view ---
+
+class _RowSample:
+    """
+    Uniform sample of `size` rows without replacement: every row gets a random key and
+    the rows with the smallest keys are kept. Blocks are filtered against the current
+    cut-off first, so only a handful of candidate rows per block are ever materialized.
+    """
+
+    def __init__(self, size: int, width: int, seed: int):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.keys = np.empty(0)
+        self.row_ids = np.empty(0, dtype=np.int64)
+        self.cells: List[List[str]] = [[] for _ in range(width)]
+
+    def update(self, first_row: int, columns: List[np.ndarray], rows: int) -> None:
+        keys = self.rng.random(rows)
+        candidates = np.arange(rows)
+        if len(self.keys) >= self.size:
+            candidates = candidates[keys < self.keys.max()]
+        if len(candidates) > self.size:
+            candidates = candidates[np.argpartition(keys[candidates], self.size)[:self.size]]
+        if len(candidates) == 0:
+            return
+        all_keys = np.concatenate([self.keys, keys[candidates]])
+        all_ids = np.concatenate([self.row_ids, first_row + candidates])
+        new_cells = [_cells_as_text(column[candidates]) for column in columns]
+        all_cells = [old + new for old, new in zip(self.cells, new_cells)]
+        keep = np.argsort(all_keys, kind="stable")[:self.size]
+        self.keys, self.row_ids = all_keys[keep], all_ids[keep]
+        self.cells = [[column[i] for i in keep] for column in all_cells]
+
+    def rows_in_table_order(self) -> List[List[str]]:
+        order = np.argsort(self.row_ids)
+        return [[column[i] for column in self.cells] for i in order]
+
+
+def _cells_as_text(values: np.ndarray) -> List[str]:
+    if values.dtype.kind == "f":
+        return ["" if np.isnan(v) else str(_format_number(v)) for v in values.tolist()]
+    return values.tolist()
+
+
+# --- Entry point ---
+
+def profile_table(path: str, sheet: Optional[str] = None, suffix: Optional[str] = None,
+                  block_rows: int = TABLE_BLOCK_ROWS, sample_rows: int = TABLE_SAMPLE_ROWS,
+                  seed: int = 0) -> dict:
+    """
+    Streams the table once and returns its profile: row count, per-column statistics,
+    and up to `sample_rows` rows (all of them, in order, for small tables). Blocking and
+    CPU-bound; runs in a worker (see format_executor).
+    """
+    started = time.perf_counter()
+    names, blocks, reader = open_table(Path(path), sheet=sheet, block_rows=block_rows, suffix=suffix)
+    profiles = [ColumnProfile(name) for name in names]
+    sample = _RowSample(sample_rows, len(names), seed)
+    rows = 0
+    block_count = 0
+    for block_size, columns in blocks:
+        for profile, column in zip(profiles, columns):
+            profile.update(column)
+        sample.update(rows, columns, block_size)
+        rows += block_size
+        block_count += 1
+
+    return {
+        "rows": rows,
+        "column_count": len(names),
+        "columns": [profile.to_dict(rows) for profile in profiles],
+        "sampled": rows > sample_rows,
+        "sample": {"columns": names, "rows": sample.rows_in_table_order()},
+        "reader": reader,
+        "blocks": block_count,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,189 @@
+# app/services/tracing.py
+
+import contextvars
+import os
+import re
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from app.services.logging_setup import get_logger
+from app.services.metrics import (
+    http_request_bytes_total,
+    http_request_duration_seconds,
+    http_requests_in_flight,
+    http_requests_total,
+    http_response_bytes_total,
+    stage_duration_seconds,
+)
+
+# Request metrics and per-stage timing.
+#
+# InstrumentationMiddleware (pure ASGI, no per-request task or body buffering) records
+# latency, status, in-flight requests and body bytes for every route. `stage("name")`
+# times one step of the work (read, build_docx, save, forward, ...) into a histogram.
+#
+# Tracing is off by default. With DOCUMORPH_TRACING=1 every request also collects its
+# stage spans and logs one "request trace" record with the trace id (taken from an
+# incoming W3C `traceparent` header when present) and returns it in `X-Trace-Id`.
+# When tracing is off, a stage costs two perf_counter() calls and a histogram add.
+
+TRACING_ENABLED = os.getenv("DOCUMORPH_TRACING", "").lower() in ("1", "true", "yes")
+UNMATCHED_ROUTE = "unmatched"  # 404s; keeps arbitrary client paths out of the label set
+
+_TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+_current_trace: contextvars.ContextVar[Optional["_Trace"]] = contextvars.ContextVar("documorph_trace", default=None)
+_stage_histograms: Dict[str, object] = {}
+_api_areas: frozenset = frozenset()  # Set at startup by register_api_areas()
+
+logger = get_logger("tracing")
+
+
+class _Trace:
+    __slots__ = ("trace_id", "started", "spans")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, float, bool]] = []  # (stage, offset s, duration s, failed)
+
+
+class stage:
+    """
+    Times a processing stage; usable as `with stage("build_docx"):` around sync or
+    awaited code. The duration goes to documorph_stage_duration_seconds{stage=...}.
+    """
+
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "stage":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        elapsed = time.perf_counter() - self.started
+        histogram = _stage_histograms.get(self.name)
+        if histogram is None:
+            histogram = _stage_histograms.setdefault(self.name, stage_duration_seconds.labels(self.name))
+        histogram.observe(elapsed)
+        if TRACING_ENABLED:
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.spans.append((self.name, self.started - trace.started, elapsed, exc_type is not None))
+        return False
+
+
+def register_api_areas(app, api_prefix: str = "/api/v1") -> frozenset:
+    """
+    Records the API areas (upload, format, ...) that in-flight requests are counted by.
+    Call once at startup, after every router is included: the areas come from the
+    OpenAPI paths, which list every API route with its full prefix however the routers
+    were included, and building that schema is too slow for the request path.
+    """
+    global _api_areas
+    prefix = api_prefix.rstrip("/") + "/"
+    _api_areas = frozenset(
+        path[len(prefix):].split("/", 1)[0] for path in app.openapi().get("paths", {}) if path.startswith(prefix)
+    )
+    return _api_areas
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def _trace_id_from(scope) -> str:
+    for name, value in scope.get("headers", ()):
+        if name == b"traceparent":
+            match = _TRACEPARENT_RE.match(value.decode("latin-1").strip())
+            if match:
+                return match.group(1)
+    return uuid.uuid4().hex
+
+
+class InstrumentationMiddleware:
+    def __init__(self, app, api_prefix: str = "/api/v1"):
+        self.app = app
+        self.api_prefix = api_prefix.rstrip("/") + "/"
+
+    def _area(self, scope) -> str:
+        # In-flight requests are counted per API area (upload, format, ...), which is
+        # known before routing; the exact route template is only known afterwards.
+        # Areas are registered at startup (register_api_areas); anything else is unmatched.
+        path = scope.get("path", "")
+        if path.startswith(self.api_prefix):
+            area = path[len(self.api_prefix):].split("/", 1)[0]
+            return area if area in _api_areas else UNMATCHED_ROUTE
+        return "root"
+
+    def _route_template(self, scope) -> str:
+        route_path = getattr(scope.get("route"), "path", None)
+        if not route_path:
+            return UNMATCHED_ROUTE
+        # Newer FastAPI versions leave the include prefix off the matched route's path.
+        if scope.get("path", "").startswith(self.api_prefix) and not route_path.startswith(self.api_prefix):
+            route_path = self.api_prefix.rstrip("/") + route_path
+        return route_path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        in_flight = http_requests_in_flight.labels(method, self._area(scope))
+        in_flight.inc()
+        started = time.perf_counter()
+        status_code = 500
+        request_bytes = 0
+        response_bytes = 0
+        trace = None
+        token = None
+        if TRACING_ENABLED:
+            trace = _Trace(_trace_id_from(scope))
+            token = _current_trace.set(trace)
+
+        async def counting_receive():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if trace is not None:
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", trace.trace_id.encode("ascii"))]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_flight.dec()
+            route_path = self._route_template(scope)
+            http_requests_total.labels(method, route_path, status_code).inc()
+            http_request_duration_seconds.labels(method, route_path).observe(elapsed)
+            if request_bytes:
+                http_request_bytes_total.labels(route_path).inc(request_bytes)
+            if response_bytes:
+                http_response_bytes_total.labels(route_path).inc(response_bytes)
+            if trace is not None:
+                _current_trace.reset(token)
+                logger.info("request trace", extra={
+                    "trace_id": trace.trace_id, "method": method, "route": route_path, "status": status_code,
+                    "duration_ms": round(elapsed * 1000, 3),
+                    "spans": [
+                        {"stage": name, "start_ms": round(offset * 1000, 3), "duration_ms": round(duration * 1000, 3),
+                         **({"error": True} if failed else {})}
+                        for name, offset, duration, failed in trace.spans
+                    ],
+                })
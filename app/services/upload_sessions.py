@@ -0,0 +1,514 @@
+# app/services/upload_sessions.py
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.services.logging_setup import get_logger
+from app.services.upload_store import (
+    COPY_CHUNK_SIZE, HASH_ALGORITHM, UPLOAD_DIR, StoredUpload, hash_file, upload_store,
+)
+
+# Resumable, chunked uploads (similar to tus).
+# A client creates a session for a file of known size, then PUTs chunks at byte
+# offsets, in any order and in parallel. Each chunk is spooled and hashed first; only
+# once its checksum verifies is it copied with pwrite() into a preallocated file and
+# counted as received. Chunks overlapping received bytes are rejected, so verified
+# data is never overwritten. The client can ask which ranges are still missing and
+# resend only those. Completing
+# the session hashes the assembled file and moves it into the content-addressed
+# upload store in one rename. Sessions that stop making progress are deleted by a
+# periodic sweep.
+#
+# Session state is a small JSON file next to the data file, so an upload survives a
+# server restart. Methods are blocking (disk I/O); call them from a worker thread.
+#
+# Creating a session preallocates its full size on disk before any data arrives, so
+# open sessions are limited in number (overall and per client) and in reserved bytes.
+# The limits are enforced per server process, against the sessions found on disk at
+# startup plus those created since.
+
+UPLOAD_SESSION_DIR = UPLOAD_DIR / "sessions"  # Same filesystem as the blob store, so completion is a rename
+UPLOAD_MAX_BYTES = int(os.getenv("DOCUMORPH_UPLOAD_MAX_BYTES", str(5 * 1024 ** 3)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("DOCUMORPH_UPLOAD_CHUNK_BYTES", str(8 * 1024 * 1024)))  # Suggested to clients
+UPLOAD_MAX_CHUNK_BYTES = int(os.getenv("DOCUMORPH_UPLOAD_MAX_CHUNK_BYTES", str(64 * 1024 * 1024)))
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv("DOCUMORPH_UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600)))
+UPLOAD_SESSION_GC_INTERVAL_SECONDS = int(os.getenv("DOCUMORPH_UPLOAD_SESSION_GC_INTERVAL_SECONDS", "600"))
+UPLOAD_MAX_OPEN_SESSIONS = int(os.getenv("DOCUMORPH_UPLOAD_MAX_OPEN_SESSIONS", "100"))
+UPLOAD_MAX_SESSIONS_PER_CLIENT = int(os.getenv("DOCUMORPH_UPLOAD_MAX_SESSIONS_PER_CLIENT", "5"))
+UPLOAD_MAX_RESERVED_BYTES = int(os.getenv("DOCUMORPH_UPLOAD_MAX_RESERVED_BYTES", str(20 * 1024 ** 3)))
+CHUNK_SPOOL_MEMORY_BYTES = 8 * 1024 * 1024  # Chunks up to this size are verified in memory, larger ones on disk
+
+CHUNK_CHECKSUM_ALGORITHMS = ("sha256", "sha1", "md5")  # Accepted in the Upload-Checksum header
+_SESSION_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+logger = get_logger("services.upload_sessions")
+
+SESSION_STATUS_OPEN = "open"
+SESSION_STATUS_COMPLETING = "completing"
+SESSION_STATUS_COMPLETED = "completed"
+
+
+class UploadSessionError(Exception):
+    """Raised for invalid session operations; carries the HTTP status code to answer with."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class UploadSession:
+    id: str
+    filename: str
+    size: int
+    created_at: float
+    updated_at: float
+    expected_digest: Optional[str] = None  # Whole-file sha256 the client announced, if any
+    client: Optional[str] = None  # Who opened it (the client address), for the per-client limit
+    status: str = SESSION_STATUS_OPEN
+    ranges: List[List[int]] = field(default_factory=list)  # Received [start, end) byte ranges, merged and sorted
+    result: Optional[dict] = None  # Set once completed
+
+    @property
+    def received_bytes(self) -> int:
+        return sum(end - start for start, end in self.ranges)
+
+    def missing_ranges(self) -> List[List[int]]:
+        missing, cursor = [], 0
+        for start, end in self.ranges:
+            if start > cursor:
+                missing.append([cursor, start])
+            cursor = end
+        if cursor < self.size:
+            missing.append([cursor, self.size])
+        return missing
+
+    def to_public_dict(self) -> dict:
+        return {
+            "upload_id": self.id,
+            "filename": self.filename,
+            "size": self.size,
+            "status": self.status,
+            "received_bytes": self.received_bytes,
+            "received_ranges": self.ranges,
+            "missing_ranges": self.missing_ranges(),
+            "expires_at": self.updated_at + UPLOAD_SESSION_TTL_SECONDS,
+            "result": self.result,
+        }
+
+
+def _add_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    merged = []
+    for existing in sorted(ranges + [[start, end]]):
+        if merged and existing[0] <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], existing[1])
+        else:
+            merged.append(list(existing))
+    return merged
+
+
+def _check_no_overlap(ranges: List[List[int]], start: int, end: int, state: str = "already received") -> None:
+    for existing_start, existing_end in ranges:
+        if start < existing_end and existing_start < end:
+            # Verified bytes are never overwritten; the client should send only missing ranges.
+            raise UploadSessionError(
+                f"Bytes {max(start, existing_start)}..{min(end, existing_end) - 1} were {state}; "
+                "send only the missing ranges.", 409
+            )
+
+
+def parse_checksum_header(value: Optional[str]) -> Optional[Tuple[str, bytes]]:
+    """Parses a tus-style `Upload-Checksum: <algorithm> <base64 digest>` header."""
+    if not value:
+        return None
+    try:
+        algorithm, encoded = value.strip().split(" ", 1)
+        digest = base64.b64decode(encoded.strip(), validate=True)
+    except (ValueError, binascii.Error):
+        raise UploadSessionError("Malformed Upload-Checksum header; expected '<algorithm> <base64 digest>'.")
+    algorithm = algorithm.lower()
+    if algorithm not in CHUNK_CHECKSUM_ALGORITHMS:
+        raise UploadSessionError(f"Unsupported checksum algorithm '{algorithm}'. Use one of: {', '.join(CHUNK_CHECKSUM_ALGORITHMS)}.")
+    return algorithm, digest
+
+
+class ChunkWriter:
+    """
+    Receives one chunk at `offset`: spools and hashes it, and only once the checksum
+    verifies (and the range does not overlap bytes already received) copies it into
+    the session's data file with positional writes. A corrupted or conflicting chunk
+    therefore never touches verified data.
+    Obtained from UploadSessionStore.open_chunk(); finish with commit() or abort().
+    """
+
+    def __init__(self, store: "UploadSessionStore", session: UploadSession, offset: int,
+                 checksum: Optional[Tuple[str, bytes]]):
+        self.store = store
+        self.session = session
+        self.offset = offset
+        self.position = offset
+        self.checksum = checksum
+        self.algorithm = checksum[0] if checksum else HASH_ALGORITHM
+        self._hasher = hashlib.new(self.algorithm)
+        # Small chunks stay in memory; larger ones spill to the session directory.
+        self._spool = tempfile.SpooledTemporaryFile(max_size=CHUNK_SPOOL_MEMORY_BYTES,
+                                                    dir=store.data_path(session.id).parent)
+
+    def write(self, data: bytes) -> None:
+        end = self.position + len(data)
+        if end > self.session.size:
+            raise UploadSessionError(
+                f"Chunk at offset {self.offset} runs past the end of the upload ({self.session.size} bytes).", 413
+            )
+        self._spool.write(data)
+        self._hasher.update(data)
+        self.position = end
+
+    def commit(self) -> UploadSession:
+        if self.checksum and self._hasher.digest() != self.checksum[1]:
+            self.close()
+            raise UploadSessionError(f"Checksum mismatch for the chunk at offset {self.offset}.", 460)
+        self.store._reserve(self.session.id, self.offset, self.position)
+        try:
+            self._spool.seek(0)
+            fd = os.open(self.store.data_path(self.session.id), os.O_WRONLY)
+            try:
+                position = self.offset
+                for piece in iter(lambda: self._spool.read(COPY_CHUNK_SIZE), b""):
+                    view = memoryview(piece)
+                    while view:  # pwrite may write less than asked
+                        written = os.pwrite(fd, view, position)
+                        view = view[written:]
+                        position += written
+            finally:
+                os.close(fd)
+            return self.store._mark_received(self.session.id, self.offset, self.position)
+        finally:
+            self.store._unreserve(self.session.id, self.offset, self.position)
+            self.close()
+
+    def abort(self) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._spool.close()
+
+    @property
+    def checksum_header(self) -> str:
+        """The chunk's checksum in Upload-Checksum format, so clients can verify what was stored."""
+        return f"{self.algorithm} {base64.b64encode(self._hasher.digest()).decode('ascii')}"
+
+
+class UploadSessionStore:
+    def __init__(self, root: Path, max_bytes: int, ttl_seconds: int,
+                 max_open_sessions: int = UPLOAD_MAX_OPEN_SESSIONS,
+                 max_sessions_per_client: int = UPLOAD_MAX_SESSIONS_PER_CLIENT,
+                 max_reserved_bytes: int = UPLOAD_MAX_RESERVED_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_open_sessions = max_open_sessions
+        self.max_sessions_per_client = max_sessions_per_client
+        self.max_reserved_bytes = max_reserved_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()  # Guards session metadata (ranges, status), _writing and _open
+        self._writing: Dict[str, List[List[int]]] = {}  # session id -> ranges being copied in right now
+        self._open: Dict[str, Tuple[Optional[str], int]] = {}  # session id -> (client, preallocated bytes)
+        self.completed = 0
+        self.expired = 0
+        self.rejected = 0
+        self._load_open()
+
+    def _load_open(self) -> None:
+        for session_dir in self.root.iterdir():
+            if not session_dir.is_dir() or not _SESSION_ID_RE.match(session_dir.name):
+                continue
+            try:
+                session = self._load(session_dir.name)
+            except (UploadSessionError, OSError, ValueError, TypeError):
+                continue  # Half-created or corrupt; the sweep removes it
+            if session.status != SESSION_STATUS_COMPLETED:
+                self._open[session.id] = (session.client, session.size)
+
+    def _admit_locked(self, client: Optional[str], size: int) -> None:
+        # Caller must hold self._lock.
+        if len(self._open) >= self.max_open_sessions:
+            self.rejected += 1
+            raise UploadSessionError("Too many uploads are in progress; try again later.", 429)
+        if client is not None and sum(1 for c, _ in self._open.values() if c == client) >= self.max_sessions_per_client:
+            self.rejected += 1
+            raise UploadSessionError(
+                f"At most {self.max_sessions_per_client} uploads per client may be open at once; "
+                "complete or abort one first.", 429
+            )
+        if sum(reserved for _, reserved in self._open.values()) + size > self.max_reserved_bytes:
+            self.rejected += 1
+            raise UploadSessionError("Not enough upload space is free right now; try again later.", 507)
+
+    # --- Paths and persistence ---
+
+    def _dir(self, session_id: str) -> Path:
+        if not _SESSION_ID_RE.match(session_id):
+            raise UploadSessionError("Upload session not found.", 404)
+        return self.root / session_id
+
+    def data_path(self, session_id: str) -> Path:
+        return self._dir(session_id) / "data"
+
+    def _meta_path(self, session_id: str) -> Path:
+        return self._dir(session_id) / "session.json"
+
+    def _save(self, session: UploadSession) -> None:
+        # Caller must hold self._lock. Atomic, so a crash never leaves half a session file.
+        meta_path = self._meta_path(session.id)
+        fd, tmp_name = tempfile.mkstemp(dir=meta_path.parent, prefix="session-", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(asdict(session), f)
+            os.replace(tmp_name, meta_path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def _load(self, session_id: str) -> UploadSession:
+        try:
+            with open(self._meta_path(session_id), "r", encoding="utf-8") as f:
+                return UploadSession(**json.load(f))
+        except FileNotFoundError:
+            raise UploadSessionError("Upload session not found.", 404)
+
+    # --- Public API ---
+
+    def create(self, filename: str, size: int, expected_digest: Optional[str] = None,
+               client: Optional[str] = None) -> UploadSession:
+        if size <= 0:
+            raise UploadSessionError("Upload size must be a positive number of bytes.")
+        if size > self.max_bytes:
+            raise UploadSessionError(f"Upload is larger than the {self.max_bytes} byte limit.", 413)
+        now = time.time()
+        session = UploadSession(
+            id=uuid.uuid4().hex, filename=filename, size=size, created_at=now, updated_at=now,
+            expected_digest=expected_digest.lower() if expected_digest else None, client=client,
+        )
+        with self._lock:
+            self._admit_locked(client, size)
+            self._open[session.id] = (client, size)  # Counted before the disk space is taken
+        try:
+            session_dir = self._dir(session.id)
+            session_dir.mkdir(parents=True)
+            with open(session_dir / "data", "wb") as f:
+                # Reserve the blocks up front so parallel chunks never fail half-way on a full
+                # disk; where fallocate is missing this is a sparse file of the right size.
+                if hasattr(os, "posix_fallocate"):
+                    try:
+                        os.posix_fallocate(f.fileno(), 0, size)
+                    except OSError:
+                        f.truncate(size)
+                else:
+                    f.truncate(size)
+            with self._lock:
+                self._save(session)
+        except BaseException:
+            with self._lock:
+                self._open.pop(session.id, None)
+            shutil.rmtree(self.root / session.id, ignore_errors=True)
+            raise
+        return session
+
+    def get(self, session_id: str) -> UploadSession:
+        with self._lock:
+            return self._load(session_id)
+
+    def open_chunk(self, session_id: str, offset: int, checksum: Optional[Tuple[str, bytes]]) -> ChunkWriter:
+        session = self.get(session_id)
+        if session.status != SESSION_STATUS_OPEN:
+            raise UploadSessionError(f"Upload session is {session.status}; no more chunks are accepted.", 409)
+        if offset < 0 or offset >= session.size:
+            raise UploadSessionError(f"Offset {offset} is outside the upload (0..{session.size - 1}).", 416)
+        # Checked again on commit, once the chunk's length is known; this saves sending the body.
+        _check_no_overlap(session.ranges, offset, offset + 1)
+        return ChunkWriter(self, session, offset, checksum)
+
+    def _reserve(self, session_id: str, start: int, end: int) -> None:
+        """Claims [start, end) for one writer; fails if any of it is received or being written."""
+        with self._lock:
+            session = self._load(session_id)
+            if session.status != SESSION_STATUS_OPEN:
+                raise UploadSessionError(f"Upload session is {session.status}; the chunk was discarded.", 409)
+            _check_no_overlap(session.ranges, start, end)
+            _check_no_overlap(self._writing.get(session_id, []), start, end, "being written by another request")
+            self._writing.setdefault(session_id, []).append([start, end])
+
+    def _unreserve(self, session_id: str, start: int, end: int) -> None:
+        with self._lock:
+            writing = self._writing.get(session_id, [])
+            if [start, end] in writing:
+                writing.remove([start, end])
+            if not writing:
+                self._writing.pop(session_id, None)
+
+    def _mark_received(self, session_id: str, start: int, end: int) -> UploadSession:
+        with self._lock:
+            session = self._load(session_id)
+            if session.status != SESSION_STATUS_OPEN:
+                raise UploadSessionError(f"Upload session is {session.status}; the chunk was discarded.", 409)
+            if end > start:
+                session.ranges = _add_range(session.ranges, start, end)
+            session.updated_at = time.time()
+            self._save(session)
+            return session
+
+    def complete(self, session_id: str) -> Tuple[UploadSession, StoredUpload]:
+        """Verifies the upload is whole, then moves it into the upload store. Blocking (hashes the file)."""
+        with self._lock:
+            session = self._load(session_id)
+            if session.status == SESSION_STATUS_COMPLETED:  # Retried completion (e.g. the response was lost)
+                digest = session.result["digest"]
+                return session, StoredUpload(
+                    name=session.filename, digest=digest, size_bytes=session.result["size_bytes"],
+                    path=upload_store.blob_path(digest), deduplicated=session.result["deduplicated"],
+                )
+            if session.status != SESSION_STATUS_OPEN:
+                raise UploadSessionError(f"Upload session is already {session.status}.", 409)
+            if session.missing_ranges():
+                raise UploadSessionError(
+                    f"Upload is incomplete: {session.size - session.received_bytes} bytes are missing.", 409
+                )
+            # Chunks that arrive from now on are rejected instead of racing the hash.
+            session.status = SESSION_STATUS_COMPLETING
+            self._save(session)
+
+        data_path = self.data_path(session_id)
+        try:
+            digest = hash_file(data_path)
+        except BaseException:
+            with self._lock:
+                session.status = SESSION_STATUS_OPEN
+                self._save(session)
+            raise
+        if session.expected_digest and digest != session.expected_digest:
+            # Every chunk verified, yet the file does not: there is no telling which part
+            # is wrong, so the session starts over and the client sends the file again.
+            with self._lock:
+                session.status = SESSION_STATUS_OPEN
+                session.ranges = []
+                session.updated_at = time.time()
+                self._save(session)
+            raise UploadSessionError(
+                f"Whole-file {HASH_ALGORITHM} mismatch: expected {session.expected_digest}, got {digest}. "
+                "The received data was discarded; upload the file again.", 460
+            )
+        try:
+            stored = upload_store.put_file(session.filename, data_path, digest)
+        except BaseException:
+            with self._lock:
+                session.status = SESSION_STATUS_OPEN
+                self._save(session)
+            raise
+
+        with self._lock:
+            session.status = SESSION_STATUS_COMPLETED
+            session.updated_at = time.time()
+            session.result = {"digest": stored.digest, "size_bytes": stored.size_bytes,
+                              "deduplicated": stored.deduplicated}
+            self._save(session)  # Kept until the sweep, so a retried completion gets the same answer
+            self._open.pop(session_id, None)  # The data file now belongs to the upload store
+            self.completed += 1
+        return session, stored
+
+    def abort(self, session_id: str) -> None:
+        session_dir = self._dir(session_id)
+        if not session_dir.is_dir():
+            raise UploadSessionError("Upload session not found.", 404)
+        shutil.rmtree(session_dir, ignore_errors=True)
+        with self._lock:
+            self._open.pop(session_id, None)
+
+    def collect_garbage(self, now: Optional[float] = None) -> int:
+        """Deletes sessions without activity for `ttl_seconds`. Returns how many were removed."""
+        now = now or time.time()
+        removed = 0
+        for session_dir in self.root.iterdir():
+            if not session_dir.is_dir() or not _SESSION_ID_RE.match(session_dir.name):
+                continue
+            try:
+                with self._lock:
+                    session = self._load(session_dir.name)
+                last_activity = session.updated_at
+            except (UploadSessionError, OSError, ValueError, TypeError):
+                # Half-created or corrupt session: age it by the directory's mtime.
+                last_activity = session_dir.stat().st_mtime
+            if now - last_activity > self.ttl_seconds:
+                shutil.rmtree(session_dir, ignore_errors=True)
+                with self._lock:
+                    self._open.pop(session_dir.name, None)
+                removed += 1
+        self.expired += removed
+        return removed
+
+    def stats(self) -> dict:
+        open_sessions = sum(1 for p in self.root.iterdir() if p.is_dir() and _SESSION_ID_RE.match(p.name))
+        with self._lock:
+            in_progress = len(self._open)
+            reserved_bytes = sum(reserved for _, reserved in self._open.values())
+        return {
+            "sessions_on_disk": open_sessions,
+            "in_progress": in_progress,
+            "reserved_bytes": reserved_bytes,
+            "max_open_sessions": self.max_open_sessions,
+            "max_sessions_per_client": self.max_sessions_per_client,
+            "max_reserved_bytes": self.max_reserved_bytes,
+            "completed": self.completed,
+            "expired": self.expired,
+            "rejected": self.rejected,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+upload_sessions = UploadSessionStore(UPLOAD_SESSION_DIR, UPLOAD_MAX_BYTES, UPLOAD_SESSION_TTL_SECONDS)
+
+
+# --- Periodic cleanup, started from the app lifespan ---
+
+_gc_task: Optional["asyncio.Task"] = None
+
+
+async def _gc_loop(interval_seconds: float) -> None:
+    while True:
+        try:
+            removed = await asyncio.to_thread(upload_sessions.collect_garbage)
+            if removed:
+                logger.info("Removed %d stale upload session(s).", removed)
+            removed = await asyncio.to_thread(upload_store.collect_garbage)
+            if removed:
+                logger.info("Removed %d unreferenced upload blob(s).", removed)
+        except Exception as e:
+            logger.error("Session cleanup failed: %s", e, exc_info=True)
+        await asyncio.sleep(interval_seconds)
+
+
+def start_session_gc(interval_seconds: float = UPLOAD_SESSION_GC_INTERVAL_SECONDS) -> None:
+    global _gc_task
+    if _gc_task is None or _gc_task.done():
+        _gc_task = asyncio.create_task(_gc_loop(interval_seconds))
+
+
+async def stop_session_gc() -> None:
+    global _gc_task
+    if _gc_task is not None:
+        _gc_task.cancel()
+        await asyncio.gather(_gc_task, return_exceptions=True)
+        _gc_task = None
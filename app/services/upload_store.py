@@ -0,0 +1,248 @@
+# app/services/upload_store.py
+
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Tuple
+
+# Content-addressed store for uploaded documents.
+# Every upload is hashed while it is streamed to disk and stored exactly once
+# per digest under blobs/<first two hex chars>/<digest>. A small SQLite index maps
+# the user-facing filename to the digest and keeps a refcount per digest, so a
+# template uploaded by a hundred users costs one blob on disk.
+#
+# Filenames are a shared namespace: uploading "report.pdf" again rebinds the name to
+# the new content. Requests that must not see such a swap use the digest returned by
+# the upload as their handle (every lookup accepts either). Blobs are never deleted on
+# rebind or release; once unreferenced they are kept for UPLOAD_BLOB_GRACE_SECONDS and
+# then removed by collect_garbage(), so a request that resolved a path just before a
+# rebind can still read it.
+
+UPLOAD_DIR = Path(os.getenv("DOCUMORPH_UPLOAD_DIR", "data/uploads"))
+UPLOAD_BLOB_GRACE_SECONDS = int(os.getenv("DOCUMORPH_UPLOAD_BLOB_GRACE_SECONDS", "3600"))
+HASH_ALGORITHM = "sha256"
+COPY_CHUNK_SIZE = 1024 * 1024  # 1 MiB reads keep memory flat for large scans
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS names (
+    name   TEXT PRIMARY KEY,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    digest      TEXT PRIMARY KEY,
+    size        INTEGER NOT NULL,
+    refcount    INTEGER NOT NULL,
+    released_at REAL  -- When refcount last dropped to zero; NULL while referenced
+);
+CREATE INDEX IF NOT EXISTS blobs_released_idx ON blobs (released_at) WHERE refcount = 0;
+"""
+
+
+def hash_file(path: Path) -> str:
+    """Hex digest of a file on disk, read in fixed-size chunks. Blocking."""
+    hasher = hashlib.new(HASH_ALGORITHM)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+@dataclass
+class StoredUpload:
+    name: str
+    digest: str
+    size_bytes: int
+    path: Path
+    deduplicated: bool  # True if an identical blob already existed on disk
+
+
+class ContentAddressedStore:
+    """
+    Deduplicating blob store with a name -> digest index and per-digest refcounts.
+
+    All methods are blocking (disk I/O) and thread-safe; async routes should call
+    them through `run_in_threadpool` so the event loop is never blocked.
+    """
+
+    def __init__(self, root: Path, blob_grace_seconds: int = UPLOAD_BLOB_GRACE_SECONDS):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.tmp_dir = self.root / "tmp"
+        self.index_path = self.root / "index.sqlite3"
+        self.blob_grace_seconds = blob_grace_seconds
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+        # One row per name and per blob, updated in place: an upload costs a couple of
+        # indexed writes, however many files are stored.
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.index_path), check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    # --- Public API ---
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest
+
+    def put_stream(self, name: str, stream: BinaryIO) -> StoredUpload:
+        """
+        Streams `stream` to a temp file while hashing it, then commits it under `name`.
+        Blocking; run it in a worker thread from async code.
+        """
+        hasher = hashlib.new(HASH_ALGORITHM)
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.tmp_dir, prefix="upload-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = stream.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            return self._commit(name, Path(tmp_name), hasher.hexdigest(), size)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def put_file(self, name: str, path: Path, digest: Optional[str] = None) -> StoredUpload:
+        """
+        Commits an already-assembled file under `name` by moving it into the store.
+        `path` must be on the store's filesystem (e.g. under UPLOAD_DIR). Blocking.
+        """
+        path = Path(path)
+        digest = digest or hash_file(path)
+        return self._commit(name, path, digest, path.stat().st_size)
+
+    def _commit(self, name: str, tmp_path: Path, digest: str, size: int) -> StoredUpload:
+        blob_path = self.blob_path(digest)
+        # Held across the move and the index update, so collect_garbage() never deletes
+        # a blob between "it exists" and "it is referenced".
+        with self._lock:
+            deduplicated = blob_path.is_file()
+            if deduplicated:
+                # Same bytes already stored; drop the new copy instead of writing it twice.
+                tmp_path.unlink(missing_ok=True)
+            else:
+                blob_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, blob_path)  # tmp_dir is on the same filesystem, so this is atomic
+            with self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._bind_locked(name, digest, size)
+
+        return StoredUpload(name=name, digest=digest, size_bytes=size, path=blob_path, deduplicated=deduplicated)
+
+    def _bind_locked(self, name: str, digest: str, size: int) -> None:
+        # Caller must hold self._lock and have a transaction open.
+        row = self._conn.execute("SELECT digest FROM names WHERE name = ?", (name,)).fetchone()
+        previous_digest = row[0] if row else None
+        if previous_digest == digest:
+            return
+        self._conn.execute("INSERT OR REPLACE INTO names (name, digest) VALUES (?, ?)", (name, digest))
+        self._conn.execute(
+            "INSERT INTO blobs (digest, size, refcount) VALUES (?, ?, 1)"
+            " ON CONFLICT (digest) DO UPDATE SET refcount = refcount + 1, released_at = NULL",
+            (digest, size),
+        )
+        if previous_digest is not None:
+            self._decref_locked(previous_digest)
+
+    def _decref_locked(self, digest: str) -> None:
+        # Caller must hold self._lock. The blob itself stays until collect_garbage().
+        self._conn.execute(
+            "UPDATE blobs SET refcount = refcount - 1,"
+            " released_at = CASE WHEN refcount = 1 THEN ? ELSE NULL END WHERE digest = ?",
+            (time.time(), digest),
+        )
+
+    def release(self, name: str) -> bool:
+        """Removes `name` from the index; the blob is deleted by a later sweep once nothing references it."""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute("SELECT digest FROM names WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return False
+            self._conn.execute("DELETE FROM names WHERE name = ?", (name,))
+            self._decref_locked(row[0])
+            return True
+
+    def collect_garbage(self, now: Optional[float] = None) -> int:
+        """Deletes blobs unreferenced for longer than the grace period. Returns how many were removed."""
+        cutoff = (now or time.time()) - self.blob_grace_seconds
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            digests = [row[0] for row in self._conn.execute(
+                "SELECT digest FROM blobs WHERE refcount = 0 AND released_at < ?", (cutoff,)
+            )]
+            for digest in digests:
+                self.blob_path(digest).unlink(missing_ok=True)
+            self._conn.executemany("DELETE FROM blobs WHERE digest = ?", [(d,) for d in digests])
+        return len(digests)
+
+    def lookup(self, handle: str) -> Optional[Tuple[str, Path]]:
+        """
+        Returns (digest, blob path) for a filename or a digest returned by an upload,
+        or None if unknown. Resolve once per request and keep using the pair: a name can
+        be rebound to other content at any time, a digest cannot. A digest stays usable
+        until its blob is collected, even after the name it was uploaded under moved on.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT digest FROM names WHERE name = ?", (handle,)).fetchone()
+            if row is None and _DIGEST_RE.match(handle):
+                row = self._conn.execute("SELECT digest FROM blobs WHERE digest = ?", (handle,)).fetchone()
+        if row is None:
+            return None
+        path = self.blob_path(row[0])
+        return (row[0], path) if path.is_file() else None
+
+    def digest_for(self, name: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT digest FROM names WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def is_referenced(self, digest: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT refcount FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        return bool(row and row[0] > 0)
+
+    def names(self) -> Dict[str, str]:
+        """Snapshot of the name -> digest index."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT name, digest FROM names").fetchall())
+
+    def resolve(self, handle: str) -> Optional[Path]:
+        """Returns the blob path for a filename or digest, or None if unknown."""
+        found = self.lookup(handle)
+        return found[1] if found else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            names = self._conn.execute("SELECT COUNT(*) FROM names").fetchone()[0]
+            blobs, stored_bytes, unreferenced = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(refcount = 0), 0) FROM blobs"
+            ).fetchone()
+        return {
+            "names": names,
+            "blobs": blobs,
+            "stored_bytes": stored_bytes,
+            "unreferenced_blobs": unreferenced,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+upload_store = ContentAddressedStore(UPLOAD_DIR)
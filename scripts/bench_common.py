@@ -0,0 +1,148 @@
+# scripts/bench_common.py
+"""
+Shared helpers for the benchmark scripts: latency percentiles, the result record
+every benchmark produces, JSON baselines and the regression check.
+
+A result is a dict keyed by benchmark name:
+
+    {"format_full_cold": {"unit": "req/s", "throughput": 41.2, "count": 200, "errors": 0,
+                          "p50_ms": 21.0, "p95_ms": 48.3, "p99_ms": 71.9}, ...}
+
+Higher throughput is better; lower percentiles are better.
+"""
+
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE_PATH = PROJECT_ROOT / "scripts" / "baselines" / "bench_suite.json"
+DEFAULT_REGRESSION_THRESHOLD = 0.20  # 20% slower (or less throughput) than the baseline fails
+DEFAULT_MIN_LATENCY_DELTA_MS = 1.0  # Ignore latency changes smaller than this (timer noise)
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+GATED_LATENCY_KEYS = ("p95_ms", "p99_ms")  # p50 is reported but too noisy to gate on
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies_s: List[float], elapsed_s: float, unit: str = "req/s", errors: int = 0,
+              work_per_call: float = 1.0, **extra) -> dict:
+    """
+    Builds a result record. `work_per_call` scales throughput, e.g. megabytes per call
+    for an MB/s figure.
+    """
+    ordered = sorted(latencies_s)
+    record = {
+        "unit": unit,
+        "throughput": round(len(ordered) * work_per_call / elapsed_s, 3) if elapsed_s > 0 else 0.0,
+        "count": len(ordered),
+        "errors": errors,
+    }
+    for key, fraction in zip(LATENCY_KEYS, (0.50, 0.95, 0.99)):
+        record[key] = round(percentile(ordered, fraction) * 1000, 3)
+    record.update(extra)
+    return record
+
+
+def environment_info() -> dict:
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_results(path: Path, benchmarks: Dict[str, dict], config: Optional[dict] = None) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    document = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment_info(),
+        "config": config or {},
+        "benchmarks": benchmarks,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+
+
+def load_benchmarks(path: Path) -> Dict[str, dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["benchmarks"]
+
+
+def missing_benchmarks(current: Dict[str, dict], baseline: Dict[str, dict]) -> List[str]:
+    """Names in the baseline that this run did not produce (skipped, renamed or crashed)."""
+    return sorted(set(baseline) - set(current))
+
+
+def compare(current: Dict[str, dict], baseline: Dict[str, dict],
+            threshold: float = DEFAULT_REGRESSION_THRESHOLD,
+            min_latency_delta_ms: float = DEFAULT_MIN_LATENCY_DELTA_MS,
+            allow_missing: bool = False) -> List[str]:
+    """
+    Returns one message per regression beyond `threshold` (a fraction, 0.2 = 20%).
+    A baseline benchmark missing from `current` counts as one too, unless `allow_missing`.
+    """
+    regressions = []
+    if not allow_missing:
+        regressions += [f"{name}: in the baseline but missing from this run"
+                        for name in missing_benchmarks(current, baseline)]
+    for name, result in sorted(current.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if base["throughput"] > 0:
+            drop = (base["throughput"] - result["throughput"]) / base["throughput"]
+            if drop > threshold:
+                regressions.append(
+                    f"{name}: throughput {result['throughput']} {result['unit']} is {drop:.0%} below "
+                    f"baseline {base['throughput']}"
+                )
+        for key in GATED_LATENCY_KEYS:
+            before, after = base.get(key, 0.0), result.get(key, 0.0)
+            if before > 0 and after - before > min_latency_delta_ms and (after - before) / before > threshold:
+                regressions.append(f"{name}: {key} {after} ms is {(after - before) / before:.0%} above baseline {before} ms")
+        if result.get("errors", 0) > base.get("errors", 0) and result["count"]:
+            error_rate, base_rate = result["errors"] / result["count"], base.get("errors", 0) / max(base["count"], 1)
+            if error_rate - base_rate > threshold / 10:  # Error rates gate at a tenth of the threshold
+                regressions.append(f"{name}: error rate {error_rate:.1%} vs baseline {base_rate:.1%}")
+    return regressions
+
+
+def print_table(benchmarks: Dict[str, dict], baseline: Optional[Dict[str, dict]] = None) -> None:
+    header = f"{'benchmark':<28} {'throughput':>16} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+    if baseline:
+        header += f" {'vs base':>8}"
+    print(header)
+    for name, r in sorted(benchmarks.items()):
+        line = (f"{name:<28} {r['throughput']:>10.1f} {r['unit']:<5} {r['p50_ms']:>9.2f} "
+                f"{r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['errors']:>7}")
+        base = (baseline or {}).get(name)
+        if base and base["throughput"] > 0:
+            line += f" {(r['throughput'] - base['throughput']) / base['throughput']:>+8.0%}"
+        print(line)
+
+
+def use_scratch_dir(prefix: str = "documorph-bench-") -> Path:
+    """
+    Switches to a fresh temporary working directory so the app's relative data paths
+    (data/uploads, caches, job store) start empty and never touch the checkout.
+    Must run before any `app.*` import. The project root is added to sys.path.
+    """
+    if str(PROJECT_ROOT) not in sys.path:
+        sys.path.insert(0, str(PROJECT_ROOT))
+    scratch = Path(tempfile.mkdtemp(prefix=prefix))
+    os.chdir(scratch)
+    return scratch
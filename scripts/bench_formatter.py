@@ -0,0 +1,111 @@
+# scripts/bench_formatter.py
+"""
+Throughput / peak-memory benchmark for the streaming text -> DOCX conversion.
+
+Each input size runs in a fresh subprocess so peak RSS (ru_maxrss) is measured per
+size, not accumulated. Run from the project root:
+
+    python scripts/bench_formatter.py                 # 1 MB, 50 MB, 200 MB
+    python scripts/bench_formatter.py --sizes 1 10 --json bench_formatter.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+# Mixed scripts, XML-special and XML-illegal characters, short and long lines.
+SAMPLE_PARAGRAPH = (
+    "1. INTRODUCTION\n"
+    "The quick brown fox jumps over the lazy dog; Ünïcödé text, 中文段落, "
+    "кириллица and العربية must survive conversion. Equations like a < b & c > d\t(1)\n"
+    "Control characters such as \x07 and \x0b are stripped.\n"
+    "\n"
+)
+
+
+def make_input(path: Path, size_mb: int) -> None:
+    block = SAMPLE_PARAGRAPH * max(1, (1024 * 1024) // len(SAMPLE_PARAGRAPH.encode("utf-8")))
+    encoded = block.encode("utf-8")
+    target = size_mb * 1024 * 1024
+    with open(path, "wb") as f:
+        written = 0
+        while written < target:
+            piece = encoded[:target - written]
+            f.write(piece)
+            written += len(piece)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_worker(input_path: str, output_path: str) -> None:
+    """Child-process entry point: convert once and print a JSON result line."""
+    from app.services.doc_formatter_v1 import build_full_document
+
+    baseline_rss = peak_rss_mb()
+    start = time.perf_counter()
+    build_full_document(input_path, output_path)
+    elapsed = time.perf_counter() - start
+    input_mb = os.path.getsize(input_path) / (1024 * 1024)
+    print(json.dumps({
+        "input_mb": round(input_mb, 2),
+        "output_mb": round(os.path.getsize(output_path) / (1024 * 1024), 2),
+        "seconds": round(elapsed, 3),
+        "mb_per_s": round(input_mb / elapsed, 2) if elapsed else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "baseline_rss_mb": round(baseline_rss, 1),
+    }))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 50, 200], help="Input sizes in MB.")
+    parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file.")
+    parser.add_argument("--worker", nargs=2, metavar=("INPUT", "OUTPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(*args.worker)
+        return 0
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="documorph-bench-") as tmp:
+        for size_mb in args.sizes:
+            input_path = Path(tmp) / f"input_{size_mb}mb.txt"
+            output_path = Path(tmp) / f"output_{size_mb}mb.docx"
+            make_input(input_path, size_mb)
+            proc = subprocess.run(
+                [sys.executable, __file__, "--worker", str(input_path), str(output_path)],
+                capture_output=True, text=True, cwd=PROJECT_ROOT,
+            )
+            if proc.returncode != 0:
+                print(proc.stderr, file=sys.stderr)
+                return proc.returncode
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{result['input_mb']:>8.1f} MB  {result['seconds']:>8.2f} s  "
+                  f"{result['mb_per_s']:>8.2f} MB/s  peak RSS {result['peak_rss_mb']:>7.1f} MB "
+                  f"(baseline {result['baseline_rss_mb']:.1f} MB)")
+            input_path.unlink()
+            output_path.unlink()
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
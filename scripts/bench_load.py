@@ -0,0 +1,171 @@
+# scripts/bench_load.py
+"""
+In-process load generator for the HTTP endpoints. Requests go straight into the ASGI
+app through httpx.ASGITransport (no sockets or server process on our side), so the
+numbers measure the app: routing, multipart parsing, the upload store, the format
+pool and cache, and the shared n8n client.
+
+  upload              POST /api/v1/upload/document/             (new content per request)
+  format_full_cold    POST /api/v1/format/document/  mode=full  (a different document per request)
+  format_full_cached  POST /api/v1/format/document/  mode=full  (same document; cache hits)
+  orchestrate         POST /api/v1/orchestrate/process-document  (against the local n8n stub)
+
+The orchestrate scenario starts scripts/stub_n8n.py in-process, which can add latency,
+errors and hangs (use --n8n-timeout-s below --stub-hang-seconds to exercise timeouts).
+
+    python scripts/bench_load.py --requests 500 --concurrency 32
+    python scripts/bench_load.py --scenarios orchestrate --stub-latency-ms 200 --stub-error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+import bench_common
+from stub_n8n import start_stub_server
+
+SCENARIOS = ("upload", "format_full_cold", "format_full_cached", "orchestrate")
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+
+async def drive(client, send: Callable[[object, int], Awaitable[object]], total: int, concurrency: int) -> dict:
+    """Sends `total` requests from `concurrency` concurrent workers; returns a result record."""
+    counter = itertools.count()
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+
+    async def worker() -> None:
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            started = time.perf_counter()
+            try:
+                status = (await send(client, i)).status_code
+            except Exception as e:  # Transport-level failure; counted, not fatal
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[str(status)] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    errors = sum(count for status, count in statuses.items() if not (status.isdigit() and int(status) < 400))
+    return bench_common.summarize(latencies, elapsed, errors=errors, concurrency=concurrency,
+                                  statuses=dict(sorted(statuses.items())))
+
+
+def _text_document(i: int, size_kb: int) -> bytes:
+    line = f"Document {i}: field office scan transcript, page text and tables.\n".encode("utf-8")
+    return (line * (size_kb * 1024 // len(line) + 1))[:size_kb * 1024]
+
+
+async def _run_scenarios(args) -> Dict[str, dict]:
+    import httpx
+    from app.main import app
+
+    results: Dict[str, dict] = {}
+    upload_payload = bytes(args.upload_kb * 1024)
+    image_payload = PNG_HEADER + bytes(args.upload_kb * 1024)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            if "upload" in args.scenarios:
+                async def send_upload(c, i):
+                    body = i.to_bytes(8, "little") + upload_payload
+                    return await c.post("/api/v1/upload/document/", files={"file": (f"load_{i}.bin", body, "application/octet-stream")})
+                results["upload"] = await drive(client, send_upload, args.requests, args.concurrency)
+
+            if "format_full_cold" in args.scenarios or "format_full_cached" in args.scenarios:
+                # Setup (not timed): one distinct document per formatting request.
+                for i in range(args.requests):
+                    await client.post("/api/v1/upload/document/",
+                                      files={"file": (f"doc_{i}.txt", _text_document(i, args.doc_kb), "text/plain")})
+
+            if "format_full_cold" in args.scenarios:
+                async def send_format_cold(c, i):
+                    return await c.post("/api/v1/format/document/", data={"filename": f"doc_{i}.txt", "mode": "full"})
+                results["format_full_cold"] = await drive(client, send_format_cold, args.requests, args.concurrency)
+
+            if "format_full_cached" in args.scenarios:
+                async def send_format_cached(c, i):
+                    return await c.post("/api/v1/format/document/", data={"filename": "doc_0.txt", "mode": "full"})
+                await send_format_cached(client, 0)  # Fill the cache
+                results["format_full_cached"] = await drive(client, send_format_cached, args.requests, args.concurrency)
+
+            if "orchestrate" in args.scenarios:
+                async def send_orchestrate(c, i):
+                    return await c.post("/api/v1/orchestrate/process-document",
+                                        files={"file": (f"scan_{i}.png", image_payload, "image/png")})
+                results["orchestrate"] = await drive(client, send_orchestrate, args.requests, args.concurrency)
+    return results
+
+
+def run(args) -> Dict[str, dict]:
+    """
+    Starts the n8n stub, points the app at it and runs the selected scenarios. Must be
+    called before anything imports `app.*` (configuration is read at import time) and
+    from a scratch working directory (see bench_common.use_scratch_dir).
+    """
+    stub = None
+    if "orchestrate" in args.scenarios:
+        stub, url = start_stub_server(
+            latency_ms=args.stub_latency_ms, jitter_ms=args.stub_jitter_ms, error_rate=args.stub_error_rate,
+            hang_rate=args.stub_hang_rate, hang_seconds=args.stub_hang_seconds,
+        )
+        os.environ["N8N_PROCESS_DOCUMENT_WEBHOOK_URL_ENV"] = url
+        os.environ["N8N_TOTAL_TIMEOUT_SECONDS"] = str(args.n8n_timeout_s)
+        os.environ["N8N_READ_TIMEOUT_SECONDS"] = str(args.n8n_timeout_s)
+    try:
+        # The app logs to stdout; keep that out of the report unless asked for.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            results = asyncio.run(_run_scenarios(args))
+    finally:
+        if stub is not None:
+            stub.shutdown()
+            stub.server_close()
+    if stub is not None and "orchestrate" in results:
+        results["orchestrate"]["stub_requests"] = stub.config.requests
+    return results
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--upload-kb", type=int, default=256, help="Body size for upload and orchestrate requests.")
+    parser.add_argument("--doc-kb", type=int, default=64, help="Size of each text document formatted.")
+    parser.add_argument("--stub-latency-ms", type=float, default=50.0)
+    parser.add_argument("--stub-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--stub-hang-rate", type=float, default=0.0)
+    parser.add_argument("--stub-hang-seconds", type=float, default=30.0)
+    parser.add_argument("--n8n-timeout-s", type=float, default=10.0, help="Total timeout for each n8n call.")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own request logging.")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file.")
+    args = parser.parse_args()
+    json_path = Path(args.json_path).resolve() if args.json_path else None
+
+    bench_common.use_scratch_dir()
+    results = run(args)
+    bench_common.print_table(results)
+    if json_path:
+        bench_common.write_results(json_path, results, config=vars(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# scripts/bench_micro.py
+"""
+Microbenchmarks for the hot paths behind the upload and format endpoints:
+
+  format_dummy_direct     build_dummy_document() called directly (python-docx cost only)
+  format_dummy_executor   await apply_dummy_formatting() through the format process pool
+  upload_write            upload_store.put_stream() of new content (hash + write + rename), MB/s
+  upload_write_dedup      put_stream() of content already stored (hash only), MB/s
+
+Runs in a scratch directory, so the checkout's data/ is never touched. Run from the
+project root:
+
+    python scripts/bench_micro.py
+    python scripts/bench_micro.py --iterations 200 --upload-mb 32 --json micro.json
+
+`python scripts/bench_suite.py` runs these together with the load tests and checks
+them against a baseline.
+"""
+
+import argparse
+import asyncio
+import io
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+import bench_common
+
+DOCUMENT_TEXT = (
+    "Quarterly report. Revenue grew 12% on strong demand; costs were flat.\n"
+    "Field offices submitted 1,204 scans, 98% legible after OCR.\n\n"
+) * 40
+
+
+def _time_calls(fn, iterations: int, warmup: int) -> tuple:
+    for i in range(warmup):
+        fn(-1 - i)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - call_started)
+    return latencies, time.perf_counter() - started
+
+
+def bench_format_dummy_direct(workdir: Path, iterations: int) -> dict:
+    from app.services.doc_formatter_v1 import build_dummy_document
+
+    source = workdir / "micro_input.txt"
+    source.write_text(DOCUMENT_TEXT, encoding="utf-8")
+    latencies, elapsed = _time_calls(
+        lambda i: build_dummy_document(str(source), str(workdir / f"micro_direct_{i % 8}.docx"), "input.txt"),
+        iterations, warmup=3,
+    )
+    return bench_common.summarize(latencies, elapsed, unit="ops/s")
+
+
+def bench_format_dummy_executor(workdir: Path, iterations: int) -> dict:
+    from app.services.doc_formatter_v1 import apply_dummy_formatting
+    from app.services.format_executor import format_executor
+
+    source = workdir / "micro_input.txt"
+    source.write_text(DOCUMENT_TEXT, encoding="utf-8")
+
+    async def run() -> tuple:
+        format_executor.start()
+        try:
+            for i in range(3):  # Warm-up spawns the workers and imports python-docx in them
+                await apply_dummy_formatting(str(source), str(workdir / f"micro_exec_warm_{i}.docx"), "input.txt")
+            latencies = []
+            started = time.perf_counter()
+            for i in range(iterations):
+                call_started = time.perf_counter()
+                await apply_dummy_formatting(str(source), str(workdir / f"micro_exec_{i % 8}.docx"), "input.txt")
+                latencies.append(time.perf_counter() - call_started)
+            return latencies, time.perf_counter() - started
+        finally:
+            format_executor.shutdown()
+
+    latencies, elapsed = asyncio.run(run())
+    return bench_common.summarize(latencies, elapsed, unit="ops/s")
+
+
+def bench_upload_writes(iterations: int, size_mb: int) -> Dict[str, dict]:
+    from app.services.upload_store import upload_store
+
+    payload = bytearray(b"\x5a" * (size_mb * 1024 * 1024))
+
+    def write_new(i: int) -> None:
+        payload[:8] = (i % 2 ** 63).to_bytes(8, "little", signed=True)  # New digest every call
+        upload_store.put_stream(f"micro_upload_{i}.bin", io.BytesIO(payload))
+        upload_store.release(f"micro_upload_{i}.bin")  # Keep the scratch disk usage flat
+
+    latencies, elapsed = _time_calls(write_new, iterations, warmup=1)
+    results = {"upload_write": bench_common.summarize(latencies, elapsed, unit="MB/s", work_per_call=size_mb)}
+
+    payload[:8] = b"\0" * 8
+    upload_store.put_stream("micro_upload_dedup_seed.bin", io.BytesIO(payload))
+    latencies, elapsed = _time_calls(
+        lambda i: upload_store.put_stream("micro_upload_dedup.bin", io.BytesIO(payload)), iterations, warmup=1
+    )
+    results["upload_write_dedup"] = bench_common.summarize(latencies, elapsed, unit="MB/s", work_per_call=size_mb)
+    return results
+
+
+def run(workdir: Path, iterations: int = 100, upload_iterations: int = 20, upload_mb: int = 16) -> Dict[str, dict]:
+    """Runs every microbenchmark; expects the current directory to be a scratch directory."""
+    results = {
+        "format_dummy_direct": bench_format_dummy_direct(workdir, iterations),
+        "format_dummy_executor": bench_format_dummy_executor(workdir, iterations),
+    }
+    results.update(bench_upload_writes(upload_iterations, upload_mb))
+    return results
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--iterations", type=int, default=100, help="Calls per formatting microbenchmark.")
+    parser.add_argument("--upload-iterations", type=int, default=20, help="Writes per upload microbenchmark.")
+    parser.add_argument("--upload-mb", type=int, default=16, help="Size of each upload write in MB.")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file.")
+    args = parser.parse_args()
+    json_path = Path(args.json_path).resolve() if args.json_path else None
+
+    workdir = bench_common.use_scratch_dir()
+    results = run(workdir, args.iterations, args.upload_iterations, args.upload_mb)
+    bench_common.print_table(results)
+    if json_path:
+        bench_common.write_results(json_path, results, config=vars(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# scripts/bench_startup.py
+"""
+Cold-start benchmark: how long `import app.main` takes and how long a fresh process
+needs to answer its first request.
+
+Every measurement runs in a new interpreter, so nothing is warm. Run from the project root:
+
+    python scripts/bench_startup.py                   # 5 runs each, prints medians
+    python scripts/bench_startup.py --runs 10 --json bench_startup.json --top 15
+
+Time-to-first-request starts a real uvicorn server when uvicorn is installed; otherwise
+it falls back to the in-process ASGI client (import + lifespan + first GET /).
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+_ASGI_FIRST_REQUEST_SNIPPET = """
+import time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+from app.main import app
+with TestClient(app) as client:
+    client.get("/")
+print(time.perf_counter() - start)
+"""
+
+
+def measure_import_seconds() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import app.main"], cwd=PROJECT_ROOT, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def slowest_imports(top: int) -> list:
+    """Top-level modules by cumulative import time, from `python -X importtime`."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                          cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            _, cumulative_us, indent, module = match.groups()
+            rows.append((int(cumulative_us), len(indent), module))
+    shallowest = min((depth for _, depth, _ in rows), default=0)
+    # Children of app.main and the stdlib/3rd-party packages it pulls in directly.
+    rows = [(us, module) for us, depth, module in rows if depth <= shallowest + 2]
+    rows.sort(reverse=True)
+    return [{"module": module, "cumulative_ms": round(us / 1000, 1)} for us, module in rows[:top]]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_first_request_uvicorn(timeout: float = 60.0) -> float:
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"Server did not answer within {timeout} seconds.")
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+def measure_first_request_asgi() -> float:
+    proc = subprocess.run([sys.executable, "-c", _ASGI_FIRST_REQUEST_SNIPPET], cwd=PROJECT_ROOT,
+                          capture_output=True, text=True, check=True)
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="How many of the slowest imports to list.")
+    parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file.")
+    args = parser.parse_args()
+
+    use_uvicorn = importlib.util.find_spec("uvicorn") is not None
+    first_request = measure_first_request_uvicorn if use_uvicorn else measure_first_request_asgi
+
+    import_times = [measure_import_seconds() for _ in range(args.runs)]
+    first_request_times = [first_request() for _ in range(args.runs)]
+
+    results = {
+        "runs": args.runs,
+        "python": sys.version.split()[0],
+        "import_app_main_s": round(statistics.median(import_times), 3),
+        "time_to_first_request_s": round(statistics.median(first_request_times), 3),
+        "first_request_mode": "uvicorn" if use_uvicorn else "asgi",
+        "slowest_imports": slowest_imports(args.top),
+        "env": {k: v for k, v in os.environ.items() if k in ("DOCUMORPH_WARM_MODELS", "DOCUMORPH_PRELOAD_MODELS")},
+    }
+
+    print(f"import app.main (median of {args.runs}):   {results['import_app_main_s'] * 1000:8.1f} ms")
+    print(f"time to first request ({results['first_request_mode']}): {results['time_to_first_request_s'] * 1000:8.1f} ms")
+    print("slowest imports:")
+    for row in results["slowest_imports"]:
+        print(f"  {row['cumulative_ms']:8.1f} ms  {row['module']}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# scripts/bench_suite.py
+"""
+Runs the microbenchmarks (bench_micro.py) and the endpoint load tests (bench_load.py),
+writes the combined results as JSON and compares them with a stored baseline.
+Exits with status 1 when any benchmark regressed by more than --threshold, so it can
+gate a deploy.
+
+Each part runs in its own fresh interpreter and scratch directory. Run from the
+project root:
+
+    python scripts/bench_suite.py --update-baseline          # record a baseline on this machine
+    python scripts/bench_suite.py                            # compare against it (20% threshold)
+    python scripts/bench_suite.py --threshold 0.1 --requests 500 --concurrency 32
+
+Baselines are only comparable on the same hardware; record one per CI runner type.
+With --ci (the default when the CI environment variable is set) a missing baseline, or
+a baseline benchmark this run did not produce, is an error instead of a skipped
+comparison, so a misconfigured gate cannot pass silently. Outside CI, benchmarks left
+out on purpose (--skip-load, --scenarios) are only reported.
+All options of bench_micro.py and bench_load.py are accepted and passed through.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import List
+
+import bench_common
+import bench_load
+import bench_micro
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+
+def _argv_for(parser: argparse.ArgumentParser, namespace: argparse.Namespace) -> List[str]:
+    """Rebuilds command-line arguments for `parser`'s own options from the combined namespace."""
+    argv = []
+    for action in parser._actions:
+        if not action.option_strings or action.dest == "help":
+            continue
+        value = getattr(namespace, action.dest)
+        flag = action.option_strings[0]
+        if isinstance(action, argparse._StoreTrueAction):
+            argv += [flag] if value else []
+        elif isinstance(value, list):
+            argv += [flag, *map(str, value)]
+        elif value is not None:
+            argv += [flag, str(value)]
+    return argv
+
+
+def _run_part(script: str, argv: List[str]) -> dict:
+    with tempfile.TemporaryDirectory(prefix="documorph-bench-results-") as tmp:
+        json_path = Path(tmp) / "results.json"
+        subprocess.run([sys.executable, str(SCRIPTS_DIR / script), *argv, "--json", str(json_path)],
+                       check=True, stdout=subprocess.DEVNULL)
+        return bench_common.load_benchmarks(json_path)
+
+
+def main() -> int:
+    micro_parser = argparse.ArgumentParser(add_help=False)
+    bench_micro.add_arguments(micro_parser)
+    load_parser = argparse.ArgumentParser(add_help=False)
+    bench_load.add_arguments(load_parser)
+
+    parser = argparse.ArgumentParser(description=__doc__, parents=[micro_parser, load_parser],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench_results.json", help="Where to write this run's results.")
+    parser.add_argument("--baseline", default=str(bench_common.DEFAULT_BASELINE_PATH))
+    parser.add_argument("--update-baseline", action="store_true", help="Save this run as the new baseline.")
+    parser.add_argument("--threshold", type=float, default=bench_common.DEFAULT_REGRESSION_THRESHOLD,
+                        help="Allowed regression as a fraction (0.2 = 20%%) of throughput or p95/p99 latency.")
+    parser.add_argument("--min-latency-delta-ms", type=float, default=bench_common.DEFAULT_MIN_LATENCY_DELTA_MS)
+    parser.add_argument("--ci", action="store_true", default=os.getenv("CI", "").lower() in ("1", "true", "yes"),
+                        help="Fail when there is no baseline, or a baseline benchmark did not run (default when $CI is set).")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    args = parser.parse_args()
+
+    results = {}
+    if not args.skip_micro:
+        print("Running microbenchmarks...")
+        results.update(_run_part("bench_micro.py", _argv_for(micro_parser, args)))
+    if not args.skip_load:
+        print("Running endpoint load tests...")
+        results.update(_run_part("bench_load.py", _argv_for(load_parser, args)))
+
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "update_baseline", "ci")}
+    bench_common.write_results(Path(args.output), results, config=config)
+    baseline_path = Path(args.baseline)
+
+    if args.update_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(args.output, baseline_path)
+        bench_common.print_table(results)
+        print(f"Baseline saved to {baseline_path}.")
+        return 0
+    if not baseline_path.is_file():
+        bench_common.print_table(results)
+        if args.ci:
+            print(f"\nERROR: no baseline at {baseline_path}, so nothing was compared.\n"
+                  f"Record one on this runner type with `python scripts/bench_suite.py --update-baseline`"
+                  f" (or pass --baseline PATH) and make it available to CI.", file=sys.stderr)
+            return 2
+        print(f"No baseline at {baseline_path}; run with --update-baseline to record one.")
+        return 0
+
+    try:
+        baseline = bench_common.load_benchmarks(baseline_path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Could not read baseline {baseline_path}: {e}")
+        return 2
+    bench_common.print_table(results, baseline)
+    missing = bench_common.missing_benchmarks(results, baseline)
+    if missing and not args.ci:
+        print(f"\nWARNING: {len(missing)} baseline benchmark(s) did not run and were not compared: "
+              f"{', '.join(missing)}")
+    regressions = bench_common.compare(results, baseline, args.threshold, args.min_latency_delta_ms,
+                                       allow_missing=not args.ci)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for message in regressions:
+            print(f"  - {message}")
+        return 1
+    print(f"\nNo regressions beyond {args.threshold:.0%} (results in {args.output}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+# scripts/stub_n8n.py
+"""
+Local stand-in for the n8n "process document" webhook.
+
+Accepts the same multipart POST the API sends (field `document_file`) and answers with
+a small JSON result after a configurable delay. It can also inject errors and hangs, so
+the orchestrate endpoints, the job queue and the retry logic can be exercised without n8n.
+
+    python scripts/stub_n8n.py --port 5678 --latency-ms 800 --error-rate 0.05
+    export N8N_PROCESS_DOCUMENT_WEBHOOK_URL_ENV=http://127.0.0.1:5678/webhook/process-document
+    uvicorn app.main:app --port 8000
+
+Can also be started in-process (benchmarks): `server, url = start_stub_server(latency_ms=50)`.
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+WEBHOOK_PATH = "/webhook/process-document"
+
+
+class StubConfig:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 500, hang_rate: float = 0.0, hang_seconds: float = 300.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.hang_rate = hang_rate          # Fraction of requests that stall (to trigger client timeouts)
+        self.hang_seconds = hang_seconds
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+
+class StubN8nHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like n8n behind a proxy
+    disable_nagle_algorithm = True  # Headers and body are separate writes; avoid 40 ms delayed-ACK stalls
+    server: "StubN8nServer"
+
+    def do_POST(self):
+        config = self.server.config
+        length = int(self.headers.get("Content-Length", "0"))
+        remaining = length
+        while remaining > 0:  # Drain the body without keeping it
+            chunk = self.rfile.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+
+        with config._lock:
+            config.requests += 1
+        roll = random.random()
+        if roll < config.hang_rate:
+            time.sleep(config.hang_seconds)
+        delay = max(0.0, config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)) / 1000
+        time.sleep(delay)
+
+        if roll < config.hang_rate + config.error_rate and roll >= config.hang_rate:
+            with config._lock:
+                config.errors += 1
+            self._send_json(config.error_status, {"message": "Simulated n8n workflow error"})
+            return
+        self._send_json(200, {
+            "status": "processed",
+            "received_bytes": length,
+            "extracted_text": "Stub OCR text.",
+            "processing_ms": round(delay * 1000, 1),
+        })
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # Quiet; the benchmark prints its own summary
+        pass
+
+
+class StubN8nServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config: StubConfig):
+        super().__init__(address, StubN8nHandler)
+        self.config = config
+
+    def handle_error(self, request, client_address):
+        # Clients that time out and hang up are expected here; don't dump tracebacks.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, **config_kwargs) -> Tuple[StubN8nServer, str]:
+    """Starts the stub in a background thread; returns the server and its webhook URL."""
+    server = StubN8nServer((host, port), StubConfig(**config_kwargs))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}{WEBHOOK_PATH}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5678)
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with --error-status.")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of requests that stall for --hang-seconds.")
+    parser.add_argument("--hang-seconds", type=float, default=300.0)
+    args = parser.parse_args()
+
+    server = StubN8nServer((args.host, args.port), StubConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        error_status=args.error_status, hang_rate=args.hang_rate, hang_seconds=args.hang_seconds,
+    ))
+    print(f"Stub n8n webhook listening on http://{args.host}:{server.server_port}{WEBHOOK_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# tests/conftest.py
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# The services read their configuration (data directories, worker counts, fake models)
+# from the environment when they are imported, so the test environment is set up here,
+# before anything under app/ is imported. Every data directory defaults to a path
+# relative to the working directory, so running from a scratch directory keeps the
+# tests away from a developer's data/.
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+os.environ.setdefault("DOCUMORPH_FAKE_MODELS", "1")
+os.environ.setdefault("DOCUMORPH_FORMAT_WORKERS", "0")  # Threads; spawned workers are slow to start
+os.environ.setdefault("DOCUMORPH_WARM_MODELS", "")
+os.environ.setdefault("DOCUMORPH_LOG_LEVEL", "WARNING")
+os.chdir(tempfile.mkdtemp(prefix="documorph-tests-"))
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app.main import app as fastapi_app
+    return fastapi_app
+
+
+@pytest.fixture
+def client(app):
+    from fastapi.testclient import TestClient
+    with TestClient(app) as test_client:  # Runs the lifespan (pools, HTTP client, job queue)
+        yield test_client
+
+
+@pytest.fixture
+def stub_n8n(monkeypatch):
+    """A local stand-in for the n8n webhook (scripts/stub_n8n.py), wired into the orchestrate routes."""
+    from app.routes import orchestrate_v1
+    from scripts.stub_n8n import start_stub_server
+
+    server, url = start_stub_server()
+    monkeypatch.setattr(orchestrate_v1, "N8N_PROCESS_DOCUMENT_WEBHOOK_URL", url)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def upload(client, filename: str, content: bytes) -> dict:
+    response = client.post("/api/v1/upload/document/", files={"file": (filename, content)})
+    assert response.status_code == 200, response.text
+    return response.json()
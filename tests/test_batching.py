@@ -0,0 +1,105 @@
+# tests/test_batching.py
+
+import asyncio
+
+import pytest
+
+from app.models.fake_model import FakeModel
+from app.services.batching import BatcherOverloaded, MicroBatcher
+
+
+class PickyModel(FakeModel):
+    """Fails any batch that contains the input "poison"."""
+
+    def predict_batch(self, inputs):
+        if "poison" in inputs:
+            raise ValueError("cannot summarize poison")
+        return super().predict_batch(inputs)
+
+
+def _run(batcher: MicroBatcher, coroutine):
+    try:
+        return asyncio.run(coroutine)
+    finally:
+        batcher.stop()
+
+
+def test_concurrent_requests_are_coalesced_into_batches():
+    model = FakeModel("test", per_batch_ms=20)
+    batcher = MicroBatcher("coalesce", lambda: model, max_batch_size=8, max_wait_ms=50)
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.submit(f"item {i}") for i in range(16)))
+
+    outputs = _run(batcher, scenario())
+
+    assert outputs == FakeModel("test").predict_batch([f"item {i}" for i in range(16)])  # In order
+    assert model.calls == 2
+    assert batcher.stats()["batch_size_histogram"] == {8: 2}
+
+
+def test_an_error_only_reaches_the_request_that_caused_it():
+    batcher = MicroBatcher("picky", lambda: PickyModel("picky"), max_batch_size=8, max_wait_ms=50)
+
+    async def scenario():
+        return await asyncio.gather(
+            batcher.submit("fine 1"), batcher.submit("poison"), batcher.submit("fine 2"), return_exceptions=True,
+        )
+
+    fine_1, poisoned, fine_2 = _run(batcher, scenario())
+
+    assert isinstance(poisoned, ValueError)
+    assert fine_1.startswith("picky:") and fine_2.startswith("picky:")
+
+
+def test_a_model_that_fails_to_load_is_loaded_once_per_batch():
+    loads = []
+
+    def broken_loader():
+        loads.append(1)
+        raise ImportError("transformers is not installed")
+
+    batcher = MicroBatcher("broken", broken_loader, max_batch_size=8, max_wait_ms=50)
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.submit(f"item {i}") for i in range(4)), return_exceptions=True)
+
+    errors = _run(batcher, scenario())
+
+    assert all(isinstance(error, ImportError) for error in errors)
+    assert len({id(error) for error in errors}) == 1  # The same load error, not one per item
+    assert len(loads) == 1
+
+
+def test_a_full_queue_is_rejected():
+    started = asyncio.Event()
+    batcher = MicroBatcher("tiny", lambda: FakeModel("tiny", per_batch_ms=200), max_batch_size=1,
+                           max_wait_ms=0, max_queue_size=1)
+
+    async def scenario():
+        first = asyncio.create_task(batcher.submit("running"))
+        await asyncio.sleep(0.05)  # Picked up by the worker thread
+        second = asyncio.create_task(batcher.submit("queued"))
+        await asyncio.sleep(0)
+        with pytest.raises(BatcherOverloaded):
+            await batcher.submit("rejected")
+        return await asyncio.gather(first, second)
+
+    assert len(_run(batcher, scenario())) == 2
+
+
+def test_summaries_of_concurrent_requests_share_forward_passes(client):
+    from app.services.summarization import summary_batcher
+
+    before = summary_batcher.stats()["batches"]
+    texts = [f"Paragraph number {i} of a short report." for i in range(6)]
+
+    async def scenario():
+        from app.services.summarization import summarize_text
+        return await asyncio.gather(*(summarize_text(text) for text in texts))
+
+    # Through the app's own batcher and the fake model (DOCUMORPH_FAKE_MODELS=1).
+    summaries = asyncio.run(scenario())
+
+    assert summaries == FakeModel("pegasus").predict_batch(texts)
+    assert summary_batcher.stats()["batches"] - before < len(texts)
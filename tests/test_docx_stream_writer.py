@@ -0,0 +1,99 @@
+# tests/test_docx_stream_writer.py
+
+import io
+import tracemalloc
+
+from docx import Document
+
+from app.services.docx_stream_writer import DocxStreamWriter, sanitize_xml_text, text_file_to_docx
+
+TEXT = "First paragraph,\nsecond line.\n\nTabbed\tcell and <markup> & \"quotes\".\n\n\n   \nÜnïcødé 日本語 text.\n"
+
+
+def _paragraphs(path):
+    return [(p.style.name, p.text) for p in Document(str(path)).paragraphs]
+
+
+def test_streamed_document_matches_python_docx(tmp_path):
+    # The non-streaming path: the same content built with python-docx's object model.
+    expected = Document()
+    expected.add_heading("Report", level=1)
+    expected.add_paragraph("First paragraph,\nsecond line.")
+    expected.add_paragraph("Tabbed\tcell and <markup> & \"quotes\".")
+    expected.add_paragraph("Ünïcødé 日本語 text.")
+    expected.save(str(tmp_path / "expected.docx"))
+
+    with DocxStreamWriter(tmp_path / "streamed.docx") as writer:
+        writer.write_paragraph("Report", style_id="Heading1")
+        writer.write_text_stream(io.StringIO(TEXT), block_chars=16)  # Blocks split lines and paragraphs
+
+    assert _paragraphs(tmp_path / "streamed.docx") == _paragraphs(tmp_path / "expected.docx")
+    assert writer.paragraphs_written == 4
+    streamed, built = Document(str(tmp_path / "streamed.docx")), Document(str(tmp_path / "expected.docx"))
+    assert streamed.sections[0].page_width == built.sections[0].page_width  # Section properties kept
+
+
+def test_invalid_xml_characters_are_removed():
+    assert sanitize_xml_text("a\x00b\x0bc\x1fd\ud800e\udfffF\ufffeG\uffff") == "abcdeFG"
+    assert sanitize_xml_text("tab\tlf\ncr\r Ünïcødé 日本語 \U0001F600") == "tab\tlf\ncr\r Ünïcødé 日本語 \U0001F600"
+
+
+def test_invalid_characters_never_reach_the_document(tmp_path):
+    with DocxStreamWriter(tmp_path / "out.docx") as writer:
+        writer.write_paragraph("bell\x07 and lone \ud83d surrogate")
+        writer.write_text_stream(io.StringIO("form\x0cfeed\n\nnull\x00byte"))
+
+    assert [text for _, text in _paragraphs(tmp_path / "out.docx")] == [
+        "bell and lone  surrogate", "formfeed", "nullbyte",
+    ]
+
+
+class _GeneratedText(io.TextIOBase):
+    """A large text produced on demand, so the input itself never sits in memory."""
+
+    def __init__(self, paragraphs: int, on_read):
+        self.remaining = paragraphs
+        self.on_read = on_read
+        self.buffer = ""
+
+    def read(self, size=-1):
+        self.on_read(size)
+        while len(self.buffer) < size and self.remaining:
+            self.buffer += f"Paragraph {self.remaining} " + "lorem ipsum dolor sit amet " * 20 + "\n\n"
+            self.remaining -= 1
+        block, self.buffer = self.buffer[:size], self.buffer[size:]
+        return block
+
+
+def test_large_documents_are_streamed(tmp_path):
+    output_path = tmp_path / "large.docx"
+    paragraphs = 40_000  # About 22 MB of text
+    read_sizes, output_sizes = [], []
+
+    def on_read(size):
+        read_sizes.append(size)
+        output_sizes.append(output_path.stat().st_size if output_path.exists() else 0)
+
+    tracemalloc.start()
+    try:
+        with DocxStreamWriter(output_path) as writer:
+            writer.write_text_stream(_GeneratedText(paragraphs, on_read), block_chars=256 * 1024)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert writer.paragraphs_written == paragraphs
+    assert writer.chars_written > 20 * 1024 * 1024
+    assert set(read_sizes) == {256 * 1024}
+    assert output_sizes[len(output_sizes) // 2] > 0  # Written while the input is still being read
+    assert peak < 8 * 1024 * 1024  # Bounded by the block size, not by the document
+    assert len(Document(str(output_path)).paragraphs) == paragraphs
+
+
+def test_text_file_to_docx_replaces_undecodable_bytes(tmp_path):
+    source = tmp_path / "latin1.txt"
+    source.write_bytes("Caf\xe9 ok\n".encode("latin-1"))
+
+    text_file_to_docx(source, tmp_path / "out.docx")
+
+    assert [text for _, text in _paragraphs(tmp_path / "out.docx")] == ["Caf\ufffd ok"]
@@ -0,0 +1,79 @@
+# tests/test_format_executor.py
+
+import asyncio
+import time
+
+import pytest
+
+from app.services.format_executor import FormatExecutor, FormatJobTimeout, FormatUnavailable, FormatWorkerRestarted
+
+
+def _executor(workers: int, job_timeout: float) -> FormatExecutor:
+    return FormatExecutor(workers=workers, queue_size=4, job_timeout=job_timeout, max_jobs_per_worker=0, retry_after=1)
+
+
+async def _wait_for_idle(executor: FormatExecutor, seconds: float = 10.0) -> None:
+    deadline = time.monotonic() + seconds
+    while executor.stats()["in_flight"] and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+
+
+def test_timed_out_worker_is_killed_and_neighbours_fail_retryably():
+    executor = _executor(workers=2, job_timeout=3.0)
+
+    async def scenario():
+        await executor.run(sum, [0])  # Start the workers before timing anything
+        stuck = asyncio.create_task(executor.run(time.sleep, 60))
+        await asyncio.sleep(1.5)
+        neighbour = asyncio.create_task(executor.run(time.sleep, 2))  # Still running when the pool is killed
+        with pytest.raises(FormatJobTimeout):
+            await stuck
+        with pytest.raises(FormatWorkerRestarted) as lost:  # Not rerun with a fresh timeout
+            await neighbour
+        assert isinstance(lost.value, FormatUnavailable) and lost.value.retry_after == 1
+        await _wait_for_idle(executor)
+        return await executor.run(sum, [1, 2])
+
+    try:
+        assert asyncio.run(scenario()) == 3
+        stats = executor.stats()
+        assert stats["in_flight"] == 0
+        assert stats["workers_killed"] == 2
+        assert stats["retried"] == 0 and stats["aborted"] == 1
+    finally:
+        executor.shutdown()
+
+
+def test_timeout_can_be_set_per_job():
+    executor = _executor(workers=0, job_timeout=0.2)
+
+    async def scenario():
+        with pytest.raises(FormatJobTimeout, match="0.2 seconds"):
+            await executor.run(time.sleep, 0.5)
+        await _wait_for_idle(executor)
+        return await executor.run(time.sleep, 0.5, timeout=2.0)  # e.g. a batch of documents
+
+    try:
+        assert asyncio.run(scenario()) is None
+        assert executor.stats()["timed_out"] == 1
+    finally:
+        executor.shutdown()
+
+
+def test_cancelled_job_keeps_its_slot_until_it_finishes():
+    executor = _executor(workers=0, job_timeout=30.0)
+
+    async def scenario():
+        job = asyncio.create_task(executor.run(time.sleep, 0.5))
+        await asyncio.sleep(0.1)
+        job.cancel()
+        await asyncio.gather(job, return_exceptions=True)
+        held = executor.stats()["in_flight"]
+        await _wait_for_idle(executor)
+        return held
+
+    try:
+        assert asyncio.run(scenario()) == 1
+        assert executor.stats()["in_flight"] == 0
+    finally:
+        executor.shutdown()
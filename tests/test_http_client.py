@@ -0,0 +1,49 @@
+# tests/test_http_client.py
+
+import asyncio
+import io
+import socket
+
+import httpx
+import pytest
+
+from app.services.http_client import close_http_client, post_file_with_retries
+from app.services.metrics import n8n_retries_total
+from scripts.stub_n8n import start_stub_server
+
+
+def _post(url: str) -> httpx.Response:
+    async def scenario():
+        try:
+            return await post_file_with_retries(url, "document_file", "scan.png", io.BytesIO(b"\x89PNG"),
+                                                "image/png", max_retries=2, total_timeout=10)
+        finally:
+            await close_http_client()
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("status", [502, 503])
+def test_a_received_request_is_never_sent_again(status):
+    server, url = start_stub_server(error_rate=1.0, error_status=status)
+    try:
+        response = _post(url)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # The workflow may already be running; answering is up to the caller, not a second run.
+    assert response.status_code == status
+    assert server.config.requests == 1
+
+
+def test_connection_failures_are_retried():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]  # Nothing listens here once the socket is closed
+    retries_before = n8n_retries_total.labels().value
+
+    with pytest.raises(httpx.ConnectError):
+        _post(f"http://127.0.0.1:{port}/webhook/process-document")
+
+    assert n8n_retries_total.labels().value - retries_before == 2
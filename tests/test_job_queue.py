@@ -0,0 +1,265 @@
+# tests/test_job_queue.py
+
+import asyncio
+import io
+import json
+import time
+from pathlib import Path
+
+from app.services.job_queue import JobQueue
+from app.services.job_store import (
+    Job, JobStore, JOB_STATUS_FAILED, JOB_STATUS_QUEUED, JOB_STATUS_RUNNING, JOB_STATUS_SUCCEEDED,
+)
+
+
+def _queue(tmp_path, handler, store=None, **kwargs) -> JobQueue:
+    options = dict(workers=4, per_tenant_limit=2, max_pending=100, lease_seconds=30)
+    options.update(kwargs)
+    return JobQueue(store or JobStore(tmp_path / "jobs.sqlite3"), handler, tmp_path / "inputs", **options)
+
+
+async def _wait_until(predicate, seconds: float = 10.0) -> None:
+    deadline = time.monotonic() + seconds
+    while not await predicate():
+        assert time.monotonic() < deadline, "timed out waiting for the job queue"
+        await asyncio.sleep(0.02)
+
+
+def _insert(store: JobStore, job_id: str) -> Job:
+    job = Job(id=job_id, tenant="t", priority=0, status=JOB_STATUS_QUEUED, filename=f"{job_id}.png",
+              content_type="image/png", input_path="/nonexistent", created_at=time.time())
+    store.insert(job)
+    return job
+
+
+def test_a_job_is_claimed_once(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    job = _insert(store, "a")
+    first = store.claim(job.id, "worker-a", lease_seconds=30)
+    second = store.claim(job.id, "worker-b", lease_seconds=30)
+
+    assert first is not None and first.status == JOB_STATUS_RUNNING and first.owner == "worker-a"
+    assert second is None
+    assert store.requeue_expired(max_attempts=3) == ([], [])  # The lease is live
+    assert not store.mark_finished(job.id, "worker-b", JOB_STATUS_SUCCEEDED)
+    assert store.mark_finished(job.id, "worker-a", JOB_STATUS_SUCCEEDED)
+
+
+def test_only_expired_leases_are_requeued(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    live, dead = _insert(store, "live"), _insert(store, "dead")
+    store.claim(live.id, "live-process", lease_seconds=30)
+    store.claim(dead.id, "dead-process", lease_seconds=0.01)
+    time.sleep(0.05)
+
+    requeued, failed = store.requeue_expired(max_attempts=3)
+    assert [job.id for job in requeued] == [dead.id] and failed == []
+    assert store.get(live.id).status == JOB_STATUS_RUNNING
+    assert store.get(dead.id).status == JOB_STATUS_QUEUED
+
+
+def test_a_restarted_queue_does_not_steal_running_jobs(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    release = asyncio.Event()
+    calls = []
+
+    async def handler(job):
+        calls.append(job.id)
+        await release.wait()
+        return 200, {"ok": True}
+
+    async def scenario():
+        first = _queue(tmp_path, handler, store=store)
+        await first.start()
+        job = await first.submit("t", 0, "a.png", "image/png", io.BytesIO(b"x"))
+        await _wait_until(lambda: _status_is(store, job.id, JOB_STATUS_RUNNING))
+
+        second = _queue(tmp_path, handler, store=store)  # Another process sharing the database
+        await second.start()
+        await asyncio.sleep(0.2)
+        release.set()
+        await _wait_until(lambda: _status_is(store, job.id, JOB_STATUS_SUCCEEDED))
+        await first.stop()
+        await second.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    assert calls == [job.id]
+
+
+def test_stop_hands_running_jobs_back(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+
+    async def hang(job):
+        await asyncio.sleep(3600)
+
+    async def finish(job):
+        return 200, {"ok": True}
+
+    async def scenario():
+        queue = _queue(tmp_path, hang, store=store)
+        await queue.start()
+        job = await queue.submit("t", 0, "a.png", "image/png", io.BytesIO(b"x"))
+        await _wait_until(lambda: _status_is(store, job.id, JOB_STATUS_RUNNING))
+        await queue.stop()
+        assert store.get(job.id).status == JOB_STATUS_QUEUED
+
+        restarted = _queue(tmp_path, finish, store=store)
+        await restarted.start()
+        await _wait_until(lambda: _status_is(store, job.id, JOB_STATUS_SUCCEEDED))
+        await restarted.stop()
+        return store.get(job.id)
+
+    job = asyncio.run(scenario())
+    assert job.attempts == 2 and job.result == {"ok": True}
+
+
+def test_a_job_interrupted_on_every_attempt_fails(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    job = _insert(store, "poison")
+    for attempt in range(1, 3):  # Its worker process dies mid-job every time
+        store.claim(job.id, f"crashed-{attempt}", lease_seconds=0.01)
+        time.sleep(0.05)
+        requeued, failed = store.requeue_expired(max_attempts=2)
+        if attempt < 2:
+            assert [j.id for j in requeued] == [job.id] and failed == []
+
+    assert requeued == [] and [j.id for j in failed] == [job.id]
+    poisoned = store.get(job.id)
+    assert poisoned.status == JOB_STATUS_FAILED and poisoned.attempts == 2
+    assert poisoned.status_code == 500 and "interrupted 2 time(s)" in poisoned.error
+
+
+def test_stop_fails_jobs_on_their_last_attempt(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+
+    async def hang(job):
+        await asyncio.sleep(3600)
+
+    async def scenario():
+        queue = _queue(tmp_path, hang, store=store, max_attempts=1)
+        await queue.start()
+        job = await queue.submit("t", 0, "a.png", "image/png", io.BytesIO(b"x"))
+        await _wait_until(lambda: _status_is(store, job.id, JOB_STATUS_RUNNING))
+        await queue.stop()
+        return store.get(job.id)
+
+    job = asyncio.run(scenario())
+    assert job.status == JOB_STATUS_FAILED
+    assert not Path(job.input_path).exists()
+
+
+def test_a_full_queue_answers_429_with_the_configured_retry_after(client, monkeypatch):
+    from app.routes.orchestrate_v1 import job_queue
+
+    monkeypatch.setattr(job_queue, "max_pending", 0)
+    monkeypatch.setattr(job_queue, "retry_after", 17)
+    response = client.post("/api/v1/orchestrate/jobs", files={"file": ("scan.png", b"\x89PNG", "image/png")})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "17"
+
+
+def test_subscriptions_are_dropped(tmp_path):
+    async def finish(job):
+        return 200, {}
+
+    async def scenario():
+        queue = _queue(tmp_path, finish)
+        await queue.start()
+        job = await queue.submit("t", 0, "a.png", "image/png", io.BytesIO(b"x"))
+        await _wait_until(lambda: _status_is(queue.store, job.id, JOB_STATUS_SUCCEEDED))
+        for _ in range(3):  # Streams that find the job already finished
+            queue.unsubscribe(job.id, queue.subscribe(job.id))
+        stats = queue.stats()
+        await queue.stop()
+        return stats
+
+    assert asyncio.run(scenario())["subscribed_jobs"] == 0
+
+
+def test_job_lifecycle_through_the_api(client, stub_n8n):
+    headers = {"X-Tenant-ID": "acme"}
+    submitted = client.post("/api/v1/orchestrate/jobs", headers=headers,
+                            files={"file": ("scan.png", b"\x89PNG fake", "image/png")})
+    assert submitted.status_code == 202, submitted.text
+    job_id = submitted.json()["job_id"]
+
+    # The event stream ends once the job is finished; its last event carries the result.
+    with client.stream("GET", f"/api/v1/orchestrate/jobs/{job_id}/events", headers=headers) as events:
+        statuses = [json.loads(line[len("data: "):]) for line in events.iter_lines() if line.startswith("data: ")]
+
+    assert statuses[-1]["status"] == JOB_STATUS_SUCCEEDED
+    assert statuses[-1]["result"]["status"] == "processed"
+    assert stub_n8n.config.requests == 1
+    assert client.get(f"/api/v1/orchestrate/jobs/{job_id}", headers={"X-Tenant-ID": "other"}).status_code == 404
+    assert client.get("/api/v1/orchestrate/queue/stats").json()["subscribed_jobs"] == 0
+
+
+def test_n8n_errors_fail_the_job_with_their_status(client, stub_n8n):
+    stub_n8n.config.error_rate = 1.0
+    stub_n8n.config.error_status = 422
+    submitted = client.post("/api/v1/orchestrate/jobs", files={"file": ("scan.png", b"\x89PNG", "image/png")})
+    job_id = submitted.json()["job_id"]
+
+    deadline = time.monotonic() + 10
+    while (job := client.get(f"/api/v1/orchestrate/jobs/{job_id}").json())["status"] != JOB_STATUS_FAILED:
+        assert time.monotonic() < deadline, job
+        time.sleep(0.02)
+
+    assert job["status_code"] == 422 and "Simulated n8n workflow error" in job["error"]
+
+
+def test_per_tenant_limit(tmp_path):
+    running = {"busy": 0, "other": 0}
+    peak = {"busy": 0, "other": 0}
+    order = []
+
+    async def handler(job):
+        running[job.tenant] += 1
+        peak[job.tenant] = max(peak[job.tenant], running[job.tenant])
+        order.append(job.tenant)
+        await asyncio.sleep(0.05)
+        running[job.tenant] -= 1
+        return 200, {}
+
+    async def scenario():
+        queue = _queue(tmp_path, handler, workers=4, per_tenant_limit=2)
+        await queue.start()
+        jobs = [await queue.submit("busy", 0, f"{i}.png", "image/png", io.BytesIO(b"x")) for i in range(6)]
+        jobs.append(await queue.submit("other", 0, "o.png", "image/png", io.BytesIO(b"x")))
+        await _wait_until(lambda: _all_finished(queue.store, [job.id for job in jobs]))
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert peak == {"busy": 2, "other": 1}
+    assert order.index("other") < 3  # Not stuck behind the busy tenant's backlog
+
+
+def test_jobs_of_a_crashed_process_are_recovered(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    job = _insert(store, "orphan")
+    store.claim(job.id, "crashed-process", lease_seconds=0.05)  # Never renewed, never released
+
+    async def finish(job):
+        return 200, {"recovered": True}
+
+    async def scenario():
+        queue = _queue(tmp_path, finish, store=store, lease_seconds=0.3)
+        await queue.start()
+        await _wait_until(lambda: _status_is(store, job.id, JOB_STATUS_SUCCEEDED))
+        await queue.stop()
+
+    asyncio.run(scenario())
+    recovered = store.get(job.id)
+    assert recovered.result == {"recovered": True} and recovered.attempts == 2
+
+
+async def _all_finished(store: JobStore, job_ids) -> bool:
+    jobs = [await asyncio.to_thread(store.get, job_id) for job_id in job_ids]
+    return all(job.is_finished for job in jobs)
+
+
+async def _status_is(store: JobStore, job_id: str, status: str) -> bool:
+    job = await asyncio.to_thread(store.get, job_id)
+    return job is not None and job.status == status
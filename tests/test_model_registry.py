@@ -0,0 +1,100 @@
+# tests/test_model_registry.py
+
+import threading
+
+import pytest
+
+from app.models.registry import MB, ModelRegistry
+
+
+def test_concurrent_loads_make_room_for_each_other():
+    registry = ModelRegistry(memory_budget_bytes=1000 * MB)
+    registry.register("resident", lambda: object(), estimated_mb=400)
+    registry.get("resident")
+
+    first_loading = threading.Event()
+    release_first = threading.Event()
+    seen_by_second = {}
+
+    def load_first():
+        first_loading.set()
+        release_first.wait(5)
+        return object()
+
+    def load_second():
+        seen_by_second["resident_loaded"] = registry.is_loaded("resident")
+        return object()
+
+    registry.register("first", load_first, estimated_mb=500)
+    registry.register("second", load_second, estimated_mb=500)
+
+    thread = threading.Thread(target=registry.get, args=("first",))
+    thread.start()
+    assert first_loading.wait(5)
+    assert registry.stats()["loading"] == {"first": 500}
+
+    # "first" is still loading, but its 500 MB already count: "resident" has to go.
+    registry.get("second")
+    release_first.set()
+    thread.join(5)
+
+    assert seen_by_second == {"resident_loaded": False}
+    assert registry.stats()["loaded"] == {"first": 500, "second": 500}
+    assert registry.stats()["loading"] == {}
+
+
+def test_a_failed_load_releases_its_reservation():
+    registry = ModelRegistry(memory_budget_bytes=1000 * MB)
+
+    def broken_loader():
+        raise RuntimeError("weights missing")
+
+    registry.register("broken", broken_loader, estimated_mb=900)
+    registry.register("small", lambda: object(), estimated_mb=200)
+
+    with pytest.raises(RuntimeError):
+        registry.get("broken")
+    registry.get("small")
+    registry.register("other", lambda: object(), estimated_mb=700)
+    registry.get("other")
+
+    assert registry.stats()["loading"] == {}
+    assert registry.stats()["loaded"] == {"small": 200, "other": 700}
+    assert registry.evictions == 0
+
+
+
+class _Model:
+    """Weak-referenceable stand-in for a loaded model."""
+
+
+def test_an_evicted_model_in_use_keeps_its_budget_until_released():
+    registry = ModelRegistry(memory_budget_bytes=1000 * MB)
+    for name, size in (("a", 400), ("b", 400), ("c", 400), ("d", 200)):
+        registry.register(name, _Model, estimated_mb=size)
+
+    in_batch = registry.get("a")  # Held by a running batch
+    registry.get("b")
+    registry.get("c")  # Evicts "a", which is still in use
+    assert not registry.is_loaded("a")
+    assert registry.stats()["evicted_in_use"] == {"a": 400}
+
+    registry.get("d")  # b + c + a (in use) + d > 1000: "b" goes too; nothing holds it
+    assert registry.stats()["loaded"] == {"c": 400, "d": 200}
+    assert registry.stats()["evicted_in_use"] == {"a": 400}
+
+    del in_batch
+    assert registry.stats()["evicted_in_use"] == {}
+    registry.get("b")  # Fits again now that "a" is gone
+    assert registry.stats()["loaded"] == {"c": 400, "d": 200, "b": 400}
+
+
+def test_an_evicted_model_in_use_is_reused_instead_of_loaded_again():
+    registry = ModelRegistry(memory_budget_bytes=1000 * MB)
+    registry.register("a", _Model, estimated_mb=600)
+
+    in_batch = registry.get("a")
+    registry.evict("a")
+    assert registry.get("a") is in_batch
+    assert registry.loads == 1
+    assert registry.stats()["loaded"] == {"a": 600} and registry.stats()["evicted_in_use"] == {}
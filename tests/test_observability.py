@@ -0,0 +1,97 @@
+# tests/test_observability.py
+
+import json
+import logging
+import re
+
+from app.services import logging_setup, tracing
+from conftest import upload
+
+# One sample line of the Prometheus text format: name{labels} value
+_SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (\S+)$')
+
+
+def _scrape(client) -> dict:
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+    samples, declared = {}, set()
+    for line in response.text.splitlines():
+        if line.startswith("# HELP ") or line.startswith("# TYPE "):
+            declared.add(line.split(" ")[2])
+            continue
+        match = _SAMPLE_RE.match(line)
+        assert match, f"not in the exposition format: {line!r}"
+        samples[match.group(1) + (match.group(2) or "")] = float(match.group(3))
+        assert re.sub(r"_(bucket|sum|count)$", "", match.group(1)) in declared  # HELP/TYPE come first
+    return samples
+
+
+def test_metrics_count_requests_and_latency(client):
+    before = _scrape(client)
+    assert client.get("/").status_code == 200
+    after = _scrape(client)
+
+    requests = 'documorph_http_requests_total{method="GET",route="/",status="200"}'
+    latency = 'documorph_http_request_duration_seconds{}{{method="GET",route="/"{}}}'
+    assert after[requests] - before.get(requests, 0) == 1
+    count = latency.format("_count", "")
+    assert after[count] - before.get(count, 0) == 1
+    assert after[latency.format("_bucket", ',le="+Inf"')] == after[count]
+    buckets = [value for key, value in after.items()
+               if key.startswith('documorph_http_request_duration_seconds_bucket{method="GET",route="/",')]
+    assert buckets == sorted(buckets)  # Cumulative
+    assert after['documorph_http_requests_in_flight{method="GET",route="root"}'] == 1  # The scrape itself
+
+
+def test_api_areas_are_known_before_the_first_request(client):
+    assert {"upload", "format", "templates", "orchestrate"} <= tracing._api_areas
+    client.get("/api/v1/not-an-area/x")
+    assert 'documorph_http_requests_in_flight{method="GET",route="unmatched"}' in _scrape(client)
+
+
+def test_stage_spans_are_recorded_per_request(client, monkeypatch):
+    records = []
+
+    class _Collect(logging.Handler):
+        def emit(self, record):
+            records.append(record)
+
+    handler = _Collect()
+    trace_logger = logging.getLogger("documorph.tracing")
+    trace_logger.addHandler(handler)
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", True)
+    monkeypatch.setattr(trace_logger, "level", logging.INFO)
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    try:
+        upload(client, "traced.txt", b"Some text to format.\n")
+        before = _scrape(client)
+        response = client.post("/api/v1/format/document/", data={"filename": "traced.txt", "mode": "full"},
+                               headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"})
+    finally:
+        trace_logger.removeHandler(handler)
+
+    assert response.status_code == 200
+    assert response.headers["x-trace-id"] == trace_id
+    trace = next(r for r in records if r.msg == "request trace" and r.route == "/api/v1/format/document/")
+    assert trace.trace_id == trace_id and trace.status == 200
+    assert [span["stage"] for span in trace.spans] == ["read", "build_docx", "save"]
+    assert all(span["start_ms"] >= 0 and span["duration_ms"] >= 0 for span in trace.spans)
+    after = _scrape(client)
+    build = 'documorph_stage_duration_seconds_count{stage="build_docx"}'
+    assert after[build] - before.get(build, 0) == 1
+
+
+def test_log_writer_runs_for_the_lifespan(app, capsys):
+    from fastapi.testclient import TestClient
+
+    logging_setup.stop_logging()  # Restarted by the lifespan, writing to the captured stdout
+    with TestClient(app):
+        listener = logging_setup._listener
+        assert listener is not None and listener._thread.is_alive()
+        logging_setup.get_logger("tests").warning("during the lifespan", extra={"case": "lifespan"})
+
+    assert logging_setup._listener is None and listener._thread is None  # Stopped on shutdown
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith("{")]
+    assert {"level": "WARNING", "logger": "documorph.tests", "msg": "during the lifespan", "case": "lifespan"}.items() \
+        <= next(line for line in lines if line["msg"] == "during the lifespan").items()
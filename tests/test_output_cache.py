@@ -0,0 +1,117 @@
+# tests/test_output_cache.py
+
+import asyncio
+import time
+
+import pytest
+
+from app.services.output_cache import FormattedOutputCache
+from conftest import upload
+
+
+def _produce(cache: FormattedOutputCache, key: str, content: bytes):
+    produced = cache.tmp_path_for(key)
+    produced.write_bytes(content)
+    return cache.put(key, produced)
+
+
+def test_checkout_survives_eviction(tmp_path):
+    cache = FormattedOutputCache(tmp_path, max_bytes=10 ** 6, max_entries=1)
+    _produce(cache, "a", b"first")
+    served = cache.checkout("a")
+
+    _produce(cache, "b", b"second")  # Evicts "a" while it is being served
+
+    assert cache.checkout("a") is None
+    assert served.read_bytes() == b"first"
+    served.unlink()
+
+
+def test_key_lock_is_dropped_after_a_failed_build(tmp_path):
+    cache = FormattedOutputCache(tmp_path, max_bytes=10 ** 6, max_entries=10)
+
+    async def failing_build():
+        async with cache.lock_for("k"):
+            raise RuntimeError("formatter crashed")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(failing_build())
+    assert cache._key_locks == {}
+
+
+def test_batch_serves_cached_and_new_documents_without_leftovers(client):
+    from app.services.output_cache import output_cache
+
+    for name in ("one.txt", "two.txt"):
+        upload(client, name, f"Text of {name}.\n".encode())
+    assert client.post("/api/v1/format/document/", data={"filename": "one.txt", "mode": "full"}).status_code == 200
+
+    response = client.post("/api/v1/format/batch", data={"filenames": ["one.txt", "two.txt"], "mode": "full"})
+
+    assert response.status_code == 200, response.text
+    assert response.headers["x-cache-hits"] == "1" and response.headers["x-cache-misses"] == "1"
+    assert list(output_cache.tmp_dir.iterdir()) == []  # Checkouts, partial outputs and the ZIP are gone
+
+
+def test_failed_batch_removes_partial_outputs(client, monkeypatch):
+    from app.routes import format_v1
+    from app.services.output_cache import output_cache
+
+    for name in ("bad1.txt", "bad2.txt", "bad3.txt"):
+        upload(client, name, f"Text of {name}.\n".encode())
+
+    async def flaky(jobs):
+        if any("bad1" in job[4] for job in jobs):
+            raise RuntimeError("worker crashed")
+        await asyncio.sleep(0.2)  # Siblings are still working when the first chunk fails
+        for _, output_path, *_ in jobs:
+            with open(output_path, "wb") as f:
+                f.write(b"partial")
+
+    monkeypatch.setattr(format_v1, "FORMAT_BATCH_CHUNK_FILES", 1)
+    monkeypatch.setattr(format_v1.format_executor, "workers", 3)  # Chunks run side by side
+    monkeypatch.setattr(format_v1, "apply_batch_formatting", flaky)
+
+    response = client.post("/api/v1/format/batch", data={"filenames": ["bad1.txt", "bad2.txt", "bad3.txt"]})
+
+    assert response.status_code == 500
+    time.sleep(0.4)  # Anything a sibling would still write has landed by now
+    assert list(output_cache.tmp_dir.iterdir()) == []
+
+
+def test_matching_etag_gets_304_without_a_checkout(client):
+    from app.services.output_cache import output_cache
+
+    upload(client, "etag.txt", b"Cached text.\n")
+    data = {"filename": "etag.txt", "mode": "full"}
+    first = client.post("/api/v1/format/document/", data=data)
+    assert first.status_code == 200 and first.headers["x-cache"] == "MISS"
+    etag = first.headers["etag"]
+    hits = output_cache.stats()["hits"]
+
+    revalidated = client.post("/api/v1/format/document/", data=data, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304 and revalidated.headers["etag"] == etag
+    assert revalidated.content == b""
+    assert output_cache.stats()["hits"] == hits + 1
+
+    stale = client.post("/api/v1/format/document/", data=data, headers={"If-None-Match": '"other"'})
+    assert stale.status_code == 200 and stale.headers["x-cache"] == "HIT"
+    assert list(output_cache.tmp_dir.iterdir()) == []  # No serve-* links left behind
+
+
+def test_failed_format_removes_its_partial_output(client, monkeypatch):
+    from app.routes import format_v1
+    from app.services.output_cache import output_cache
+
+    async def crashing(input_file_path_str, output_file_path_str):
+        with open(output_file_path_str, "wb") as f:
+            f.write(b"partial")
+        raise RuntimeError("formatter crashed")
+
+    monkeypatch.setattr(format_v1, "apply_full_formatting", crashing)
+    upload(client, "crash.txt", b"Text.\n")
+
+    response = client.post("/api/v1/format/document/", data={"filename": "crash.txt", "mode": "full"})
+
+    assert response.status_code == 500
+    assert list(output_cache.tmp_dir.iterdir()) == []
@@ -0,0 +1,53 @@
+# tests/test_summary_cache.py
+
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.summarization import SummaryCache
+
+
+def test_disk_entries_are_bounded_lru(tmp_path):
+    cache = SummaryCache(tmp_path, memory_entries=1, max_entries=2, max_bytes=10 ** 6)
+    cache.put("a" * 64, "first")
+    cache.put("b" * 64, "second")
+    assert cache.get("a" * 64) == "first"  # From disk; now the most recently used
+    cache.put("c" * 64, "third")
+
+    assert cache.get("b" * 64) is None
+    assert cache.get("a" * 64) == "first"
+    assert cache.stats()["disk_entries"] == 2 and cache.stats()["evictions"] == 1
+    assert sorted(p.stem[0] for p in tmp_path.glob("*/*.json")) == ["a", "c"]
+
+    restarted = SummaryCache(tmp_path, memory_entries=1, max_entries=1, max_bytes=10 ** 6)
+    assert restarted.stats()["disk_entries"] == 1
+
+
+def test_concurrent_use_keeps_the_counters_consistent(tmp_path):
+    cache = SummaryCache(tmp_path, memory_entries=8, max_entries=50, max_bytes=10 ** 6)
+
+    def work(i: int) -> None:
+        key = f"{i % 100:064x}"
+        if cache.get(key) is None:
+            cache.put(key, f"summary {i}")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(work, range(2000)))
+
+    stats = cache.stats()
+    assert stats["hits"] + stats["misses"] == 2000
+    assert stats["disk_entries"] <= 50
+    assert len(list(tmp_path.glob("*/*.json"))) == stats["disk_entries"]
+
+
+def test_document_summary_reads_legacy_and_stored_uploads(client):
+    from app.routes.summarizer import BASE_UPLOAD_DIR
+    from conftest import upload
+
+    text = "A short report about quarterly results.\n"
+    (BASE_UPLOAD_DIR / "dropped-in.txt").write_text(text, encoding="utf-8")  # Older flow, not in the store
+    upload(client, "uploaded.txt", text.encode())
+
+    for name in ("dropped-in.txt", "uploaded.txt"):
+        response = client.post("/api/v1/summarize/document", data={"filename": name})
+        assert response.status_code == 200, response.text
+        assert response.json()["input_chars"] == len(text)
+    assert client.post("/api/v1/summarize/document", data={"filename": "never-uploaded.txt"}).status_code == 404
@@ -0,0 +1,66 @@
+# tests/test_tables.py
+
+import io
+
+import pytest
+
+from conftest import upload
+
+CSV = b"city,population,country\nOslo,709037,Norway\nBergen,289330,Norway\nLyon,522250,France\n"
+
+
+def _xlsx_bytes() -> bytes:
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["city", "population", "country"])
+    sheet.append(["Oslo", 709037, "Norway"])
+    sheet.append(["Lyon", 522250, "France"])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("filename, content", [
+    ("cities.csv", CSV),
+    ("cities.tsv", CSV.replace(b",", b"\t")),
+    ("cities.xlsx", None),
+])
+def test_uploaded_table_is_described(client, filename, content):
+    content = content if content is not None else _xlsx_bytes()
+    upload(client, filename, content)
+
+    response = client.post("/api/v1/tables/describe", data={"filename": filename})
+
+    assert response.status_code == 200, response.text
+    profile = response.json()["profile"]
+    assert [c["name"] for c in profile["columns"]] == ["city", "population", "country"]
+    assert profile["rows"] == (3 if filename.endswith("sv") else 2)
+
+
+def test_table_format_is_sniffed_without_an_extension(tmp_path):
+    from app.services.table_ingest import profile_table
+
+    xlsx = tmp_path / "blob-a"
+    xlsx.write_bytes(_xlsx_bytes())
+    tsv = tmp_path / "blob-b"
+    tsv.write_bytes(CSV.replace(b",", b"\t"))
+
+    assert profile_table(str(xlsx))["reader"] == "openpyxl"
+    assert profile_table(str(tsv))["column_count"] == 3
+
+
+def test_unknown_table_type_is_rejected(client):
+    upload(client, "notes.docx", b"not a table")
+
+    response = client.post("/api/v1/tables/describe", data={"filename": "notes.docx"})
+
+    assert response.status_code == 400
+
+
+def test_corrupt_workbook_is_rejected(client):
+    upload(client, "broken.xlsx", b"PK\x03\x04 truncated")
+
+    response = client.post("/api/v1/tables/describe", data={"filename": "broken.xlsx"})
+
+    assert response.status_code == 400
@@ -0,0 +1,159 @@
+# tests/test_templates.py
+
+import io
+import zipfile
+
+from docx import Document
+
+from app.services import docx_templates
+from app.services.docx_templates import TemplateCache
+from app.services.upload_store import ContentAddressedStore
+from conftest import upload
+
+TEMPLATES = "/api/v1/templates/"
+DOCX_MAIN = "application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"
+DOTX_MAIN = "application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml"
+MARKED_UP_TEXT = b"# Quarterly report\nRevenue grew.\n- North region\n- South region\n1. Hire\n2. Expand\n"
+
+
+def _template_bytes(heading_font: str = "Courier New", dotx: bool = False) -> bytes:
+    document = Document()
+    document.styles["Heading 1"].font.name = heading_font
+    buffer = io.BytesIO()
+    document.save(buffer)
+    if not dotx:
+        return buffer.getvalue()
+    # A .dotx is the same package with the template content type on its main part.
+    source, patched = zipfile.ZipFile(io.BytesIO(buffer.getvalue())), io.BytesIO()
+    with zipfile.ZipFile(patched, "w", zipfile.ZIP_DEFLATED) as out:
+        for info in source.infolist():
+            data = source.read(info.filename)
+            if info.filename == "[Content_Types].xml":
+                data = data.replace(DOCX_MAIN.encode(), DOTX_MAIN.encode())
+            out.writestr(info, data)
+    return patched.getvalue()
+
+
+def _upload_template(client, name: str, content: bytes, filename: str = "style.docx") -> dict:
+    response = client.post(TEMPLATES, data={"name": name}, files={"file": (filename, content)})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _styled_paragraphs(content: bytes):
+    return [(p.style.name, p.text) for p in Document(io.BytesIO(content)).paragraphs]
+
+
+def test_upload_reports_the_role_mapping(client):
+    info = _upload_template(client, "house-style", _template_bytes())
+
+    assert info["roles"]["heading1"] == {"style_id": "Heading1", "supported": True}
+    assert info["roles"]["list_bullet"] == {"style_id": "ListBullet", "supported": True}
+    assert info["roles"]["list_number"] == {"style_id": "ListNumber", "supported": True}
+    assert client.get(f"{TEMPLATES}house-style").json()["digest"] == info["digest"]
+    assert {"name": "house-style", "digest": info["digest"]} in client.get(TEMPLATES).json()
+
+
+def test_dotx_templates_produce_documents(client):
+    _upload_template(client, "letterhead", _template_bytes(dotx=True), filename="letterhead.dotx")
+    upload(client, "letter.txt", b"# Dear reader\nHello.\n")
+
+    response = client.post("/api/v1/format/document/",
+                           data={"filename": "letter.txt", "mode": "full", "template_name": "letterhead"})
+
+    assert response.status_code == 200, response.text
+    content_types = zipfile.ZipFile(io.BytesIO(response.content)).read("[Content_Types].xml").decode()
+    assert DOCX_MAIN in content_types and DOTX_MAIN not in content_types  # Word opens it as a document
+    assert _styled_paragraphs(response.content) == [("Heading 1", "Dear reader"), ("Normal", "Hello.")]
+
+
+def test_invalid_templates_are_rejected(client):
+    assert client.post(TEMPLATES, files={"file": ("style.docx", b"not a zip")}).status_code == 400
+    assert client.post(TEMPLATES, files={"file": ("style.pdf", _template_bytes())}).status_code == 400
+
+
+def test_format_with_a_template_maps_roles_to_its_styles(client):
+    _upload_template(client, "report-style", _template_bytes(heading_font="Courier New"))
+    upload(client, "report.txt", MARKED_UP_TEXT)
+
+    response = client.post("/api/v1/format/document/",
+                           data={"filename": "report.txt", "mode": "full", "template_name": "report-style"})
+
+    assert response.status_code == 200, response.text
+    assert _styled_paragraphs(response.content) == [
+        ("Heading 1", "Quarterly report"),
+        ("Normal", "Revenue grew."),
+        ("List Bullet", "North region"),
+        ("List Bullet", "South region"),
+        ("List Number", "Hire"),
+        ("List Number", "Expand"),
+    ]
+    assert Document(io.BytesIO(response.content)).styles["Heading 1"].font.name == "Courier New"
+
+
+def test_batch_format_with_a_template(client):
+    _upload_template(client, "batch-style", _template_bytes())
+    upload(client, "one.txt", b"# One\n- a\n")
+    upload(client, "two.txt", b"# Two\n1. b\n")
+
+    response = client.post("/api/v1/format/batch",
+                           data={"filenames": ["one.txt", "two.txt"], "template_name": "batch-style"})
+
+    assert response.status_code == 200, response.text
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert sorted(archive.namelist()) == ["one_formatted.docx", "two_formatted.docx"]
+    assert _styled_paragraphs(archive.read("one_formatted.docx")) == [("Heading 1", "One"), ("List Bullet", "a")]
+    assert _styled_paragraphs(archive.read("two_formatted.docx")) == [("Heading 1", "Two"), ("List Number", "b")]
+
+
+def test_deleted_template_is_not_found(client):
+    _upload_template(client, "short-lived", _template_bytes(heading_font="Arial"))
+    upload(client, "doc.txt", b"Text.\n")
+
+    assert client.delete(f"{TEMPLATES}short-lived").status_code == 204
+    assert client.delete(f"{TEMPLATES}short-lived").status_code == 404
+    assert client.get(f"{TEMPLATES}short-lived").status_code == 404
+    single = client.post("/api/v1/format/document/",
+                         data={"filename": "doc.txt", "mode": "full", "template_name": "short-lived"})
+    batch = client.post("/api/v1/format/batch", data={"filenames": ["doc.txt"], "template_name": "short-lived"})
+    assert single.status_code == 404 and batch.status_code == 404
+
+
+def _stored_template(store: ContentAddressedStore, name: str, content: bytes) -> str:
+    return store.put_stream(name, io.BytesIO(content)).digest
+
+
+def test_compiled_templates_are_cached_in_memory_and_on_disk(tmp_path):
+    store = ContentAddressedStore(tmp_path)
+    digest = _stored_template(store, "style", _template_bytes())
+    cache = TemplateCache(store, memory_entries=4)
+
+    compiled = cache.get(digest)
+    assert cache.get(digest) is compiled
+    assert cache.stats() == {"memory_entries": 1, "memory_hits": 1, "disk_hits": 0, "compiles": 1}
+
+    other_process = TemplateCache(store, memory_entries=4)  # e.g. a formatting worker
+    assert other_process.get(digest) == compiled
+    assert other_process.stats()["disk_hits"] == 1 and other_process.stats()["compiles"] == 0
+
+
+def test_compiled_templates_are_invalidated(tmp_path, monkeypatch):
+    store = ContentAddressedStore(tmp_path)
+    digest = _stored_template(store, "style", _template_bytes())
+    cache = TemplateCache(store, memory_entries=4)
+    cache.get(digest)
+
+    cache.discard(digest)  # What remove_template() does once no name references it
+    cache.get(digest)
+    assert cache.stats()["compiles"] == 2
+
+    # A new compiler version never reuses compiled files of the old one.
+    monkeypatch.setattr(docx_templates, "TEMPLATE_COMPILER_VERSION", "test-next")
+    fresh = TemplateCache(store, memory_entries=4)
+    fresh.get(digest)
+    assert fresh.stats()["compiles"] == 1 and fresh.stats()["disk_hits"] == 0
+
+    # Replacing a template under the same name gives it a new digest, compiled afresh.
+    replaced = _stored_template(store, "style", _template_bytes(heading_font="Arial"))
+    assert replaced != digest and cache.get(replaced).digest == replaced
+    assert cache.stats()["compiles"] == 3
@@ -0,0 +1,117 @@
+# tests/test_upload_sessions.py
+
+import base64
+import hashlib
+
+import pytest
+
+from app.services.upload_sessions import UploadSessionError, UploadSessionStore
+
+CONTENT = bytes(range(256)) * 64  # 16 KiB
+SESSIONS = "/api/v1/upload/sessions"
+
+
+def _checksum(data: bytes) -> str:
+    return "sha256 " + base64.b64encode(hashlib.sha256(data).digest()).decode("ascii")
+
+
+def _create(client, filename: str = "scan.bin") -> str:
+    response = client.post(SESSIONS, data={
+        "filename": filename, "size": str(len(CONTENT)), "sha256": hashlib.sha256(CONTENT).hexdigest(),
+    })
+    assert response.status_code == 201, response.text
+    return response.json()["upload_id"]
+
+
+def _put(client, upload_id: str, offset: int, data: bytes, checksum=None, headers=None):
+    headers = {"Upload-Offset": str(offset), "Upload-Checksum": checksum or _checksum(data), **(headers or {})}
+    return client.put(f"{SESSIONS}/{upload_id}/chunks", content=data, headers=headers)
+
+
+def test_chunks_in_any_order_round_trip(client):
+    upload_id = _create(client)
+    half = len(CONTENT) // 2
+    assert _put(client, upload_id, half, CONTENT[half:]).status_code == 200
+    status = client.get(f"{SESSIONS}/{upload_id}").json()
+    assert status["missing_ranges"] == [[0, half]]
+    assert _put(client, upload_id, 0, CONTENT[:half]).status_code == 200
+
+    completed = client.post(f"{SESSIONS}/{upload_id}/complete")
+
+    assert completed.status_code == 200, completed.text
+    assert completed.json()["digest"] == hashlib.sha256(CONTENT).hexdigest()
+
+
+def test_bad_chunk_never_overwrites_received_bytes(client):
+    upload_id = _create(client)
+    half = len(CONTENT) // 2
+    assert _put(client, upload_id, 0, CONTENT[:half]).status_code == 200
+
+    corrupted = b"\xff" * half
+    # Retransmission of a received range, even with a matching checksum: rejected.
+    assert _put(client, upload_id, 0, corrupted).status_code == 409
+    # Overlapping the received range from a different offset: rejected.
+    assert _put(client, upload_id, half - 10, corrupted[:20]).status_code == 409
+    # Checksum mismatch on a missing range: rejected and not counted.
+    assert _put(client, upload_id, half, corrupted, checksum=_checksum(CONTENT[half:])).status_code == 460
+    assert client.get(f"{SESSIONS}/{upload_id}").json()["missing_ranges"] == [[half, len(CONTENT)]]
+
+    assert _put(client, upload_id, half, CONTENT[half:]).status_code == 200
+    completed = client.post(f"{SESSIONS}/{upload_id}/complete")
+    assert completed.status_code == 200, completed.text  # Whole-file sha256 matches the original
+
+
+def test_malformed_content_length_is_a_client_error(client):
+    upload_id = _create(client)
+
+    response = _put(client, upload_id, 0, CONTENT[:16], headers={"Content-Length": "sixteen"})
+
+    assert response.status_code == 400
+    client.delete(f"{SESSIONS}/{upload_id}")
+
+
+def test_whole_file_mismatch_starts_the_upload_over(client):
+    upload_id = _create(client)
+    wrong = b"\x00" * len(CONTENT)  # Every chunk verifies, the whole file does not
+    assert _put(client, upload_id, 0, wrong).status_code == 200
+
+    mismatch = client.post(f"{SESSIONS}/{upload_id}/complete")
+    assert mismatch.status_code == 460
+    status = client.get(f"{SESSIONS}/{upload_id}").json()
+    assert status["status"] == "open" and status["missing_ranges"] == [[0, len(CONTENT)]]
+
+    assert _put(client, upload_id, 0, CONTENT).status_code == 200
+    completed = client.post(f"{SESSIONS}/{upload_id}/complete")
+    assert completed.status_code == 200, completed.text
+
+
+def test_open_sessions_are_limited(tmp_path):
+    store = UploadSessionStore(tmp_path, max_bytes=1000, ttl_seconds=60, max_open_sessions=3,
+                               max_sessions_per_client=2, max_reserved_bytes=2500)
+    first = store.create("a.bin", 1000, client="10.0.0.1")
+    store.create("b.bin", 1000, client="10.0.0.1")
+    with pytest.raises(UploadSessionError) as per_client:
+        store.create("c.bin", 10, client="10.0.0.1")
+    with pytest.raises(UploadSessionError) as reserved:
+        store.create("c.bin", 1000, client="10.0.0.2")
+    store.create("c.bin", 10, client="10.0.0.2")
+    with pytest.raises(UploadSessionError) as overall:
+        store.create("d.bin", 10, client="10.0.0.3")
+
+    assert (per_client.value.status_code, reserved.value.status_code, overall.value.status_code) == (429, 507, 429)
+    assert len(list(tmp_path.iterdir())) == 3  # Nothing was preallocated for rejected sessions
+    store.abort(first.id)
+    store.create("d.bin", 1000, client="10.0.0.3")
+
+    restarted = UploadSessionStore(tmp_path, max_bytes=1000, ttl_seconds=60, max_open_sessions=3,
+                                   max_sessions_per_client=2, max_reserved_bytes=2500)
+    assert restarted.stats()["in_progress"] == 3 and restarted.stats()["reserved_bytes"] == 2010
+
+
+def test_too_many_sessions_answer_429(client, monkeypatch):
+    from app.services.upload_sessions import upload_sessions
+
+    monkeypatch.setattr(upload_sessions, "max_open_sessions", 0)
+    response = client.post(SESSIONS, data={"filename": "scan.bin", "size": "10"})
+
+    assert response.status_code == 429
@@ -0,0 +1,54 @@
+# tests/test_upload_store.py
+
+import io
+
+from app.services.upload_store import ContentAddressedStore
+from conftest import upload
+
+
+def test_rebinding_a_name_keeps_the_previous_blob(tmp_path):
+    store = ContentAddressedStore(tmp_path)
+    first = store.put_stream("report.txt", io.BytesIO(b"first version"))
+    with open(first.path, "rb") as reader:  # A worker that resolved the name before the rebind
+        second = store.put_stream("report.txt", io.BytesIO(b"second version"))
+        assert reader.read() == b"first version"
+
+    assert first.path.is_file()
+    assert store.lookup("report.txt") == (second.digest, second.path)
+    assert store.lookup(second.digest) == (second.digest, second.path)
+    assert store.lookup(first.digest) == (first.digest, first.path)  # Until the grace period ends
+    assert store.collect_garbage(now=float("inf")) == 1
+    assert store.lookup(first.digest) is None
+
+
+def test_unreferenced_blobs_are_collected_after_the_grace_period(tmp_path):
+    store = ContentAddressedStore(tmp_path, blob_grace_seconds=60)
+    stored = store.put_stream("a.txt", io.BytesIO(b"shared"))
+    store.put_stream("b.txt", io.BytesIO(b"shared"))
+    store.release("a.txt")
+    assert store.collect_garbage(now=float("inf")) == 0  # b.txt still references it
+
+    store.release("b.txt")
+    assert store.collect_garbage() == 0
+    assert stored.path.is_file()
+    assert store.collect_garbage(now=float("inf")) == 1
+    assert not stored.path.exists()
+    assert store.stats() == {"names": 0, "blobs": 0, "stored_bytes": 0, "unreferenced_blobs": 0}
+
+
+def test_index_survives_a_restart(tmp_path):
+    store = ContentAddressedStore(tmp_path)
+    stored = store.put_stream("kept.txt", io.BytesIO(b"kept"))
+    store.close()
+    assert ContentAddressedStore(tmp_path).lookup("kept.txt") == (stored.digest, stored.path)
+
+
+def test_format_by_digest_is_not_affected_by_a_rebind(client):
+    first = upload(client, "pinned.txt", b"Original text.\n")
+    upload(client, "pinned.txt", b"Replacement text.\n")
+
+    by_digest = client.post("/api/v1/format/document/", data={"filename": first["digest"], "mode": "full"})
+    by_name = client.post("/api/v1/format/document/", data={"filename": "pinned.txt", "mode": "full"})
+
+    assert by_digest.status_code == 200 and by_name.status_code == 200
+    assert by_digest.headers["etag"] != by_name.headers["etag"]